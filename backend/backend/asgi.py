@@ -5,6 +5,11 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Async views (e.g. the book search) are served natively when running under
+an ASGI server, for example:
+    uvicorn backend.asgi:application --workers 2
+    gunicorn backend.asgi:application -k uvicorn.workers.UvicornWorker
 """
 
 import os
@@ -14,3 +19,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
 
 application = get_asgi_application()
+
+# Lets long-lived async resources (OpenLibrary connection pools, the rental
+# event stream) know they run on a persistent event loop (book/runtime.py)
+from book.runtime import mark_asgi  # noqa: E402
+
+mark_asgi()
@@ -0,0 +1,19 @@
+"""
+Celery application for background jobs (book enrichment, sweeps).
+
+Run a worker and the beat scheduler with:
+    celery -A backend worker -l info
+    celery -A backend beat -l info
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+
+app = Celery("backend")
+
+# All CELERY_* settings in settings.py configure the app
+app.config_from_object("django.conf:settings", namespace="CELERY")
+app.autodiscover_tasks()
@@ -15,6 +15,7 @@ from datetime import timedelta
 import os
 from decouple import config
 import dj_database_url
+from celery.schedules import crontab
 
 # database configuration from env variable
 DATABASE_URL = config("DATABASE_URL", default=None)
@@ -115,6 +116,10 @@ DATABASES = {
     }
 }
 
+# DATABASE_URL (e.g. sqlite:///db.sqlite3 for local runs) overrides the above
+if DATABASE_URL:
+    DATABASES = {"default": dj_database_url.parse(DATABASE_URL)}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -152,6 +157,10 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+# Uploaded/generated files (cover thumbnails)
+MEDIA_URL = "media/"
+MEDIA_ROOT = config("MEDIA_ROOT", default=str(BASE_DIR / "media"))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -159,4 +168,147 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 
 # ✅ If you use credentials (like cookies or session)
-CORS_ALLOW_CREDENTIALS = True
\ No newline at end of file
+CORS_ALLOW_CREDENTIALS = True
+
+
+# Cache configuration
+# "default" is shared by every worker (Redis), "local" is a small per-process
+# LRU that sits in front of it for hot keys. JWT principals get an LRU of their
+# own ("local-principal"), so a busy OpenLibrary cache can't evict them.
+REDIS_URL = config("REDIS_URL", default="redis://localhost:6379/0")
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+        "KEY_PREFIX": "bookrent",
+        "OPTIONS": {
+            "socket_connect_timeout": 0.5,
+            "socket_timeout": 0.5,
+        },
+    },
+    "local": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "bookrent-local",
+        "OPTIONS": {
+            "MAX_ENTRIES": config("LOCAL_CACHE_MAX_ENTRIES", default=2048, cast=int),
+        },
+    },
+    "local-principal": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "bookrent-local-principal",
+        "OPTIONS": {
+            "MAX_ENTRIES": config("PRINCIPAL_LOCAL_CACHE_MAX_ENTRIES", default=4096, cast=int),
+        },
+    },
+}
+
+
+# Cached read endpoint responses (book/response_cache.py): upper bound on
+# staleness for writes that skip the invalidation signals
+RESPONSE_CACHE_TTL = config("RESPONSE_CACHE_TTL", default=60 * 5, cast=int)
+
+# OpenLibrary lookups
+OPENLIBRARY_CACHE_TTL = config("OPENLIBRARY_CACHE_TTL", default=60 * 60 * 24, cast=int)
+OPENLIBRARY_NEGATIVE_CACHE_TTL = config("OPENLIBRARY_NEGATIVE_CACHE_TTL", default=60 * 10, cast=int)
+OPENLIBRARY_LOCAL_CACHE_TTL = config("OPENLIBRARY_LOCAL_CACHE_TTL", default=60 * 5, cast=int)
+OPENLIBRARY_BASE_URL = config("OPENLIBRARY_BASE_URL", default="https://openlibrary.org")
+OPENLIBRARY_USER_AGENT = config("OPENLIBRARY_USER_AGENT", default="bookrent/1.0")
+OPENLIBRARY_CONNECT_TIMEOUT = config("OPENLIBRARY_CONNECT_TIMEOUT", default=3.05, cast=float)
+OPENLIBRARY_READ_TIMEOUT = config("OPENLIBRARY_READ_TIMEOUT", default=5.0, cast=float)
+OPENLIBRARY_MAX_RETRIES = config("OPENLIBRARY_MAX_RETRIES", default=2, cast=int)
+OPENLIBRARY_POOL_SIZE = config("OPENLIBRARY_POOL_SIZE", default=10, cast=int)
+OPENLIBRARY_ASYNC_POOL_SIZE = config("OPENLIBRARY_ASYNC_POOL_SIZE", default=100, cast=int)
+OPENLIBRARY_BREAKER_FAILURES = config("OPENLIBRARY_BREAKER_FAILURES", default=5, cast=int)
+OPENLIBRARY_BREAKER_RESET_SECONDS = config("OPENLIBRARY_BREAKER_RESET_SECONDS", default=30, cast=int)
+# Request coalescing: how long the cross-worker lock lives / followers wait
+OPENLIBRARY_SINGLEFLIGHT_LOCK_TIMEOUT = config("OPENLIBRARY_SINGLEFLIGHT_LOCK_TIMEOUT", default=20, cast=int)
+OPENLIBRARY_SINGLEFLIGHT_WAIT_TIMEOUT = config("OPENLIBRARY_SINGLEFLIGHT_WAIT_TIMEOUT", default=15, cast=int)
+
+
+# API pagination (keyset, see book/pagination.py)
+API_PAGE_SIZE = config("API_PAGE_SIZE", default=50, cast=int)
+API_MAX_PAGE_SIZE = config("API_MAX_PAGE_SIZE", default=500, cast=int)
+# Rows fetched per round trip by the streaming rentals export
+RENTAL_EXPORT_CHUNK_SIZE = config("RENTAL_EXPORT_CHUNK_SIZE", default=2000, cast=int)
+# Max items per request to the bulk rental endpoints
+BULK_RENTAL_MAX_ITEMS = config("BULK_RENTAL_MAX_ITEMS", default=1000, cast=int)
+# Bulk student CSV import: rows per insert transaction, password hashing
+# processes (0 = one per CPU)
+STUDENT_IMPORT_CHUNK_SIZE = config("STUDENT_IMPORT_CHUNK_SIZE", default=500, cast=int)
+STUDENT_IMPORT_WORKERS = config("STUDENT_IMPORT_WORKERS", default=0, cast=int)
+# Delta sync (book/changes.py): how long deletions are remembered, and how
+# far behind "now" a caught-up sync token stays for late-committing writes
+CHANGES_TOMBSTONE_DAYS = config("CHANGES_TOMBSTONE_DAYS", default=30, cast=int)
+CHANGES_SAFETY_SECONDS = config("CHANGES_SAFETY_SECONDS", default=10, cast=int)
+# Rental change events (book/events.py): Redis pub/sub channel, and SSE
+# keepalive interval for /api/rentals/events/
+RENTAL_EVENTS_CHANNEL = config("RENTAL_EVENTS_CHANNEL", default="bookrent:rental-events")
+SSE_HEARTBEAT_SECONDS = config("SSE_HEARTBEAT_SECONDS", default=15, cast=int)
+# JWT principal cache (book/authentication.py): shared TTL, and how long a
+# worker may keep a user (e.g. just deactivated) in its local tier
+PRINCIPAL_CACHE_TTL = config("PRINCIPAL_CACHE_TTL", default=60, cast=int)
+PRINCIPAL_LOCAL_CACHE_TTL = config("PRINCIPAL_LOCAL_CACHE_TTL", default=5, cast=int)
+
+
+# Django REST framework: JWT bearer tokens first (resolved from a cache,
+# see book/authentication.py), then the session for the browsable API/admin
+REST_FRAMEWORK = {
+    "DEFAULT_AUTHENTICATION_CLASSES": [
+        "book.authentication.CachedJWTAuthentication",
+        "rest_framework.authentication.SessionAuthentication",
+        "rest_framework.authentication.BasicAuthentication",
+    ],
+}
+
+
+# Book search
+BOOK_SEARCH_RESULTS_LIMIT = config("BOOK_SEARCH_RESULTS_LIMIT", default=50, cast=int)
+# In-memory autocomplete index (book/autocomplete.py)
+AUTOCOMPLETE_REBUILD_SECONDS = config("AUTOCOMPLETE_REBUILD_SECONDS", default=15 * 60, cast=int)
+AUTOCOMPLETE_VERSION_CHECK_SECONDS = config("AUTOCOMPLETE_VERSION_CHECK_SECONDS", default=5, cast=int)
+
+
+# Celery (background jobs)
+CELERY_BROKER_URL = config("CELERY_BROKER_URL", default=REDIS_URL)
+CELERY_RESULT_BACKEND = config("CELERY_RESULT_BACKEND", default=None)
+CELERY_TASK_ALWAYS_EAGER = config("CELERY_TASK_ALWAYS_EAGER", default=False, cast=bool)
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_TIMEZONE = TIME_ZONE
+
+CELERY_BEAT_SCHEDULE = {
+    # Re-queue placeholder books whose enrichment never ran (e.g. broker was down)
+    "enrich-pending-books": {
+        "task": "book.tasks.enrich_pending_books",
+        "schedule": 15 * 60,
+    },
+    # Backfill local thumbnails for books imported/created with a remote cover
+    "cache-missing-covers": {
+        "task": "book.tasks.cache_missing_covers",
+        "schedule": 10 * 60,
+    },
+    # Recompute status/fee of open rentals nobody saved today (book/sweep.py)
+    "sweep-rentals": {
+        "task": "book.tasks.sweep_rentals",
+        "schedule": crontab(hour=0, minute=1),
+    },
+    # Rentals become overdue as days pass; recount the dashboard summaries
+    "refresh-rental-summary-overdue": {
+        "task": "book.tasks.refresh_rental_summary_overdue",
+        "schedule": crontab(hour=0, minute=5),
+    },
+    # Deleted-rental records for delta sync (/api/rentals/changes/)
+    "purge-rental-tombstones": {
+        "task": "book.tasks.purge_rental_tombstones",
+        "schedule": crontab(hour=3, minute=0),
+    },
+}
+
+
+# Local cover thumbnails, served by /api/covers/<hash>/<size>.<fmt>
+COVER_STORE_DIR = os.path.join(MEDIA_ROOT, "covers")
+COVER_SIZES = {
+    "small": (128, 192),
+    "medium": (256, 384),
+}
+OPENLIBRARY_COVERS_URL = config("OPENLIBRARY_COVERS_URL", default="https://covers.openlibrary.org")
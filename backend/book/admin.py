@@ -13,6 +13,7 @@ class UserAdmin(BaseUserAdmin):
     list_display = ['email', 'username', 'is_staff', 'is_active']
     list_filter = ['is_staff', 'is_active']
     search_fields = ['email', 'username']
+    actions = ['revoke_tokens']
 
     fieldsets = (
         (None, {'fields': ('email', 'username', 'password')}),
@@ -32,6 +33,12 @@ class UserAdmin(BaseUserAdmin):
         fieldsets = super().get_fieldsets(request, obj)
         return fieldsets
 
+    @admin.action(description=_('Revoke API tokens'))
+    def revoke_tokens(self, request, queryset):
+        for user in queryset:
+            user.revoke_tokens()
+        self.message_user(request, _('Revoked the tokens of %d user(s).') % len(queryset))
+
 
 # -----------------------
 # Book Admin
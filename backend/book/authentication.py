@@ -0,0 +1,109 @@
+"""
+JWT authentication without a user query per request.
+
+simplejwt's JWTAuthentication loads the User row for every authenticated
+request. CachedJWTAuthentication resolves it from a short-TTL cache of the
+few fields a request needs (book.cache.TieredCache: per-process LRU in
+front of Redis), and rebuilds the User with the other fields deferred.
+
+The cache is dropped when a user is saved or deleted (book/signals.py).
+Tokens carry the user's token_version; a token whose version no longer
+matches (password changed, User.revoke_tokens()) is refused. Another
+worker's local tier can serve the old entry for PRINCIPAL_LOCAL_CACHE_TTL
+seconds at most.
+
+Every API view is open (AllowAny) and the frontend sends "Bearer null"
+when logged out, so a missing, malformed or expired token makes the
+request anonymous rather than failing it. A revoked token, or one whose
+user is gone or inactive, fails with 401 so the client knows to log in
+again.
+"""
+from django.conf import settings
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from book.cache import TieredCache
+from book.models import User
+
+
+# Loaded on a cache miss; any other field is fetched on first access. In
+# model field order, as Model.from_db() expects.
+PRINCIPAL_FIELDS = [
+    field.attname
+    for field in User._meta.concrete_fields
+    if field.attname in {"id", "email", "username", "is_active", "is_staff", "is_superuser", "token_version"}
+]
+
+# Values frontends send when they have no token to send
+NO_TOKEN = {b"null", b"undefined"}
+
+principal_cache = TieredCache(
+    "principal", local_ttl=settings.PRINCIPAL_LOCAL_CACHE_TTL, local_alias="local-principal"
+)
+
+
+def invalidate_principal(user_id):
+    principal_cache.delete(user_id)
+
+
+class VersionedRefreshToken(RefreshToken):
+    """RefreshToken with the user's token_version; access tokens made from it copy the claim."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token["token_version"] = user.token_version
+        return token
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        try:
+            raw_token = self.get_raw_token(header)
+            if raw_token is None or raw_token in NO_TOKEN:
+                return None
+            validated_token = self.get_validated_token(raw_token)
+        except (InvalidToken, AuthenticationFailed):
+            return None
+
+        return self.get_user(validated_token), validated_token
+
+    def _load_principal(self, user_id):
+        principal = User.objects.filter(pk=user_id)
+        fields = principal.values(*PRINCIPAL_FIELDS).first()
+        # Cached even when missing, so a deleted user's tokens don't query either
+        principal_cache.set(user_id, fields, settings.PRINCIPAL_CACHE_TTL)
+        # A revocation that committed between the query and the set has
+        # already run its invalidation, and the entry just stored would undo
+        # it for PRINCIPAL_CACHE_TTL. Look again now that it is stored: any
+        # later commit invalidates after this point.
+        checked = principal.values("token_version", "is_active").first()
+        if checked != (fields and {"token_version": fields["token_version"], "is_active": fields["is_active"]}):
+            principal_cache.delete(user_id)
+            fields = principal.values(*PRINCIPAL_FIELDS).first()
+        return fields
+
+    def get_user(self, validated_token):
+        """The token's user; AuthenticationFailed if it is gone, inactive or the token was revoked."""
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        hit, fields = principal_cache.get(user_id)
+        if not hit:
+            fields = self._load_principal(user_id)
+
+        if fields is None:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+        if not fields["is_active"]:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        if validated_token.get("token_version", 0) != fields["token_version"]:
+            raise AuthenticationFailed("Token has been revoked", code="token_revoked")
+        return User.from_db(User.objects.db, PRINCIPAL_FIELDS, [fields[name] for name in PRINCIPAL_FIELDS])
@@ -0,0 +1,360 @@
+"""
+In-memory prefix index for book autocomplete.
+
+Titles and authors (and the word starts inside them, so "potter" finds
+"Harry Potter") are kept as a sorted array of (term, book_id). A prefix
+lookup is two bisects plus a top-k by rental popularity, with no database
+access: suggest() never queries and never waits on a query.
+
+The index is loaded by a background thread, started by the first lookup
+(which gets None until it is ready) and again every
+AUTOCOMPLETE_REBUILD_SECONDS. The new catalog is built off to the side and
+swapped in with one assignment. Between rebuilds:
+- signals in this process add/update/remove books and bump popularity
+- every change to an indexed field, and every delete, is published in the
+  shared cache as a new catalog version plus the ids it touched; other
+  processes notice the version and reload just those ids (in the
+  background thread too). If part of that log has expired they rebuild.
+"""
+import bisect
+import heapq
+import threading
+import time
+import traceback
+import unicodedata
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+
+from book.models import Book
+
+
+VERSION_KEY = "autocomplete:catalog-version"
+CHANGE_KEY = "autocomplete:change:{}"
+# Processes that fall further behind than this rebuild instead
+CHANGE_LOG_TTL = 60 * 60
+MAX_CATCH_UP_VERSIONS = 500
+# Fields shown by the index; saves that change none of them aren't published
+INDEXED_FIELDS = ("title", "author", "cover_hash")
+# Ranges bigger than this (very short prefixes) get their top-k memoized
+LARGE_RANGE = 2000
+MAX_WORD_TERMS = 8
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse whitespace."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.lower().split())
+
+
+def _terms(title, author):
+    terms = set()
+    for text in (title, author):
+        text = normalize(text)
+        if not text:
+            continue
+        terms.add(text)
+        words = text.split(" ")
+        for i in range(1, min(len(words), MAX_WORD_TERMS + 1)):
+            if len(words[i]) >= 3:
+                terms.add(" ".join(words[i:]))
+    return terms
+
+
+def _rows(queryset):
+    """(id, title, author, cover_hash, popularity) of each book."""
+    return queryset.annotate(popularity=Count("rentals")).values_list(
+        "id", "title", "author", "cover_hash", "popularity"
+    )
+
+
+class Catalog:
+    """
+    The indexed books. Not thread safe: PrefixIndex guards the live one
+    with its lock, and builds replacements where no one else can see them.
+    """
+
+    def __init__(self):
+        self.entries = []       # sorted [(term, book_id)]
+        self.books = {}         # book_id -> {"title", "author", "cover_hash", "popularity"}
+        self.top_cache = {}     # prefix -> [book_id] for large ranges
+
+    @classmethod
+    def load(cls, rows):
+        catalog = cls()
+        for book_id, title, author, cover_hash, popularity in rows:
+            catalog.books[book_id] = {
+                "title": title,
+                "author": author,
+                "cover_hash": cover_hash,
+                "popularity": popularity,
+            }
+            catalog.entries.extend((term, book_id) for term in _terms(title, author))
+        catalog.entries.sort()
+        return catalog
+
+    def _rank(self, book_id):
+        return self.books[book_id]["popularity"], -book_id
+
+    def _cached_prefixes(self, book):
+        """Memoized prefixes whose range holds the book."""
+        terms = _terms(book["title"], book["author"])
+        return [prefix for prefix in self.top_cache if any(term.startswith(prefix) for term in terms)]
+
+    def _offer(self, book_id):
+        """Let a book whose rank went up (or that is new) into the memoized top-k lists it belongs to."""
+        rank = self._rank(book_id)
+        for prefix in self._cached_prefixes(self.books[book_id]):
+            top = self.top_cache[prefix]
+            if book_id in top:
+                top.sort(key=self._rank, reverse=True)
+            elif top and rank > self._rank(top[-1]):
+                top[-1] = book_id
+                top.sort(key=self._rank, reverse=True)
+
+    def _remove_terms(self, book_id, book):
+        for term in _terms(book["title"], book["author"]):
+            i = bisect.bisect_left(self.entries, (term, book_id))
+            if i < len(self.entries) and self.entries[i] == (term, book_id):
+                del self.entries[i]
+
+    def remove(self, book_id):
+        book = self.books.pop(book_id, None)
+        if not book:
+            return
+        self._remove_terms(book_id, book)
+        # Dropping a book from a top-k list leaves the top k-1 of the rest;
+        # a lookup wanting more recomputes
+        for prefix in self._cached_prefixes(book):
+            top = self.top_cache[prefix]
+            if book_id in top:
+                top.remove(book_id)
+
+    def put(self, book_id, title, author, cover_hash, popularity=None):
+        current = self.books.get(book_id)
+        if current and popularity is None:
+            popularity = current["popularity"]
+        if current and (_terms(current["title"], current["author"]) != _terms(title, author)
+                        or popularity < current["popularity"]):
+            # Its ranges moved or it ranks lower: recompute those prefixes
+            for prefix in self._cached_prefixes(current):
+                del self.top_cache[prefix]
+        if current:
+            self._remove_terms(book_id, current)
+        self.books[book_id] = {
+            "title": title,
+            "author": author,
+            "cover_hash": cover_hash,
+            "popularity": popularity or 0,
+        }
+        for term in _terms(title, author):
+            bisect.insort(self.entries, (term, book_id))
+        self._offer(book_id)
+
+    def bump(self, book_id, delta):
+        book = self.books.get(book_id)
+        if not book:
+            return
+        book["popularity"] += delta
+        if delta >= 0:
+            self._offer(book_id)
+        else:
+            for prefix in self._cached_prefixes(book):
+                del self.top_cache[prefix]
+
+    def top_ids(self, prefix, limit):
+        lo = bisect.bisect_left(self.entries, (prefix,))
+        hi = bisect.bisect_left(self.entries, (prefix + "\uffff",))
+        if hi - lo > LARGE_RANGE:
+            cached = self.top_cache.get(prefix)
+            if cached is not None and len(cached) >= limit:
+                return cached[:limit]
+
+        ids = {book_id for _, book_id in self.entries[lo:hi]}
+        top = heapq.nlargest(limit, ids, key=self._rank)
+        if hi - lo > LARGE_RANGE:
+            self.top_cache[prefix] = top
+        return top
+
+
+class PrefixIndex:
+    """Live Catalog plus the background loading that keeps it current; see module docstring."""
+
+    def __init__(self):
+        # Guards in-memory work only; never held across a query
+        self._lock = threading.Lock()
+        self._catalog = None
+        self._built_at = 0.0
+        self._checked_at = 0.0
+        self._version = None
+        self._worker = None
+        # Local changes made while a rebuild loads, replayed onto the new catalog
+        self._pending = None
+
+    # ----------------------------
+    # Loading (background thread, or called directly)
+    # ----------------------------
+    def rebuild(self):
+        with self._lock:
+            self._pending = []
+        try:
+            # Read before loading: changes published meanwhile are caught up on next
+            version = _shared_version()
+            catalog = Catalog.load(_rows(Book.objects.all()).iterator(chunk_size=5000))
+            with self._lock:
+                for method, args in self._pending:
+                    getattr(catalog, method)(*args)
+                self._catalog = catalog
+                self._version = version
+                self._built_at = self._checked_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._pending = None
+
+    def catch_up(self, version):
+        """Reload the books changed between our catalog version and `version`."""
+        book_ids = _changed_book_ids(self._version, version)
+        if book_ids is None:
+            return self.rebuild()
+        rows = list(_rows(Book.objects.filter(id__in=book_ids))) if book_ids else []
+        with self._lock:
+            for book_id in book_ids - {row[0] for row in rows}:
+                self._apply("remove", book_id)
+            for row in rows:
+                self._apply("put", *row)
+            self._version = version
+
+    def _run(self, job, *args):
+        try:
+            job(*args)
+        except Exception:
+            print("Autocomplete index load failed:\n", traceback.format_exc())
+        finally:
+            connection.close()
+            self._worker = None
+
+    def _start(self, job, *args):
+        with self._lock:
+            if self._worker is not None:
+                return
+            worker = self._worker = threading.Thread(target=self._run, args=(job, *args), daemon=True)
+        worker.start()
+
+    def _refresh(self):
+        """Start a background load if the index is missing, old or behind other processes."""
+        now = time.monotonic()
+        if self._catalog is None or now - self._built_at > settings.AUTOCOMPLETE_REBUILD_SECONDS:
+            self._start(self.rebuild)
+            return
+        if now - self._checked_at < settings.AUTOCOMPLETE_VERSION_CHECK_SECONDS:
+            return
+        self._checked_at = now
+        version = _shared_version()
+        if version != self._version:
+            self._start(self.catch_up, version)
+
+    # ----------------------------
+    # Incremental updates (same process)
+    # ----------------------------
+    def _apply(self, method, *args):
+        """Call with the lock held."""
+        if self._catalog is not None:
+            getattr(self._catalog, method)(*args)
+        if self._pending is not None:
+            self._pending.append((method, args))
+
+    def add_or_update_book(self, book):
+        with self._lock:
+            self._apply("put", book.id, book.title, book.author, book.cover_hash)
+
+    def remove_book(self, book_id):
+        with self._lock:
+            self._apply("remove", book_id)
+
+    def bump_popularity(self, book_id, delta=1):
+        with self._lock:
+            self._apply("bump", book_id, delta)
+
+    # ----------------------------
+    # Lookup
+    # ----------------------------
+    def suggest(self, query, limit=10):
+        """
+        Top `limit` books whose title/author (or a word in them) starts with
+        `query`, or None while the index is still loading.
+        """
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        self._refresh()
+        with self._lock:
+            if self._catalog is None:
+                return None
+            return [
+                {"id": book_id, **self._catalog.books[book_id]}
+                for book_id in self._catalog.top_ids(prefix, limit)
+            ]
+
+
+# Skip the shared cache for a while after it fails, instead of paying the
+# connect timeout on every version check
+_shared_down_until = 0.0
+
+
+def _shared_failed():
+    global _shared_down_until
+    _shared_down_until = time.monotonic() + 30
+
+
+def _shared_version():
+    if time.monotonic() < _shared_down_until:
+        return None
+    try:
+        return cache.get(VERSION_KEY)
+    except Exception:
+        _shared_failed()
+        return None
+
+
+def _changed_book_ids(since, until):
+    """Ids changed in versions (since, until], or None when the log can't tell (rebuild)."""
+    # No version yet when we loaded: the log starts at 1
+    since = since or 0
+    if until is None or until < since or until - since > MAX_CATCH_UP_VERSIONS:
+        return None
+    keys = [CHANGE_KEY.format(version) for version in range(since + 1, until + 1)]
+    try:
+        changes = cache.get_many(keys)
+    except Exception:
+        _shared_failed()
+        return None
+    book_ids = set()
+    for key in keys:
+        # Expired, evicted, or a bulk change published without ids
+        if changes.get(key) is None:
+            return None
+        book_ids.update(changes[key])
+    return book_ids
+
+
+def publish_catalog_change(book_ids=None):
+    """
+    Tell other processes that these books were added, edited or deleted;
+    without ids (bulk imports), that they should rebuild.
+    """
+    if time.monotonic() < _shared_down_until:
+        return
+    try:
+        if cache.add(VERSION_KEY, 1, None):
+            version = 1
+        else:
+            version = cache.incr(VERSION_KEY)
+        cache.set(CHANGE_KEY.format(version), list(book_ids) if book_ids is not None else None, CHANGE_LOG_TTL)
+    except Exception:
+        _shared_failed()
+
+
+book_index = PrefixIndex()
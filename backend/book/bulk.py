@@ -0,0 +1,293 @@
+"""
+Bulk rental operations.
+
+These do the work of the single-rental views for many rentals at once with
+a fixed number of queries: lookups use IN queries, inserts use
+bulk_create and updates are set-based. Since bulk_create/update() skip
+Rental.save() and its signals, the rental summaries and the autocomplete
+index are updated here explicitly.
+"""
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Upper
+from django.utils import timezone
+
+from book.autocomplete import book_index, publish_catalog_change
+from book.events import publish_on_commit, rental_event
+from book.expressions import (
+    FREE_DAYS,
+    AddDays,
+    book_pages_subquery,
+    due_date_expression,
+    rental_fee_expression,
+    rental_status_expression,
+)
+from book.models import Book, Rental, Student
+from book.response_cache import invalidate_rentals
+from book.summary import apply_snapshot_diff, snapshot
+from book.tasks import cache_book_cover, enrich_book
+from book.utils import openlibrary_cache, title_cache_key
+
+
+# Titles folded per query in title_keys(); well under every backend's column limit
+TITLE_KEY_BATCH = 500
+
+
+def _error(index, message):
+    return {"index": index, "status": "error", "error": message}
+
+
+# ---------------------- Bulk create ----------------------
+
+def title_keys(titles):
+    """
+    {title: UPPER(title)} as the database folds case, the way title__iexact
+    (CreateRentalView) and book_title_upper_idx compare titles. Python's
+    str.upper() folds more than SQLite's ASCII-only UPPER(), so keys from
+    one side would miss or merge titles the per-row path treats otherwise.
+    """
+    titles = list(titles)
+    keys = {}
+    with connection.cursor() as cursor:
+        for start in range(0, len(titles), TITLE_KEY_BATCH):
+            batch = titles[start:start + TITLE_KEY_BATCH]
+            cursor.execute("SELECT " + ", ".join(["UPPER(%s)"] * len(batch)), batch)
+            keys.update(zip(batch, cursor.fetchone()))
+    return keys
+
+
+def resolve_books(titles):
+    """
+    Map each title to a Book, or None when OpenLibrary is known not to have
+    it. Like CreateRentalView, but for all titles at once and without
+    network I/O:
+    - existing books are matched case-insensitively with one query
+    - the rest are looked up in the OpenLibrary cache with one round trip
+    - cache misses become "pending" placeholders, enriched by Celery tasks
+      (which run in parallel across workers) after commit; enrich_book
+      voids their rentals if OpenLibrary turns out not to know the title
+    """
+    keys = title_keys(titles)
+    # Titles differing only in case share one book
+    wanted = {key: title for title, key in keys.items()}
+    found = {}
+    existing = (
+        Book.objects.annotate(title_key=Upper("title"))
+        .filter(title_key__in=list(wanted))
+        .order_by("id")
+    )
+    for book in existing:
+        # Placeholders OpenLibrary didn't know stay around as a negative result
+        found.setdefault(book.title_key, None if book.enrichment_status == "not_found" else book)
+
+    missing = {key: title for key, title in wanted.items() if key not in found}
+    if not missing:
+        return {title: found[key] for title, key in keys.items()}
+
+    cached = openlibrary_cache.get_many([title_cache_key(title) for title in missing.values()])
+    with_olid = {}
+    new_books = []
+    placeholders = []
+    for key, title in missing.items():
+        hit, book_info = cached[title_cache_key(title)]
+        if hit and not book_info:
+            found[key] = None
+        elif hit:
+            fields = {
+                "title": book_info["title"],
+                "author": book_info["author"],
+                "pages": book_info["pages"],
+                "cover_url": book_info["cover_url"],
+                "first_publish_year": book_info["first_publish_year"],
+            }
+            if book_info["olid"]:
+                with_olid.setdefault(book_info["olid"], (fields, []))[1].append(key)
+            else:
+                book = Book(**fields)
+                new_books.append(book)
+                found[key] = book
+        else:
+            book = Book(title=title, enrichment_status="pending")
+            placeholders.append(book)
+            found[key] = book
+
+    if with_olid:
+        # olid is unique: the work may already exist under another title
+        Book.objects.bulk_create(
+            [Book(olid=olid, **fields) for olid, (fields, _) in with_olid.items()],
+            ignore_conflicts=True,
+        )
+        for book in Book.objects.filter(olid__in=list(with_olid)):
+            for key in with_olid[book.olid][1]:
+                found[key] = book
+
+    Book.objects.bulk_create(new_books + placeholders)
+
+    # bulk_create skips the Book signals that maintain the autocomplete index
+    added = {found[key] for key in missing if found[key]}
+    pending_ids = [book.id for book in placeholders]
+    cover_ids = {book.id for book in added if book.cover_url and not book.cover_hash}
+
+    def queue_tasks():
+        for book in added:
+            book_index.add_or_update_book(book)
+        publish_catalog_change([book.id for book in added])
+        for book_id in pending_ids:
+            enrich_book.delay(book_id)
+        for book_id in cover_ids:
+            cache_book_cover.delay(book_id)
+
+    transaction.on_commit(queue_tasks, robust=True)
+    return {title: found[key] for title, key in keys.items()}
+
+
+@transaction.atomic
+def create_rentals(items):
+    """
+    Create a rental for each {"student_id", "title"} item.
+    Returns one result per item, in order: {"index", "status": "created", ...}
+    or {"index", "status": "error", "error"}. Invalid items are reported and
+    skipped; the others are still created.
+    """
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = _error(index, "Each item must be an object")
+            continue
+        title = str(item.get("title") or "").strip()
+        if not title:
+            results[index] = _error(index, "Book title is required")
+            continue
+        try:
+            student_id = int(item.get("student_id"))
+        except (TypeError, ValueError):
+            results[index] = _error(index, "student_id is required")
+            continue
+        valid.append((index, student_id, title))
+
+    students = dict(
+        Student.objects.filter(id__in={student_id for _, student_id, _ in valid}).values_list("id", "user_id")
+    )
+    books = resolve_books({title for _, _, title in valid}) if valid else {}
+
+    today = timezone.now().date()
+    rentals = []
+    for index, student_id, title in valid:
+        if student_id not in students:
+            results[index] = _error(index, "Student not found")
+            continue
+        book = books.get(title)
+        if book is None:
+            results[index] = _error(index, "Book not found in OpenLibrary")
+            continue
+        rental = Rental(user_id=students[student_id], book=book, start_date=today)
+        rental.refresh_derived_fields()
+        rentals.append((index, rental))
+
+    Rental.objects.bulk_create([rental for _, rental in rentals], batch_size=500)
+
+    if rentals:
+        created = Rental.objects.filter(id__in=[rental.id for _, rental in rentals])
+        apply_snapshot_diff({}, snapshot(created, today))
+        invalidate_rentals({rental.user_id for _, rental in rentals})
+        publish_on_commit([rental_event("rental.created", rental) for _, rental in rentals])
+        popularity = Counter(rental.book_id for _, rental in rentals)
+        transaction.on_commit(
+            lambda: [book_index.bump_popularity(book_id, count) for book_id, count in popularity.items()]
+        )
+
+    for index, rental in rentals:
+        results[index] = {
+            "index": index,
+            "status": "created",
+            "rental_id": rental.id,
+            "book": rental.book.title,
+            "book_enrichment_status": rental.book.enrichment_status,
+            "start_date": rental.start_date.strftime("%Y-%m-%d"),
+            "free_month_ends": rental.due_date.strftime("%Y-%m-%d"),
+            "status_detail": rental.status,
+        }
+    return results
+
+
+# ---------------------- Bulk extend / return ----------------------
+# Same results as Rental.extend_rental()/mark_returned() followed by save(),
+# as two UPDATEs over all rentals: the first sets end_date (and status on
+# return), the second the fields derived from it. Two statements because
+# MySQL evaluates SET assignments left to right with the new values.
+
+def _lock_open_rentals(ids, returned_error):
+    """
+    Lock the given rentals in id order. Returns (open ids, {id: error}) for
+    ids that don't exist or are already returned, and queues invalidation of
+    the cached responses showing the open ones.
+    """
+    rows = Rental.objects.select_for_update().filter(id__in=ids).order_by("id").values_list("id", "status", "user_id")
+    statuses = {rental_id: (rental_status, user_id) for rental_id, rental_status, user_id in rows}
+    errors = {}
+    open_ids = []
+    user_ids = set()
+    for rental_id in ids:
+        if rental_id not in statuses:
+            errors[rental_id] = "Rental not found"
+        elif statuses[rental_id][0] == "returned":
+            errors[rental_id] = returned_error
+        else:
+            open_ids.append(rental_id)
+            user_ids.add(statuses[rental_id][1])
+    invalidate_rentals(user_ids)
+    return open_ids, errors
+
+
+def _derived_fields(today):
+    return {
+        "due_date": due_date_expression(),
+        "total_fee": rental_fee_expression(today, pages=book_pages_subquery()),
+    }
+
+
+def _publish(rentals, event_type):
+    rows = rentals.only("id", "user_id", "book_id", "status", "end_date", "total_fee")
+    publish_on_commit([rental_event(event_type, rental) for rental in rows])
+
+
+@transaction.atomic
+def extend_rentals(ids, months=1, today=None):
+    """
+    Push the end date of each open rental `months` * 30 days past its
+    current end date (or today). Returns (extended ids, {id: error}).
+    """
+    today = today or timezone.now().date()
+    open_ids, errors = _lock_open_rentals(ids, "Cannot extend a returned rental")
+    if open_ids:
+        rentals = Rental.objects.filter(id__in=open_ids)
+        before = snapshot(rentals, today)
+        rentals.update(
+            end_date=AddDays(Coalesce(F("end_date"), Value(today)), months * FREE_DAYS),
+            updated_at=timezone.now(),
+        )
+        rentals.update(status=rental_status_expression(today), **_derived_fields(today))
+        apply_snapshot_diff(before, snapshot(rentals, today))
+        _publish(rentals, "rental.extended")
+    return open_ids, errors
+
+
+@transaction.atomic
+def return_rentals(ids, today=None):
+    """
+    Mark each open rental returned, ending today unless it already has an
+    end date. Returns (returned ids, {id: error}).
+    """
+    today = today or timezone.now().date()
+    open_ids, errors = _lock_open_rentals(ids, "Rental already returned")
+    if open_ids:
+        rentals = Rental.objects.filter(id__in=open_ids)
+        before = snapshot(rentals, today)
+        rentals.update(end_date=Coalesce(F("end_date"), Value(today)), status="returned", updated_at=timezone.now())
+        rentals.update(**_derived_fields(today))
+        apply_snapshot_diff(before, snapshot(rentals, today))
+        _publish(rentals, "rental.returned")
+    return open_ids, errors
@@ -0,0 +1,167 @@
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+
+
+class TieredCache:
+    """
+    Two-tier cache: a per-process LRU ("local" cache alias) in front of the
+    shared Redis cache ("default" alias). Namespaces that must not evict each
+    other get their own local alias (see CACHES in settings).
+
+    Values are wrapped before storing so that a cached ``None`` (negative
+    result) can be told apart from a miss. If Redis is unreachable the
+    shared tier is skipped for a short back-off period and the cache keeps
+    working with the local tier only.
+    """
+
+    SHARED_BACKOFF_SECONDS = 30
+
+    def __init__(self, namespace, local_ttl=None, local_alias="local", shared_alias="default"):
+        self.namespace = namespace
+        self.local_ttl = local_ttl
+        self.local_alias = local_alias
+        self.shared_alias = shared_alias
+
+        self._lock = threading.Lock()
+        self._counters = {"local_hits": 0, "shared_hits": 0, "negative_hits": 0, "misses": 0, "sets": 0}
+        self._shared_down_until = 0.0
+
+    # ----------------------------
+    # Internal helpers
+    # ----------------------------
+    def _key(self, key):
+        return f"{self.namespace}:{key}"
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _local(self):
+        return caches[self.local_alias]
+
+    def _shared(self):
+        """Return the shared cache, or None while it is backing off after an error."""
+        if time.monotonic() < self._shared_down_until:
+            return None
+        return caches[self.shared_alias]
+
+    def _shared_failed(self, error):
+        print(f"Shared cache unavailable ({self.namespace}):", error)
+        self._shared_down_until = time.monotonic() + self.SHARED_BACKOFF_SECONDS
+
+    def _local_timeout(self, ttl):
+        if self.local_ttl is None:
+            return ttl
+        return min(ttl, self.local_ttl)
+
+    # ----------------------------
+    # Public API
+    # ----------------------------
+    def get(self, key):
+        """
+        Look a key up in both tiers.
+        Returns a ``(hit, value)`` tuple; ``value`` may be ``None`` on a negative hit.
+        """
+        cache_key = self._key(key)
+
+        wrapped = self._local().get(cache_key)
+        if wrapped is not None:
+            self._count("local_hits")
+        else:
+            shared = self._shared()
+            if shared is not None:
+                try:
+                    wrapped = shared.get(cache_key)
+                except Exception as e:
+                    self._shared_failed(e)
+                    wrapped = None
+            if wrapped is None:
+                self._count("misses")
+                return False, None
+
+            self._count("shared_hits")
+            # Promote to the local tier; the entry's remaining shared TTL is
+            # unknown, so keep it for the local TTL only.
+            self._local().set(cache_key, wrapped, self._local_timeout(wrapped["ttl"]))
+
+        if wrapped["value"] is None:
+            self._count("negative_hits")
+        return True, wrapped["value"]
+
+    def get_many(self, keys):
+        """
+        Like get() for several keys, with one round trip per tier.
+        Returns ``{key: (hit, value)}`` for every key.
+        """
+        cache_keys = {self._key(key): key for key in keys}
+        found = self._local().get_many(list(cache_keys))
+        for _ in found:
+            self._count("local_hits")
+
+        missing = [cache_key for cache_key in cache_keys if cache_key not in found]
+        shared = self._shared() if missing else None
+        if shared is not None:
+            try:
+                promoted = shared.get_many(missing)
+            except Exception as e:
+                self._shared_failed(e)
+                promoted = {}
+            for cache_key, wrapped in promoted.items():
+                self._count("shared_hits")
+                self._local().set(cache_key, wrapped, self._local_timeout(wrapped["ttl"]))
+            found.update(promoted)
+
+        results = {}
+        for cache_key, key in cache_keys.items():
+            wrapped = found.get(cache_key)
+            if wrapped is None:
+                self._count("misses")
+                results[key] = (False, None)
+                continue
+            if wrapped["value"] is None:
+                self._count("negative_hits")
+            results[key] = (True, wrapped["value"])
+        return results
+
+    def set(self, key, value, ttl):
+        """Store a value (``None`` for a negative result) in both tiers."""
+        cache_key = self._key(key)
+        wrapped = {"value": value, "ttl": ttl}
+
+        self._local().set(cache_key, wrapped, self._local_timeout(ttl))
+        shared = self._shared()
+        if shared is not None:
+            try:
+                shared.set(cache_key, wrapped, ttl)
+            except Exception as e:
+                self._shared_failed(e)
+        self._count("sets")
+
+    def delete(self, key):
+        cache_key = self._key(key)
+        self._local().delete(cache_key)
+        shared = self._shared()
+        if shared is not None:
+            try:
+                shared.delete(cache_key)
+            except Exception as e:
+                self._shared_failed(e)
+
+    async def aget(self, key):
+        # Django's cache backends are sync; run them off the event loop
+        return await sync_to_async(self.get, thread_sensitive=False)(key)
+
+    async def aset(self, key, value, ttl):
+        await sync_to_async(self.set, thread_sensitive=False)(key, value, ttl)
+
+    def stats(self):
+        """Hit/miss counters for this process."""
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats["local_hits"] + stats["shared_hits"] + stats["misses"]
+        stats["lookups"] = lookups
+        stats["hit_ratio"] = round((lookups - stats["misses"]) / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,117 @@
+"""
+Delta sync of rentals (/api/rentals/changes/).
+
+A client keeps a local copy of the rentals and asks for what changed since
+its last sync token. The token holds its position in two streams, both
+walked by keyset on an index:
+- rentals by (updated_at, id): new or modified rows, including rows whose
+  book or student changed (those writes touch the rentals' updated_at)
+- tombstones by (deleted_at, id): deleted rentals
+
+A transaction may commit after a later one, with an older updated_at. So a
+caught-up stream never advances past "now - CHANGES_SAFETY_SECONDS". Rows
+in that window are sent again next time, and clients upsert them.
+
+"is_overdue" changes as days pass without any write. A token from an
+earlier day therefore also brings back the open rentals that fell due
+since then (rental_open_due_date_idx).
+"""
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+
+from book.expressions import overdue_q
+from book.models import RentalTombstone
+from book.pagination import InvalidCursor, KeysetPaginator, decode_cursor, encode_cursor
+
+
+SYNC_START = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+rental_stream = KeysetPaginator(["updated_at", "id"])
+tombstone_stream = KeysetPaginator(["deleted_at", "id"])
+
+
+class ExpiredToken(InvalidCursor):
+    """The token is older than the tombstones kept; the client must resync from scratch."""
+
+
+def _read(paginator, queryset, position, page_size, cutoff):
+    """(rows, new position, has_more) for one stream, from a (timestamp, id) position."""
+    rows, next_cursor = paginator.paginate(queryset, encode_cursor(position), page_size)
+    timestamp_field = paginator.fields[0][0]
+    last = (getattr(rows[-1], timestamp_field), rows[-1].id) if rows else position
+    if next_cursor:
+        return rows, last, True
+    if last > (cutoff, 0):
+        last = max(position, (cutoff, 0))
+    return rows, last, False
+
+
+def decode_token(token):
+    """(rental position, tombstone position, as_of date) from a sync token."""
+    values = decode_cursor(token, 5)
+    try:
+        rental_ts, rental_id, tomb_ts, tomb_id, as_of = values
+        rental_position = (datetime.fromisoformat(rental_ts), int(rental_id))
+        tombstone_position = (datetime.fromisoformat(tomb_ts), int(tomb_id))
+        as_of = date.fromisoformat(as_of)
+    except (TypeError, ValueError) as e:
+        raise InvalidCursor("Invalid sync token") from e
+    if tombstone_position[0].tzinfo is None or rental_position[0].tzinfo is None:
+        raise InvalidCursor("Invalid sync token")
+    return rental_position, tombstone_position, as_of
+
+
+def encode_token(rental_position, tombstone_position, as_of):
+    return encode_cursor([
+        rental_position[0].isoformat(),
+        rental_position[1],
+        tombstone_position[0].isoformat(),
+        tombstone_position[1],
+        as_of.isoformat(),
+    ])
+
+
+def rental_changes(queryset, token=None, page_size=None):
+    """
+    Rentals of `queryset` changed since `token` (None: all of them, for the
+    first sync) and ids deleted since. Returns {"rentals", "deleted",
+    "next", "has_more"}; rentals come with fee annotations, book and student.
+    Raises InvalidCursor for a malformed token, ExpiredToken for one older
+    than the tombstones kept.
+    """
+    now = timezone.now()
+    today = timezone.localdate()
+    cutoff = now - timedelta(seconds=settings.CHANGES_SAFETY_SECONDS)
+    page_size = page_size or settings.API_PAGE_SIZE
+
+    if token:
+        rental_position, tombstone_position, as_of = decode_token(token)
+        if tombstone_position[0] < now - timedelta(days=settings.CHANGES_TOMBSTONE_DAYS):
+            raise ExpiredToken("Sync token expired, sync again without a token")
+    else:
+        # A new client has nothing to delete yet
+        rental_position, tombstone_position, as_of = (SYNC_START, 0), (cutoff, 0), today
+
+    rentals = queryset.select_related("book", "user__student_profile").with_fees(today)
+    changed, rental_position, more_rentals = _read(rental_stream, rentals, rental_position, page_size, cutoff)
+    tombstones, tombstone_position, more_tombstones = _read(
+        tombstone_stream, RentalTombstone.objects.all(), tombstone_position, page_size, cutoff
+    )
+
+    if token and as_of < today:
+        # Fell due since the token was issued: is_overdue flipped without a write
+        seen = {rental.id for rental in changed}
+        changed += [
+            rental
+            for rental in rentals.filter(overdue_q(today), due_date__gte=as_of).order_by("due_date", "id")
+            if rental.id not in seen
+        ]
+
+    return {
+        "rentals": changed,
+        "deleted": [tombstone.rental_id for tombstone in tombstones],
+        "next": encode_token(rental_position, tombstone_position, today),
+        "has_more": more_rentals or more_tombstones,
+    }
@@ -0,0 +1,73 @@
+"""
+Local cover image store.
+
+Each cover is downloaded once, hashed (sha256 of the original bytes) and
+stored as small/medium JPEG + WebP thumbnails under
+MEDIA_ROOT/covers/<hash[:2]>/<hash>/<size>.<format>. Identical images share
+one entry, and since the path is derived from the content the files never
+change, so they can be served with long-lived cache headers.
+"""
+import hashlib
+import io
+import os
+import re
+
+from django.conf import settings
+from django.urls import reverse
+from PIL import Image
+
+
+COVER_FORMATS = {"jpg": "JPEG", "webp": "WEBP"}
+COVER_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+MAX_COVER_BYTES = 10 * 1024 * 1024
+
+
+def cover_dir(cover_hash):
+    return os.path.join(settings.COVER_STORE_DIR, cover_hash[:2], cover_hash)
+
+
+def cover_path(cover_hash, size, fmt):
+    return os.path.join(cover_dir(cover_hash), f"{size}.{fmt}")
+
+
+def _write_atomic(path, data):
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def store_cover(image_bytes):
+    """
+    Generate and store thumbnails for an image, returning its content hash.
+    Already-stored images are not processed again.
+    """
+    cover_hash = hashlib.sha256(image_bytes).hexdigest()
+    expected = [cover_path(cover_hash, size, fmt) for size in settings.COVER_SIZES for fmt in COVER_FORMATS]
+    if all(os.path.exists(path) for path in expected):
+        return cover_hash
+
+    os.makedirs(cover_dir(cover_hash), exist_ok=True)
+    with Image.open(io.BytesIO(image_bytes)) as source:
+        source = source.convert("RGB")
+        for size, dimensions in settings.COVER_SIZES.items():
+            thumb = source.copy()
+            thumb.thumbnail(dimensions, Image.LANCZOS)
+            for fmt, pil_format in COVER_FORMATS.items():
+                buffer = io.BytesIO()
+                thumb.save(buffer, pil_format, quality=82, optimize=True)
+                _write_atomic(cover_path(cover_hash, size, fmt), buffer.getvalue())
+    return cover_hash
+
+
+def cover_hash_url(request, cover_hash, size="small", fmt="webp"):
+    """Absolute URL of a stored thumbnail (relative when there is no request)."""
+    path = reverse("cover-image", kwargs={"cover_hash": cover_hash, "size": size, "fmt": fmt})
+    return request.build_absolute_uri(path) if request is not None else path
+
+
+def cover_thumbnail_url(request, book, size="small", fmt="webp"):
+    """URL of a book's local thumbnail, or None if not cached yet."""
+    if not getattr(book, "cover_hash", None):
+        return None
+    return cover_hash_url(request, book.cover_hash, size, fmt)
@@ -0,0 +1,145 @@
+"""
+Rental change events over Redis pub/sub, pushed to browsers as
+Server-Sent Events (/api/rentals/events/).
+
+Writers publish small JSON events after commit: rental.created,
+rental.extended, rental.returned, rental.deleted, and rentals.refreshed
+after a bulk recompute (the nightly sweep) that didn't emit per-row
+events. Each ASGI worker process holds a single Redis subscription
+(RentalEventHub) and fans events out to its connected clients through
+in-memory queues, so an idle dashboard costs one open connection and a
+heartbeat, not a query.
+
+Events are notifications, not a log: a client that reconnects catches up
+with /api/rentals/changes/ (book/changes.py).
+"""
+import asyncio
+import contextlib
+import json
+import time
+
+import redis
+import redis.asyncio
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+
+# ---------------------- Publishing ----------------------
+
+_client = None
+_down_until = 0.0
+
+
+def _redis():
+    """Shared sync client, or None while backing off after an error."""
+    global _client
+    if time.monotonic() < _down_until:
+        return None
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL, socket_connect_timeout=0.5, socket_timeout=0.5)
+    return _client
+
+
+def rental_event(event_type, rental):
+    return {
+        "type": event_type,
+        "rental_id": rental.id,
+        "user_id": rental.user_id,
+        "book_id": rental.book_id,
+        "status": rental.status,
+        "end_date": rental.end_date.isoformat() if rental.end_date else None,
+        "total_fee": str(rental.total_fee),
+        "at": timezone.now().isoformat(),
+    }
+
+
+def publish(events):
+    """Publish events now, in one round trip. Dropped (not raised) if Redis is down."""
+    global _down_until
+    client = _redis()
+    if client is None or not events:
+        return
+    try:
+        pipe = client.pipeline(transaction=False)
+        for event in events:
+            pipe.publish(settings.RENTAL_EVENTS_CHANNEL, json.dumps(event))
+        pipe.execute()
+    except redis.RedisError as e:
+        print("Rental events unavailable:", e)
+        _down_until = time.monotonic() + 30
+
+
+def publish_on_commit(events):
+    if events:
+        transaction.on_commit(lambda: publish(events), robust=True)
+
+
+# ---------------------- Subscribing (ASGI) ----------------------
+
+class RentalEventHub:
+    """
+    One pub/sub connection per event loop, shared by every SSE client on
+    it (under uvicorn: one per worker process). A client that falls behind
+    gets a single "resync" event instead of an unbounded backlog.
+    """
+
+    QUEUE_SIZE = 100
+    RECONNECT_SECONDS = 5
+
+    def __init__(self):
+        self._loops = {}  # event loop -> (listener task, client queues)
+
+    def _deliver(self, queues, event):
+        for queue in list(queues):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
+
+    async def _listen(self, queues):
+        lost = False
+        while True:
+            client = redis.asyncio.Redis.from_url(settings.REDIS_URL)
+            try:
+                async with client.pubsub() as pubsub:
+                    await pubsub.subscribe(settings.RENTAL_EVENTS_CHANNEL)
+                    if lost:
+                        # Events may have been missed while disconnected
+                        self._deliver(queues, {"type": "resync"})
+                        lost = False
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self._deliver(queues, json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print("Rental event subscription lost:", e)
+                lost = True
+                await asyncio.sleep(self.RECONNECT_SECONDS)
+            finally:
+                await client.aclose()
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self):
+        """async with hub.subscribe() as queue: events arrive as dicts on the queue."""
+        loop = asyncio.get_running_loop()
+        if loop not in self._loops:
+            queues = set()
+            self._loops[loop] = (loop.create_task(self._listen(queues)), queues)
+        task, queues = self._loops[loop]
+        queue = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+        queues.add(queue)
+        try:
+            yield queue
+        finally:
+            queues.discard(queue)
+            if not queues:
+                # Last client on this loop: drop the Redis subscription
+                task.cancel()
+                del self._loops[loop]
+
+
+rental_event_hub = RentalEventHub()
@@ -0,0 +1,161 @@
+"""
+Rental status/fee rules as database expressions.
+
+These mirror Rental.update_status() and Rental._calculate_fee() so that
+bulk jobs can recompute rentals with one UPDATE instead of loading and
+saving each row, and so that lists can filter and sort on fees
+(Rental.objects.with_fees()). Keep both in step when the rules change.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import (
+    BooleanField,
+    Case,
+    DateField,
+    DecimalField,
+    F,
+    Func,
+    IntegerField,
+    OuterRef,
+    Q,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Round
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
+
+FREE_DAYS = 30
+
+
+class DaysBetween(Func):
+    """Whole days from the second date to the first (end - start)."""
+    output_field = IntegerField()
+    arg_joiner = " - "
+    template = "(%(expressions)s)"
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            template="CAST(julianday(%(expressions)s) AS INTEGER)",
+            arg_joiner=") - julianday(",
+            **extra_context,
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            template="DATEDIFF(%(expressions)s)",
+            arg_joiner=", ",
+            **extra_context,
+        )
+
+
+class AddDays(Func):
+    """date + a whole number of days."""
+    output_field = DateField()
+    template = "(%(expressions)s)"
+    arg_joiner = " + "
+
+    def __init__(self, expression, days, **extra):
+        super().__init__(expression, Value(days, output_field=IntegerField()), **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            template="date(%(expressions)s || ' days')",
+            arg_joiner=", '+' || ",
+            **extra_context,
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            template="DATE_ADD(%(expressions)s DAY)",
+            arg_joiner=", INTERVAL ",
+            **extra_context,
+        )
+
+
+def overdue_q(today=None):
+    """
+    Rentals not returned whose due date (end_date, or the end of the free
+    month while there is none) has passed. Matches the partial
+    rental_open_due_date_idx index.
+    """
+    today = today or timezone.now().date()
+    return ~Q(status="returned") & Q(due_date__lt=today)
+
+
+def book_pages_subquery():
+    """The rental's book pages for UPDATEs, which can't join to book."""
+    from book.models import Book
+
+    return Subquery(Book.objects.filter(pk=OuterRef("book_id")).values("pages")[:1])
+
+
+def due_date_expression():
+    """Rental.due_date as save() sets it, for bulk updates."""
+    return Coalesce(F("end_date"), AddDays(F("start_date"), FREE_DAYS))
+
+
+def free_month_end_expression():
+    return AddDays(F("start_date"), FREE_DAYS)
+
+
+def monthly_fee_expression(pages=None):
+    """pages / 100"""
+    pages = pages if pages is not None else F("book__pages")
+    return Round(pages * Value(Decimal("0.01")), 2, output_field=DecimalField(max_digits=8, decimal_places=2))
+
+
+def rental_status_expression(today):
+    """update_status() for a rental that isn't returned yet."""
+    return Case(
+        When(end_date__isnull=False, end_date__lte=today, then=Value("returned")),
+        When(end_date__isnull=False, then=Value("extended")),
+        # today > start_date + 30 days
+        When(start_date__lt=today - timedelta(days=FREE_DAYS), then=Value("extended")),
+        default=Value("active"),
+    )
+
+
+def rental_fee_expression(today, pages=None):
+    """
+    _calculate_fee(): free for 30 days, then pages/100 per started month,
+    up to end_date (or today while it has none).
+    `pages` defaults to F("book__pages"); pass a subquery for UPDATEs,
+    which can't join.
+    """
+    pages = pages if pages is not None else F("book__pages")
+    end = Coalesce(F("end_date"), Value(today))
+    days_over = DaysBetween(end, F("start_date")) - Value(FREE_DAYS)
+    months = days_over / Value(FREE_DAYS) + Value(1)
+    return Case(
+        When(
+            GreaterThan(days_over, 0),
+            then=Round(months * monthly_fee_expression(pages), 2),
+        ),
+        default=Value(Decimal("0.00")),
+        output_field=DecimalField(max_digits=8, decimal_places=2),
+    )
+
+
+def current_fee_expression(today):
+    """The fee as of today for open rentals; the stored fee once returned."""
+    return Case(
+        When(status="returned", then=F("total_fee")),
+        default=rental_fee_expression(today),
+        output_field=DecimalField(max_digits=8, decimal_places=2),
+    )
+
+
+def overdue_expression(today):
+    # Case rather than a bare boolean: NULL end dates would make it NULL, not False
+    return Case(When(overdue_q(today), then=Value(True)), default=Value(False), output_field=BooleanField())
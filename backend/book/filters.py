@@ -0,0 +1,60 @@
+import django_filters
+from django.db.models import Count, Q, Sum
+
+from book.expressions import overdue_q
+from book.models import Rental
+
+
+# ---------------------- Rental Filters ----------------------
+
+class StatusInFilter(django_filters.BaseInFilter, django_filters.ChoiceFilter):
+    pass
+
+
+class RentalFilter(django_filters.FilterSet):
+    """
+    Query string filters shared by the rentals list and export:
+    ?student=<Student id>&book=<Book id>&status=active,extended&overdue=true
+    &start_from=YYYY-MM-DD&start_to=YYYY-MM-DD&search=<title or student name>
+    """
+    student = django_filters.NumberFilter(field_name="user__student_profile__id")
+    book = django_filters.NumberFilter(field_name="book_id")
+    status = StatusInFilter(choices=Rental.STATUS_CHOICES)
+    overdue = django_filters.BooleanFilter(method="filter_overdue")
+    start_from = django_filters.DateFilter(field_name="start_date", lookup_expr="gte")
+    start_to = django_filters.DateFilter(field_name="start_date", lookup_expr="lte")
+    search = django_filters.CharFilter(method="filter_search")
+
+    class Meta:
+        model = Rental
+        fields = []
+
+    def filter_overdue(self, queryset, name, value):
+        return queryset.filter(overdue_q()) if value else queryset.exclude(overdue_q())
+
+    def filter_search(self, queryset, name, value):
+        value = value.strip()
+        if not value:
+            return queryset
+        return queryset.filter(
+            Q(book__title__icontains=value)
+            | Q(user__student_profile__student_name__icontains=value)
+        )
+
+
+def filter_errors(filterset):
+    """Flatten FilterSet errors into one message for {"error": ...} responses."""
+    return "; ".join(f"{field}: {' '.join(messages)}" for field, messages in filterset.errors.items())
+
+
+def rental_totals(queryset):
+    """Count / fee / status totals of a rental queryset, in one aggregate query."""
+    totals = queryset.aggregate(
+        count=Count("id"),
+        total_fees=Sum("total_fee"),
+        active=Count("id", filter=~Q(status="returned")),
+        returned=Count("id", filter=Q(status="returned")),
+        overdue=Count("id", filter=overdue_q()),
+    )
+    totals["total_fees"] = totals["total_fees"] or 0
+    return totals
@@ -0,0 +1,99 @@
+"""
+Revenue projection for open rentals, vectorized with NumPy.
+
+Open rentals are loaded in one query as integer day numbers and page counts
+straight into arrays, and each projected month is then a handful of array
+operations over all rentals at once, so a million open rentals take well
+under a second instead of a million _calculate_fee() calls.
+
+The rules are the ones in Rental._calculate_fee(): free for 30 days, then
+pages/100 per started 30-day month. Amounts are kept in integer cents
+(months * pages) so there is no rounding drift. "If nobody returns
+anything" means an open rental keeps accruing until the projected date,
+or until its end_date if that is later (an extension is billed up front).
+"""
+import calendar
+import itertools
+from datetime import date
+
+import numpy as np
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from book.expressions import FREE_DAYS, DaysBetween
+from book.models import Rental
+
+
+EPOCH = date(1970, 1, 1)
+NO_END_DATE = -1
+
+
+def load_open_rentals(chunk_size=20000):
+    """(start_day, end_day, pages) int64 arrays for every open rental; days since EPOCH."""
+    rows = (
+        Rental.objects.exclude(status="returned")
+        .order_by()
+        .annotate(
+            start_day=DaysBetween(F("start_date"), Value(EPOCH)),
+            end_day=Coalesce(DaysBetween(F("end_date"), Value(EPOCH)), Value(NO_END_DATE)),
+            page_count=F("book__pages"),
+        )
+        .values_list("start_day", "end_day", "page_count")
+    )
+    flat = np.fromiter(
+        itertools.chain.from_iterable(rows.iterator(chunk_size=chunk_size)),
+        dtype=np.int64,
+    )
+    data = flat.reshape(-1, 3)
+    return data[:, 0], data[:, 1], data[:, 2]
+
+
+def fee_cents_at(day, start_day, end_day, pages):
+    """Each rental's total fee in cents if it runs until max(end_date, day)."""
+    effective_end = np.maximum(end_day, day)
+    days_over = effective_end - start_day - FREE_DAYS
+    months = np.where(days_over > 0, days_over // FREE_DAYS + 1, 0)
+    return months * pages
+
+
+def _month_ends(as_of, months):
+    year, month = as_of.year, as_of.month
+    for _ in range(months):
+        yield date(year, month, calendar.monthrange(year, month)[1])
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def forecast(months=6, as_of=None):
+    """
+    Month-by-month projection starting with the current month.
+    Each entry has the fees billed during that month (growth of the open
+    rentals' totals since the previous month end), the running total, and
+    how many rentals are still accruing charges.
+    """
+    as_of = as_of or timezone.now().date()
+    start_day, end_day, pages = load_open_rentals()
+
+    previous = fee_cents_at((as_of - EPOCH).days, start_day, end_day, pages)
+    baseline = int(previous.sum())
+    cumulative = 0
+    projection = []
+    for month_end in _month_ends(as_of, months):
+        current = fee_cents_at((month_end - EPOCH).days, start_day, end_day, pages)
+        billed = int((current - previous).sum())
+        cumulative += billed
+        projection.append({
+            "month": month_end.strftime("%Y-%m"),
+            "period_end": month_end,
+            "billed_cents": billed,
+            "cumulative_cents": cumulative,
+            "accruing_rentals": int(np.count_nonzero(current != previous)),
+        })
+        previous = current
+
+    return {
+        "as_of": as_of,
+        "open_rentals": int(start_day.size),
+        "current_fees_cents": baseline,
+        "months": projection,
+    }
@@ -0,0 +1,397 @@
+import gzip
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from book.autocomplete import publish_catalog_change
+from book.models import Book, Rental
+from book.response_cache import invalidate_books
+from book.utils import book_fields_from_doc
+
+
+YEAR_RE = re.compile(r"\b(\d{4})\b")
+MAX_PAGES = 2147483647
+# Bound parameters per author name lookup (SQLite allows 999 in older builds)
+AUTHOR_LOOKUP_BATCH = 500
+
+
+def _open_dump(path):
+    """Open a dump file as text, transparently gunzipping .gz files."""
+    with open(path, "rb") as f:
+        gzipped = f.read(2) == b"\x1f\x8b"
+    if gzipped:
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+def _parse_line(line):
+    """
+    Accepts both OpenLibrary dump formats:
+    - the official TSV dumps: type, key, revision, last_modified, JSON
+    - JSON lines (one record per line, e.g. search docs)
+    """
+    line = line.strip()
+    if not line:
+        return None
+    if not line.startswith("{"):
+        parts = line.split("\t")
+        if len(parts) < 5:
+            return None
+        line = parts[-1]
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+def _year(value):
+    match = YEAR_RE.search(str(value or ""))
+    return int(match.group(1)) if match else None
+
+
+def _cover_url(covers):
+    # -1 marks a deleted cover in the dumps
+    cover_id = next((c for c in covers or [] if isinstance(c, int) and c > 0), None)
+    return f"https://covers.openlibrary.org/b/id/{cover_id}-L.jpg" if cover_id else None
+
+
+def _olid(key):
+    return (key or "").replace("/works/", "").replace("/books/", "")[:50] or None
+
+
+def _author_key(entry):
+    """Author key of a work's "authors" entry: {"author": {"key": ...}} or the older {"key": ...}."""
+    if not isinstance(entry, dict):
+        return None
+    author = entry.get("author")
+    key = author.get("key") if isinstance(author, dict) else entry.get("key")
+    return key if isinstance(key, str) and key.startswith("/authors/") else None
+
+
+def map_author(record):
+    """(author key, name) of an authors dump record, or None."""
+    record_type = record.get("type")
+    if isinstance(record_type, dict):
+        record_type = record_type.get("key")
+    key, name = record.get("key"), record.get("name")
+    if record_type != "/type/author" or not isinstance(key, str) or not isinstance(name, str) or not name.strip():
+        return None
+    return key, name.strip()
+
+
+def map_record(record):
+    """
+    Map one dump record to ("doc" | "work" | "edition", Book fields), or None.
+    - doc: a search.json style doc, has everything incl. author names/pages
+    - work: title, first publish year, cover, and author names when embedded;
+      otherwise "author_keys", resolved against the authors dump on import
+    - edition: only contributes page counts to its work
+    """
+    record_type = record.get("type")
+    if isinstance(record_type, dict):
+        record_type = record_type.get("key")
+
+    if record_type == "/type/edition":
+        works = record.get("works") or []
+        olid = _olid(works[0].get("key")) if works else None
+        pages = record.get("number_of_pages")
+        if not olid or not record.get("title") or not isinstance(pages, int) or pages <= 0:
+            return None
+        return "edition", {
+            "olid": olid,
+            "title": record["title"][:255],
+            "pages": min(pages, MAX_PAGES),
+        }
+
+    if record_type == "/type/work":
+        olid = _olid(record.get("key"))
+        if not olid or not record.get("title"):
+            return None
+        authors = record.get("authors") or []
+        names = [a.get("name") for a in authors if isinstance(a, dict) and a.get("name")]
+        fields = {
+            "olid": olid,
+            "title": record["title"][:255],
+            "cover_url": _cover_url(record.get("covers")),
+            "first_publish_year": _year(record.get("first_publish_date")),
+        }
+        if names:
+            fields["author"] = ", ".join(names)[:255]
+        else:
+            keys = [key for key in map(_author_key, authors) if key]
+            if keys:
+                fields["author_keys"] = keys
+        return "work", fields
+
+    if record.get("title") and record.get("key"):
+        fields = book_fields_from_doc(record)
+        fields["olid"] = _olid(record.get("key"))
+        if not fields["olid"]:
+            return None
+        fields["title"] = fields["title"][:255]
+        fields["author"] = fields["author"][:255]
+        fields["pages"] = min(int(fields["pages"] or 0), MAX_PAGES)
+        return "doc", fields
+
+    return None
+
+
+class AuthorNames:
+    """
+    OpenLibrary author key -> name, loaded from an authors dump. Kept in a
+    temporary SQLite file rather than a dict: the full dump has millions of
+    authors.
+    """
+
+    def __init__(self):
+        self._file = tempfile.NamedTemporaryFile(suffix=".sqlite3")
+        self._db = sqlite3.connect(self._file.name)
+        self._db.execute("CREATE TABLE authors (key TEXT PRIMARY KEY, name TEXT NOT NULL)")
+
+    def load(self, pairs, batch_size=10000):
+        """Store (key, name) pairs; returns how many."""
+        loaded = 0
+        batch = []
+        for pair in pairs:
+            batch.append(pair)
+            if len(batch) >= batch_size:
+                loaded += self._insert(batch)
+                batch = []
+        return loaded + self._insert(batch)
+
+    def _insert(self, batch):
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO authors (key, name) VALUES (?, ?)", batch)
+        return len(batch)
+
+    def names(self, keys):
+        """{key: name} for the keys that are known."""
+        keys = list(set(keys))
+        found = {}
+        for i in range(0, len(keys), AUTHOR_LOOKUP_BATCH):
+            batch = keys[i:i + AUTHOR_LOOKUP_BATCH]
+            placeholders = ", ".join("?" * len(batch))
+            found.update(self._db.execute(f"SELECT key, name FROM authors WHERE key IN ({placeholders})", batch))
+        return found
+
+    def close(self):
+        self._db.close()
+        self._file.close()
+
+
+def resolve_authors(chunk, author_names):
+    """Turn the "author_keys" of work records into an "author" (names) where known."""
+    keyed = [fields for kind, fields in chunk if "author_keys" in fields]
+    if not keyed:
+        return
+    names = author_names.names(key for fields in keyed for key in fields["author_keys"]) if author_names else {}
+    for fields in keyed:
+        known = [names[key] for key in fields.pop("author_keys") if key in names]
+        if known:
+            fields["author"] = ", ".join(known)[:255]
+
+
+# Columns refreshed on conflict, per record kind
+UPDATE_FIELDS = {
+    "doc": ["title", "author", "pages", "cover_url", "first_publish_year", "updated_at"],
+    "work": ["title", "cover_url", "first_publish_year", "updated_at"],
+    "work_with_author": ["title", "author", "cover_url", "first_publish_year", "updated_at"],
+    "edition": ["pages", "updated_at"],
+}
+# Stored values compared before writing, and what a new row starts with
+COMPARED_FIELDS = {"title": None, "author": None, "pages": 0, "cover_url": None, "first_publish_year": None}
+# Shown in rental rows: a change to one of these touches the book's rentals
+SHOWN_FIELDS = ("title", "author", "pages", "cover_url")
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream-import OpenLibrary works/editions dumps (gzipped TSV or JSON lines) "
+        "into the Book table, upserting on olid in chunks. Resumable with --resume. "
+        "Works reference their authors by key: pass the authors dump with --authors to fill in names."
+    )
+    # AuthorNames from --authors, or None
+    author_names = None
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="Dump files (.txt, .jsonl, optionally .gz)")
+        parser.add_argument("--batch-size", type=int, default=2000, help="Rows per upsert chunk")
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Skip lines already imported according to the <path>.progress file",
+        )
+        parser.add_argument("--limit", type=int, default=None, help="Stop after this many lines per file")
+        parser.add_argument(
+            "--authors",
+            action="append",
+            default=[],
+            help="Authors dump to resolve the author keys of works from (repeatable)",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size <= 0:
+            raise CommandError("--batch-size must be positive")
+
+        for path in [*options["authors"], *options["paths"]]:
+            if not os.path.exists(path):
+                raise CommandError(f"File not found: {path}")
+
+        self.author_names = self.load_authors(options["authors"]) if options["authors"] else None
+        try:
+            for path in options["paths"]:
+                self.import_file(path, batch_size, options["resume"], options["limit"])
+        finally:
+            if self.author_names:
+                self.author_names.close()
+
+    def load_authors(self, paths):
+        """Read the authors dumps into an AuthorNames store (one pass, before the works)."""
+        author_names = AuthorNames()
+        for path in paths:
+            with _open_dump(path) as lines:
+                records = (_parse_line(line) for line in lines)
+                loaded = author_names.load(
+                    pair for pair in (map_author(r) for r in records if isinstance(r, dict)) if pair
+                )
+            self.stdout.write(f"{path}: {loaded:,} author names")
+        return author_names
+
+    # ----------------------------
+    # Progress checkpoints
+    # ----------------------------
+    def _progress_path(self, path):
+        return f"{path}.progress"
+
+    def _load_progress(self, path):
+        try:
+            with open(self._progress_path(path)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"lines": 0, "upserted": 0, "done": False}
+
+    def _save_progress(self, path, progress):
+        tmp = f"{self._progress_path(path)}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(progress, f)
+        os.replace(tmp, self._progress_path(path))
+
+    # ----------------------------
+    # Import
+    # ----------------------------
+    def import_file(self, path, batch_size, resume, limit):
+        progress = self._load_progress(path) if resume else {"lines": 0, "upserted": 0, "done": False}
+        if progress.get("done"):
+            self.stdout.write(f"{path}: already imported, skipping")
+            return
+
+        skip = progress["lines"]
+        if skip:
+            self.stdout.write(f"{path}: resuming after line {skip:,}")
+
+        started = time.monotonic()
+        line_no = 0
+        chunk = []
+        with _open_dump(path) as lines:
+            for line_no, line in enumerate(lines, start=1):
+                if line_no <= skip:
+                    continue
+                if limit and line_no > limit:
+                    line_no -= 1
+                    break
+
+                record = _parse_line(line)
+                mapped = map_record(record) if isinstance(record, dict) else None
+                if mapped:
+                    chunk.append(mapped)
+
+                if len(chunk) >= batch_size:
+                    progress["upserted"] += self.flush(chunk)
+                    progress["lines"] = line_no
+                    self._save_progress(path, progress)
+                    self.report(path, progress, started, skip)
+                    chunk = []
+
+        if chunk:
+            progress["upserted"] += self.flush(chunk)
+        progress["lines"] = max(line_no, skip)
+        progress["done"] = not limit
+        self._save_progress(path, progress)
+        # bulk_create skips signals: have running autocomplete indexes rebuild
+        # (once per file, not per chunk)
+        publish_catalog_change()
+        self.report(path, progress, started, skip)
+        self.stdout.write(self.style.SUCCESS(f"{path}: imported {progress['upserted']:,} rows"))
+
+    def report(self, path, progress, started, skip):
+        elapsed = max(time.monotonic() - started, 0.001)
+        rate = (progress["lines"] - skip) / elapsed
+        self.stdout.write(
+            f"{path}: {progress['lines']:,} lines, {progress['upserted']:,} rows upserted ({rate:,.0f} lines/s)"
+        )
+
+    def flush(self, chunk):
+        """
+        Upsert one chunk, grouped by record kind, in a single transaction.
+        Rows are compared with the stored books first: only new or changed
+        rows are written (editions only when they raise the page count), and
+        only books whose shown fields changed touch their rentals.
+        """
+        resolve_authors(chunk, self.author_names)
+        groups = {}
+        for kind, fields in chunk:
+            if kind == "work" and "author" in fields:
+                kind = "work_with_author"
+            # One row per olid per statement (ON CONFLICT can't touch a row twice);
+            # for editions keep the largest page count seen
+            rows = groups.setdefault(kind, {})
+            existing = rows.get(fields["olid"])
+            if kind == "edition" and existing and existing["pages"] >= fields["pages"]:
+                continue
+            rows[fields["olid"]] = fields
+
+        upserted = 0
+        changed_olids = set()
+        with transaction.atomic():
+            olids = {olid for rows in groups.values() for olid in rows}
+            stored = {
+                row["olid"]: row
+                for row in Book.objects.select_for_update().filter(olid__in=olids).values("olid", *COMPARED_FIELDS)
+            }
+            for kind, rows in groups.items():
+                compared = [field for field in UPDATE_FIELDS[kind] if field in COMPARED_FIELDS]
+                books = []
+                for olid, fields in rows.items():
+                    current = stored.get(olid)
+                    if current is not None:
+                        if kind == "edition":
+                            if fields["pages"] <= current["pages"]:
+                                continue
+                        elif all(fields.get(field) == current[field] for field in compared):
+                            continue
+                        if any(field in fields and fields[field] != current[field] for field in SHOWN_FIELDS
+                               if field in compared):
+                            changed_olids.add(olid)
+                    stored[olid] = {**COMPARED_FIELDS, **(current or {}), **fields}
+                    books.append(Book(**fields))
+                if books:
+                    Book.objects.bulk_create(
+                        books,
+                        update_conflicts=True,
+                        unique_fields=["olid"],
+                        update_fields=UPDATE_FIELDS[kind],
+                    )
+                upserted += len(books)
+            # Rental rows show the book: let delta sync clients refetch them
+            if changed_olids:
+                Rental.objects.filter(book__olid__in=changed_olids).touch()
+        if changed_olids:
+            invalidate_books()
+        return upserted
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from book.summary import rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild the RentalSummary totals (global and per user) from the rentals table."
+
+    def handle(self, *args, **options):
+        drift = rebuild()
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Rental summaries were up to date."))
+            return
+
+        for scope, (stored, recomputed) in sorted(drift.items()):
+            self.stdout.write(f"{scope}: {stored} -> {recomputed}")
+        self.stdout.write(self.style.WARNING(f"Rebuilt {len(drift)} rental summar{'y' if len(drift) == 1 else 'ies'}."))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from book.sweep import sweep_open_rentals
+
+
+class Command(BaseCommand):
+    help = "Recompute status and fee of all open rentals with set-based UPDATEs (see book/sweep.py)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Rentals per UPDATE/transaction")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the rentals that would change")
+        parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between chunks")
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+
+        def progress(stats):
+            rate = stats["checked"] / stats["seconds"] if stats["seconds"] else 0
+            self.stdout.write(
+                f"checked {stats['checked']}, {'would change' if dry_run else 'changed'} {stats['changed']}, "
+                f"skipped {stats['skipped_locked']} locked ({rate:.0f} rows/s)"
+            )
+
+        stats = sweep_open_rentals(
+            chunk_size=options["chunk_size"],
+            dry_run=dry_run,
+            pause=options["pause"],
+            progress=progress,
+        )
+        verb = "Would update" if dry_run else "Updated"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {stats['changed']} of {stats['checked']} open rentals in {stats['seconds']:.1f}s."
+        ))
@@ -0,0 +1,105 @@
+# Generated by Django 5.2 on 2026-10-17 00:12
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+# Kept in sync with book.search.PG_SEARCH_VECTOR
+PG_SEARCH_VECTOR = (
+    "(setweight(to_tsvector('simple'::regconfig, coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(author, '')), 'B'))"
+)
+
+PG_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS book_book_search_vector_idx ON book_book USING gin ({PG_SEARCH_VECTOR})",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS book_book_title_trgm_idx ON book_book USING gin (title gin_trgm_ops)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS book_book_author_trgm_idx ON book_book USING gin (author gin_trgm_ops)",
+]
+
+PG_BACKWARD = [
+    "DROP INDEX CONCURRENTLY IF EXISTS book_book_search_vector_idx",
+    "DROP INDEX CONCURRENTLY IF EXISTS book_book_title_trgm_idx",
+    "DROP INDEX CONCURRENTLY IF EXISTS book_book_author_trgm_idx",
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS book_book_fts USING fts5(
+        title, author,
+        content='book_book', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS book_book_fts_ai AFTER INSERT ON book_book BEGIN
+        INSERT INTO book_book_fts(rowid, title, author) VALUES (new.id, new.title, new.author);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS book_book_fts_ad AFTER DELETE ON book_book BEGIN
+        INSERT INTO book_book_fts(book_book_fts, rowid, title, author)
+        VALUES ('delete', old.id, old.title, old.author);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS book_book_fts_au AFTER UPDATE OF title, author ON book_book BEGIN
+        INSERT INTO book_book_fts(book_book_fts, rowid, title, author)
+        VALUES ('delete', old.id, old.title, old.author);
+        INSERT INTO book_book_fts(rowid, title, author) VALUES (new.id, new.title, new.author);
+    END
+    """,
+    "INSERT INTO book_book_fts(book_book_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS book_book_fts_ai",
+    "DROP TRIGGER IF EXISTS book_book_fts_ad",
+    "DROP TRIGGER IF EXISTS book_book_fts_au",
+    "DROP TABLE IF EXISTS book_book_fts",
+]
+
+
+def _run(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        _run(schema_editor, PG_FORWARD)
+    elif vendor == "sqlite":
+        try:
+            _run(schema_editor, SQLITE_FORWARD)
+        except Exception as e:
+            # SQLite built without FTS5: search falls back to icontains
+            print("Skipping FTS5 book search index:", e)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        _run(schema_editor, PG_BACKWARD)
+    elif vendor == "sqlite":
+        _run(schema_editor, SQLITE_BACKWARD)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ("book", "0006_alter_rental_options_rental_status"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(
+                django.db.models.functions.text.Upper("title"),
+                name="book_title_upper_idx",
+            ),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
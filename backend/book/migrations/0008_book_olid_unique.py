@@ -0,0 +1,42 @@
+# Generated by Django 5.2 on 2026-10-17 00:13
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def dedupe_olids(apps, schema_editor):
+    """
+    Blank olids become NULL, and books sharing an olid are merged into the
+    oldest row (rentals are re-pointed) so the unique constraint can be added.
+    """
+    Book = apps.get_model("book", "Book")
+    Rental = apps.get_model("book", "Rental")
+
+    Book.objects.filter(olid="").update(olid=None)
+
+    duplicates = (
+        Book.objects.exclude(olid__isnull=True)
+        .values("olid")
+        .annotate(n=Count("id"), keep_id=Min("id"))
+        .filter(n__gt=1)
+    )
+    for row in duplicates:
+        extra = Book.objects.filter(olid=row["olid"]).exclude(id=row["keep_id"])
+        Rental.objects.filter(book__in=extra).update(book_id=row["keep_id"])
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("book", "0007_book_search_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_olids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="book",
+            name="olid",
+            field=models.CharField(blank=True, max_length=50, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-17 00:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("book", "0008_book_olid_unique"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="book",
+            name="enrichment_status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("enriched", "Enriched"),
+                    ("not_found", "Not found"),
+                    ("failed", "Failed"),
+                ],
+                default="enriched",
+                max_length=20,
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 00:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("book", "0009_book_enrichment_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="book",
+            name="cover_hash",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
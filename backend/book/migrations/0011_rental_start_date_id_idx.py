@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-17 00:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("book", "0010_book_cover_hash"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="rental",
+            index=models.Index(
+                fields=["start_date", "id"], name="rental_start_date_id_idx"
+            ),
+        ),
+    ]
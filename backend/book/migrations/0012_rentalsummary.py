@@ -0,0 +1,94 @@
+# Generated by Django 5.2 on 2026-10-17 00:24
+
+import django.db.models.deletion
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+
+def populate_summaries(apps, schema_editor):
+    """Initial totals, global and per user (book/summary.py keeps them current)."""
+    Rental = apps.get_model("book", "Rental")
+    RentalSummary = apps.get_model("book", "RentalSummary")
+
+    today = timezone.now().date()
+    overdue = ~Q(status="returned") & (
+        Q(end_date__lt=today)
+        | Q(end_date__isnull=True, start_date__lt=today - timedelta(days=30))
+    )
+    rows = (
+        Rental.objects.order_by()
+        .values("user_id")
+        .annotate(
+            rentals=Count("id"),
+            active=Count("id", filter=~Q(status="returned")),
+            returned=Count("id", filter=Q(status="returned")),
+            overdue=Count("id", filter=overdue),
+            total_fees=Sum("total_fee"),
+        )
+    )
+    fields = ("rentals", "active", "returned", "overdue", "total_fees")
+    totals = {field: 0 for field in fields}
+    summaries = []
+    for row in rows:
+        row["total_fees"] = row["total_fees"] or Decimal("0.00")
+        values = {field: row[field] for field in fields}
+        summaries.append(
+            RentalSummary(
+                scope=f"user:{row['user_id']}", user_id=row["user_id"], **values
+            )
+        )
+        for field in fields:
+            totals[field] += values[field]
+    summaries.append(RentalSummary(scope="global", **totals))
+    RentalSummary.objects.bulk_create(summaries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("book", "0011_rental_start_date_id_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RentalSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("scope", models.CharField(max_length=40, unique=True)),
+                ("rentals", models.IntegerField(default=0)),
+                ("active", models.IntegerField(default=0)),
+                ("returned", models.IntegerField(default=0)),
+                ("overdue", models.IntegerField(default=0)),
+                (
+                    "total_fees",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=14
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rental_summaries",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(populate_summaries, migrations.RunPython.noop),
+    ]
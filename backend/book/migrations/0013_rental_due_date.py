@@ -0,0 +1,42 @@
+# Generated by Django 5.2 on 2026-10-17 00:28
+
+from django.db import migrations, models
+from django.db.models import Max
+
+from book.expressions import due_date_expression
+
+
+def fill_due_dates(apps, schema_editor):
+    """due_date = end_date, or start_date + 30 days; in id ranges to keep transactions short."""
+    Rental = apps.get_model("book", "Rental")
+    last_id = Rental.objects.aggregate(last=Max("id"))["last"] or 0
+    for low in range(0, last_id, 10000):
+        Rental.objects.filter(id__gt=low, id__lte=low + 10000).update(
+            due_date=due_date_expression()
+        )
+
+
+class Migration(migrations.Migration):
+    # Let the backfill commit per id range instead of in one long transaction
+    atomic = False
+
+    dependencies = [
+        ("book", "0012_rentalsummary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="rental",
+            name="due_date",
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(fill_due_dates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="rental",
+            index=models.Index(
+                condition=models.Q(("status", "returned"), _negated=True),
+                fields=["due_date", "id"],
+                name="rental_open_due_date_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2 on 2026-10-17 00:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("book", "0013_rental_due_date"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RentalTombstone",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("rental_id", models.BigIntegerField()),
+                ("deleted_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name="rental",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="student",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name="rental",
+            index=models.Index(
+                fields=["updated_at", "id"], name="rental_updated_at_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="rentaltombstone",
+            index=models.Index(
+                fields=["deleted_at", "id"], name="rental_tombstone_deleted_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2 on 2026-10-17 01:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("book", "0016_student_import"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StudentImportChunk",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("rows", models.JSONField()),
+                (
+                    "student_import",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="chunks",
+                        to="book.studentimport",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -1,14 +1,36 @@
 from django.db import models,transaction
+from django.db.models.functions import Upper
 from django.contrib.auth.models import AbstractUser
 from datetime import timedelta, date
 from decimal import Decimal
 import uuid
 from django.utils import timezone
 
+from book.expressions import (
+    current_fee_expression,
+    free_month_end_expression,
+    monthly_fee_expression,
+    overdue_expression,
+)
+
+class LoadedValuesMixin:
+    """
+    Remembers the field values an instance was loaded with
+    (instance._loaded_values, keyed by attname), so save() signals can tell
+    what actually changed without querying (see book/signals.py).
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+
 # -----------------------
 # Custom User model
 # -----------------------
-class User(AbstractUser):
+class User(LoadedValuesMixin, AbstractUser):
     """
     Custom user with email as the unique identifier.
     Admins are handled by Django's is_staff flag.
@@ -16,16 +38,40 @@ class User(AbstractUser):
     """
     username = models.CharField(max_length=150, unique=False)
     email = models.EmailField(unique=True)
+    # Carried in issued JWTs as the "token_version" claim; bumping it revokes
+    # every token issued before (book/authentication.py)
+    token_version = models.PositiveIntegerField(default=0)
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username"]
 
     def __str__(self):
         return self.username or self.email
+
+    def save(self, *args, **kwargs):
+        # A new password revokes the tokens issued before it. set_password()
+        # keeps the raw password in _password until the save; check_password()
+        # clears it before saving an upgraded hash of the same password, so
+        # that save leaves the tokens alone. Bumped here rather than in
+        # set_password() so the version is saved with the hash, however the
+        # save is made.
+        update_fields = kwargs.get("update_fields")
+        if (self._password is not None and not self._state.adding
+                and (update_fields is None or "password" in update_fields)):
+            self.token_version += 1
+            if update_fields is not None and "token_version" not in update_fields:
+                kwargs["update_fields"] = [*update_fields, "token_version"]
+        super().save(*args, **kwargs)
+
+    def revoke_tokens(self):
+        """Invalidate every JWT issued to this user so far."""
+        self.token_version = models.F("token_version") + 1
+        self.save(update_fields=["token_version"])
+        self.refresh_from_db(fields=["token_version"])
     
 
 
-class Student(models.Model):
+class Student(LoadedValuesMixin, models.Model):
     """
     Student table linked to User, with a system-generated stu_id.
     """
@@ -36,6 +82,7 @@ class Student(models.Model):
     email = models.EmailField()
 
     date_created = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"{self.student_name} ({self.email})"
@@ -44,16 +91,36 @@ class Student(models.Model):
 # -----------------------
 # Book model
 # -----------------------
-class Book(models.Model):
+class Book(LoadedValuesMixin, models.Model):
     """
     Represents a book fetched via OpenLibrary.
+    Books created from an unknown title start as "pending" placeholders and
+    are filled in by the enrich_book Celery task.
     """
+    ENRICHMENT_STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("enriched", "Enriched"),
+        ("not_found", "Not found"),
+        ("failed", "Failed"),
+    ]
+
     title = models.CharField(max_length=255)
     author = models.CharField(max_length=255, blank=True, null=True)
     pages = models.PositiveIntegerField(default=0)
     cover_url = models.URLField(blank=True, null=True)
-    olid = models.CharField(max_length=50, blank=True, null=True)
+    olid = models.CharField(max_length=50, blank=True, null=True, unique=True)
     first_publish_year = models.PositiveIntegerField(blank=True, null=True)
+    enrichment_status = models.CharField(max_length=20, choices=ENRICHMENT_STATUS_CHOICES, default="enriched")
+    # sha256 of the downloaded cover; thumbnails live in the local cover store (book/covers.py)
+    cover_hash = models.CharField(max_length=64, blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Serves title__iexact lookups (CreateRentalView); ranked search
+            # indexes are vendor specific, see book/search.py
+            models.Index(Upper("title"), name="book_title_upper_idx"),
+        ]
 
     def __str__(self):
         return self.title
@@ -64,7 +131,27 @@ class Book(models.Model):
 # -----------------------
 
 
-class Rental(models.Model):
+class RentalQuerySet(models.QuerySet):
+    def with_fees(self, today=None):
+        """
+        Annotate the fee fields computed in SQL, so they can be filtered and
+        ordered on: monthly_fee, free_month_ends, current_fee (fee as of
+        today, the stored fee once returned) and is_overdue.
+        """
+        today = today or timezone.now().date()
+        return self.annotate(
+            monthly_fee=monthly_fee_expression(),
+            free_month_ends=free_month_end_expression(),
+            current_fee=current_fee_expression(today),
+            is_overdue=overdue_expression(today),
+        )
+
+    def touch(self):
+        """Bump updated_at without changing anything else (one UPDATE)."""
+        return self.update(updated_at=timezone.now())
+
+
+class Rental(LoadedValuesMixin, models.Model):
     """
     Represents a student renting a book.
     Automatically handles:
@@ -84,9 +171,29 @@ class Rental(models.Model):
     end_date = models.DateField(blank=True, null=True)
     total_fee = models.DecimalField(max_digits=8, decimal_places=2, default=Decimal("0.00"))
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="active")
+    # end_date, or the end of the free month while there is none; set in save()
+    due_date = models.DateField(blank=True, null=True, editable=False)
+    # Also bumped when the rental's book or student changes (book/signals.py),
+    # so /api/rentals/changes/ only has to follow this column
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = RentalQuerySet.as_manager()
 
     class Meta:
         ordering = ["-start_date"]
+        indexes = [
+            # Keyset pagination of the rentals list (AllRentalsView)
+            models.Index(fields=["start_date", "id"], name="rental_start_date_id_idx"),
+            # Overdue lookups (due_date < today) only ever look at open
+            # rentals, so returned history stays out of the index
+            models.Index(
+                fields=["due_date", "id"],
+                name="rental_open_due_date_idx",
+                condition=~models.Q(status="returned"),
+            ),
+            # Delta sync (/api/rentals/changes/) walks rentals by modification
+            models.Index(fields=["updated_at", "id"], name="rental_updated_at_id_idx"),
+        ]
 
     # ----------------------------
     # Utility methods
@@ -184,10 +291,113 @@ class Rental(models.Model):
         # Always recalculate fee when status updates
         self.total_fee = self._calculate_fee()
 
+    def refresh_derived_fields(self):
+        """
+        Fill start_date (on insert), due_date, status and total_fee the way
+        save() does. Use it for rentals inserted with bulk_create().
+        """
+        # auto_now_add only fills start_date in pre_save, after update_status
+        # needs it, and stores today whatever was set: derive from that
+        if self._state.adding or self.start_date is None:
+            self.start_date = timezone.now().date()
+        self.due_date = self.end_date or self.start_date + timedelta(days=30)
+        self.update_status()
+
     def save(self, *args, **kwargs):
         """Auto-update status and total_fee before saving"""
-        self.update_status()
-        super().save(*args, **kwargs)
+        self.refresh_derived_fields()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            extra = ["updated_at"]
+            if "end_date" in update_fields:
+                extra.append("due_date")
+            kwargs["update_fields"] = [*update_fields, *(field for field in extra if field not in update_fields)]
+        # post_save updates the rental summaries; keep it in the same transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.user.username} rented {self.book.title} ({self.status})"
+
+
+# -----------------------
+# Rental summary
+# -----------------------
+class RentalSummary(models.Model):
+    """
+    Running rental totals, one row for everything (scope "global") and one
+    per user ("user:<id>"). Kept up to date by Rental writes (book/summary.py)
+    so dashboards don't have to scan the rentals table.
+    Rebuild with: python manage.py reconcile_rental_summaries
+    """
+    scope = models.CharField(max_length=40, unique=True)
+    user = models.ForeignKey("User", on_delete=models.CASCADE, null=True, blank=True, related_name="rental_summaries")
+    rentals = models.IntegerField(default=0)
+    active = models.IntegerField(default=0)
+    returned = models.IntegerField(default=0)
+    # Changes with the date as well as with writes; refreshed daily
+    overdue = models.IntegerField(default=0)
+    total_fees = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.scope}: {self.rentals} rentals"
+
+
+class RentalTombstone(models.Model):
+    """
+    A deleted rental, so delta sync clients (/api/rentals/changes/) can drop
+    it too. Purged after CHANGES_TOMBSTONE_DAYS; older sync tokens expire.
+    """
+    rental_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["deleted_at", "id"], name="rental_tombstone_deleted_idx"),
+        ]
+
+    def __str__(self):
+        return f"rental {self.rental_id} deleted {self.deleted_at}"
+
+
+# -----------------------
+# Student import
+# -----------------------
+class StudentImport(models.Model):
+    """
+    Progress and outcome of a CSV upload to /api/students/bulk-import/.
+    The rows are inserted by Celery tasks, one per chunk (book/tasks.py);
+    each adds its counts and errors here when it finishes.
+    """
+    total_rows = models.PositiveIntegerField(default=0)
+    chunks_total = models.PositiveIntegerField(default=0)
+    chunks_done = models.PositiveIntegerField(default=0)
+    created = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    # [{"line", "email", "error"}]
+    errors = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    @property
+    def status(self):
+        return "done" if self.finished_at else "running"
+
+    def __str__(self):
+        return f"student import {self.id} ({self.status})"
+
+
+class StudentImportChunk(models.Model):
+    """
+    The validated rows of one chunk of a StudentImport, waiting for their
+    Celery task. They carry the passwords from the file, so they are kept
+    here instead of in the broker payload (the task gets the chunk's id)
+    and deleted as soon as the chunk is inserted.
+    """
+    student_import = models.ForeignKey(StudentImport, on_delete=models.CASCADE, related_name="chunks")
+    # [[line, student_name, email, password or None]]
+    rows = models.JSONField()
 
     def __str__(self):
-        return f"{self.user.username} rented {self.book.title} ({self.status})"
\ No newline at end of file
+        return f"chunk {self.id} of student import {self.student_import_id}"
@@ -0,0 +1,370 @@
+"""
+Shared HTTP client for OpenLibrary.
+
+One pooled keep-alive session per process, separate connect/read timeouts,
+a bounded retry budget with jittered backoff and a circuit breaker that
+fails fast while the upstream is unhealthy. The async client used by the
+ASGI search view shares the same breaker and retry budget.
+"""
+import asyncio
+import contextlib
+import random
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from book.runtime import served_under_asgi
+
+
+class OpenLibraryUnavailable(Exception):
+    """Raised when OpenLibrary cannot be reached or the circuit is open."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# ---------------------- Circuit Breaker ----------------------
+
+class CircuitBreaker:
+    """
+    Classic closed / open / half-open breaker.
+    - closed: requests flow, consecutive failures are counted
+    - open: requests fail fast until reset_timeout has passed
+    - half_open: a single trial request decides whether to close or re-open
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    def allow_request(self):
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+            # Half-open: let exactly one trial request through
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """Give back a half-open trial that ended without a verdict (e.g. cancelled)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def retry_after(self):
+        """Seconds until the breaker will allow a trial request (0 when closed)."""
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0
+            return max(0, int(self.reset_timeout - (time.monotonic() - self._opened_at)) + 1)
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    @property
+    def is_open(self):
+        return self.state == self.OPEN
+
+    def snapshot(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "retry_after": self.retry_after(),
+        }
+
+
+# ---------------------- Retry Budget ----------------------
+
+class RetryBudget:
+    """
+    Token bucket limiting retries to a fraction of overall traffic, so a
+    degraded upstream does not see every request multiplied by max_retries.
+    Each request deposits `ratio` tokens, each retry withdraws one.
+    """
+
+    def __init__(self, ratio=0.2, reserve=10):
+        self.ratio = ratio
+        self.reserve = reserve
+        self._lock = threading.Lock()
+        self._tokens = float(reserve)
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.reserve, self._tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    @property
+    def tokens(self):
+        with self._lock:
+            return round(self._tokens, 2)
+
+
+def backoff_delay(attempt, base=0.2, cap=2.0):
+    """Full-jitter exponential backoff for the given (0-based) retry attempt."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def is_client_error(status_code):
+    """4xx other than 429: the request was bad, the upstream is fine."""
+    return status_code is not None and status_code < 500 and status_code not in RETRYABLE_STATUS_CODES
+
+
+# ---------------------- Client ----------------------
+
+class OpenLibraryClient:
+    """
+    Thread-safe OpenLibrary client. Use the module-level `openlibrary_client`
+    instead of instantiating this per request, so connections are reused.
+    """
+
+    def __init__(self, base_url=None, connect_timeout=None, read_timeout=None,
+                 max_retries=None, breaker=None, retry_budget=None):
+        self.base_url = (base_url or settings.OPENLIBRARY_BASE_URL).rstrip("/")
+        self.timeout = (
+            connect_timeout or settings.OPENLIBRARY_CONNECT_TIMEOUT,
+            read_timeout or settings.OPENLIBRARY_READ_TIMEOUT,
+        )
+        self.max_retries = settings.OPENLIBRARY_MAX_RETRIES if max_retries is None else max_retries
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=settings.OPENLIBRARY_BREAKER_FAILURES,
+            reset_timeout=settings.OPENLIBRARY_BREAKER_RESET_SECONDS,
+        )
+        self.retry_budget = retry_budget or RetryBudget()
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    # Retries are handled here (budgeted, jittered), not by urllib3
+                    adapter = HTTPAdapter(
+                        pool_connections=4,
+                        pool_maxsize=settings.OPENLIBRARY_POOL_SIZE,
+                        max_retries=0,
+                    )
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    session.headers.update({"User-Agent": settings.OPENLIBRARY_USER_AGENT})
+                    self._session = session
+        return self._session
+
+    def unavailable(self, message="OpenLibrary is temporarily unavailable"):
+        return OpenLibraryUnavailable(message, retry_after=self.breaker.retry_after())
+
+    def get(self, path, params=None, stream=False):
+        """
+        GET a path (or absolute URL) through the breaker and retry budget.
+        Returns the `requests.Response`; raises OpenLibraryUnavailable.
+        """
+        if not self.breaker.allow_request():
+            raise self.unavailable()
+        try:
+            return self._get(path, params, stream)
+        except (requests.HTTPError, OpenLibraryUnavailable):
+            raise
+        except BaseException:
+            # Not a verdict on the upstream, but a half-open trial must not
+            # stay in flight for good
+            self.breaker.release_trial()
+            raise
+
+    def _get(self, path, params, stream):
+        url = path if path.startswith("http") else f"{self.base_url}{path}"
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            response = None
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout, stream=stream)
+                if response.status_code in RETRYABLE_STATUS_CODES:
+                    raise requests.HTTPError(f"{response.status_code} from OpenLibrary", response=response)
+                response.raise_for_status()
+            except requests.RequestException as e:
+                status_code = response.status_code if response is not None else None
+                if is_client_error(status_code):
+                    # 4xx: upstream is healthy, the request itself was bad
+                    self.breaker.record_success()
+                    raise
+                if response is not None:
+                    # Not handed to the caller: give the connection back to the pool
+                    response.close()
+
+                retryable = isinstance(e, (requests.ConnectionError, requests.Timeout)) or (
+                    status_code in RETRYABLE_STATUS_CODES
+                )
+                if retryable and attempt < self.max_retries and self.retry_budget.withdraw():
+                    time.sleep(backoff_delay(attempt))
+                    attempt += 1
+                    continue
+
+                self.breaker.record_failure()
+                print("OpenLibrary request failed:", e)
+                raise self.unavailable() from e
+            self.breaker.record_success()
+            return response
+
+    def search(self, title):
+        """Raw OpenLibrary search.json payload for a title."""
+        response = self.get("/search.json", params={"title": title})
+        try:
+            return response.json()
+        except ValueError as e:
+            self.breaker.record_failure()
+            raise self.unavailable("OpenLibrary returned an invalid response") from e
+
+    def status(self):
+        return {
+            "circuit": self.breaker.snapshot(),
+            "retry_budget_tokens": self.retry_budget.tokens,
+        }
+
+
+class AsyncOpenLibraryClient:
+    """
+    httpx-based twin of OpenLibraryClient for async views.
+    Shares the sync client's circuit breaker, retry budget and timeouts, so
+    both code paths agree on whether the upstream is healthy. Under ASGI one
+    httpx.AsyncClient (and connection pool) is kept per event loop; under
+    WSGI each call gets its own client, closed afterwards.
+    """
+
+    def __init__(self, sync_client):
+        self.sync_client = sync_client
+        self._clients = weakref.WeakKeyDictionary()
+
+    @property
+    def breaker(self):
+        return self.sync_client.breaker
+
+    def _new_client(self):
+        connect_timeout, read_timeout = self.sync_client.timeout
+        return httpx.AsyncClient(
+            base_url=self.sync_client.base_url,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=settings.OPENLIBRARY_ASYNC_POOL_SIZE,
+                max_keepalive_connections=settings.OPENLIBRARY_POOL_SIZE,
+            ),
+            headers={"User-Agent": settings.OPENLIBRARY_USER_AGENT},
+        )
+
+    @contextlib.asynccontextmanager
+    async def _borrow_client(self):
+        if served_under_asgi():
+            # The server's loop lives as long as the process: keep its pool
+            loop = asyncio.get_running_loop()
+            client = self._clients.get(loop)
+            if client is None:
+                client = self._clients[loop] = self._new_client()
+            yield client
+            return
+        # Under WSGI every async view runs on a new, short-lived loop; a
+        # kept client would hold its connection pool forever
+        async with self._new_client() as client:
+            yield client
+
+    async def get(self, path, params=None):
+        """Async counterpart of OpenLibraryClient.get; returns an httpx.Response."""
+        if not self.breaker.allow_request():
+            raise self.sync_client.unavailable()
+        try:
+            async with self._borrow_client() as client:
+                return await self._get(client, path, params)
+        except (httpx.HTTPError, OpenLibraryUnavailable):
+            raise
+        except BaseException:
+            # Cancelled (the client went away) or an unexpected error: not a
+            # verdict on the upstream, but a half-open trial must not stay in
+            # flight for good
+            self.breaker.release_trial()
+            raise
+
+    async def _get(self, client, path, params):
+        sync_client = self.sync_client
+        sync_client.retry_budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                response = await client.get(path, params=params)
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                status_code = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+                if is_client_error(status_code):
+                    self.breaker.record_success()
+                    raise
+
+                retryable = isinstance(e, httpx.TransportError) or status_code in RETRYABLE_STATUS_CODES
+                if retryable and attempt < sync_client.max_retries and sync_client.retry_budget.withdraw():
+                    await asyncio.sleep(backoff_delay(attempt))
+                    attempt += 1
+                    continue
+
+                self.breaker.record_failure()
+                print("OpenLibrary request failed:", e)
+                raise sync_client.unavailable() from e
+            self.breaker.record_success()
+            return response
+
+    async def search(self, title):
+        response = await self.get("/search.json", params={"title": title})
+        try:
+            return response.json()
+        except ValueError as e:
+            self.breaker.record_failure()
+            raise self.sync_client.unavailable("OpenLibrary returned an invalid response") from e
+
+
+openlibrary_client = OpenLibraryClient()
+# Cover images come from a different host; give it its own pool and breaker
+covers_client = OpenLibraryClient(base_url=settings.OPENLIBRARY_COVERS_URL)
+async_openlibrary_client = AsyncOpenLibraryClient(openlibrary_client)
@@ -0,0 +1,101 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are fetched with a WHERE clause on the ordering columns instead of
+OFFSET, so page N costs the same as page 1 as long as an index covers the
+ordering. Ordering columns must be non-null and end with a unique column
+(normally "id"). Cursors are opaque url-safe base64 JSON.
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    raw = json.dumps([str(v) for v in values], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, expected_length):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+    if not isinstance(values, list) or len(values) != expected_length:
+        raise InvalidCursor("Invalid cursor")
+    return values
+
+
+def get_page_size(request, default=None, maximum=None):
+    """Read ?page_size=, clamped to [1, maximum]."""
+    default = default or settings.API_PAGE_SIZE
+    maximum = maximum or settings.API_MAX_PAGE_SIZE
+    try:
+        page_size = int(request.GET.get("page_size", default))
+    except (TypeError, ValueError):
+        page_size = default
+    return max(1, min(page_size, maximum))
+
+
+class KeysetPaginator:
+    """
+    paginator = KeysetPaginator(["-start_date", "-id"])
+    rows, next_cursor = paginator.paginate(queryset, request.GET.get("cursor"), page_size)
+
+    `converters` maps an ordering field to a callable turning the cursor's
+    string back into a value; model fields use their own to_python.
+    `getters` maps a field to a callable reading that value off a row
+    (defaults to attribute access), e.g. for related or annotated values.
+    """
+
+    def __init__(self, ordering, converters=None, getters=None):
+        self.ordering = ordering
+        self.fields = [(name.lstrip("-"), name.startswith("-")) for name in ordering]
+        self.converters = converters or {}
+        self.getters = getters or {}
+
+    def _convert(self, queryset, name, value):
+        if name in self.converters:
+            return self.converters[name](value)
+        return queryset.model._meta.get_field(name).to_python(value)
+
+    def _after(self, queryset, values):
+        """Q matching rows strictly after the cursor row in `ordering`."""
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.fields, values):
+            lookup = "lt" if descending else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def _value(self, row, name):
+        if name in self.getters:
+            return self.getters[name](row)
+        return getattr(row, name)
+
+    def paginate(self, queryset, cursor, page_size):
+        """Return (rows, next_cursor); next_cursor is None on the last page."""
+        queryset = queryset.order_by(*self.ordering)
+        if cursor:
+            raw = decode_cursor(cursor, len(self.fields))
+            try:
+                values = [self._convert(queryset, name, value) for (name, _), value in zip(self.fields, raw)]
+            except Exception as e:
+                raise InvalidCursor("Invalid cursor") from e
+            queryset = queryset.filter(self._after(queryset, values))
+
+        rows = list(queryset[: page_size + 1])
+        if len(rows) <= page_size:
+            return rows, None
+
+        rows = rows[:page_size]
+        last = rows[-1]
+        return rows, encode_cursor([self._value(last, name) for name, _ in self.fields])
@@ -0,0 +1,298 @@
+"""
+Shared (Redis) cache of read endpoint responses, invalidated by tag.
+
+Every cached response is stored under a key made of the endpoint, its
+parameters, today's date (fees and "overdue" change daily) and the current
+version of each tag it depends on, e.g. "student:12" or "books". Writes
+bump the versions of the tags they touch (book/signals.py for single-row
+saves and deletes, explicit invalidate_* calls after bulk writes), so
+later lookups build new keys and the old entries are never read again;
+they simply expire.
+
+Staleness is bounded: after a commit, the next request sees the new data.
+Writes that bypass both the signals and the invalidate_* helpers show up
+at the latest after RESPONSE_CACHE_TTL. Hits carry an Age header and
+stats() reports hit ratios per endpoint for this process.
+
+The same key doubles as the response's ETag, and the time of the latest
+bump of its tags as Last-Modified, so conditional GETs (If-None-Match /
+If-Modified-Since) are answered with 304 Not Modified from the tag lookup
+alone: no query, no serialization. Last-Modified is rounded up to the
+whole second and only sent once that second is over, so a later write
+always moves it; if a tag's modified time was evicted it isn't sent at
+all (and If-Modified-Since is ignored) until the tag is bumped again.
+"""
+import functools
+import hashlib
+import math
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, time as dt_time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from book.models import Student
+
+
+ALL_RENTALS = "rentals"
+ALL_STUDENTS = "students"
+ALL_BOOKS = "books"
+
+
+def student_tag(student_id):
+    return f"student:{student_id}"
+
+
+class ResponseCache:
+    """See module docstring."""
+
+    BACKOFF_SECONDS = 30
+
+    def __init__(self, namespace="resp", alias="default"):
+        self.namespace = namespace
+        self.alias = alias
+
+        self._lock = threading.Lock()
+        self._counters = defaultdict(
+            lambda: {"hits": 0, "misses": 0, "not_modified": 0, "bypassed": 0, "max_age_served": 0}
+        )
+        self._invalidations = 0
+        self._down_until = 0.0
+
+    # ----------------------------
+    # Internal helpers
+    # ----------------------------
+    def _cache(self):
+        """Return the cache, or None while it is backing off after an error."""
+        if time.monotonic() < self._down_until:
+            return None
+        return caches[self.alias]
+
+    def _failed(self, error):
+        print(f"Response cache unavailable ({self.namespace}):", error)
+        self._down_until = time.monotonic() + self.BACKOFF_SECONDS
+
+    def _count(self, name, counter, age=None):
+        with self._lock:
+            stats = self._counters[name]
+            stats[counter] += 1
+            if age is not None:
+                stats["max_age_served"] = max(stats["max_age_served"], age)
+
+    def _version_key(self, tag):
+        return f"{self.namespace}:tag:{tag}"
+
+    def _modified_key(self, tag):
+        return f"{self.namespace}:modified:{tag}"
+
+    def _digest(self, request, versions):
+        parts = [
+            request.get_host(),
+            request.path,
+            "&".join(f"{k}={v}" for k, v in sorted(request.GET.lists())),
+            timezone.now().date().isoformat(),
+            *(f"{tag}={version}" for tag, version in sorted(versions.items())),
+        ]
+        return hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()
+
+    # ----------------------------
+    # Tag versions
+    # ----------------------------
+    def tag_state(self, tags):
+        """
+        ({tag: version}, last modified timestamp or None) in one round
+        trip, or None if the cache is down. A tag seen for the first time (or
+        evicted) starts at the current time in ns, so it never repeats a
+        version an old entry was stored under, and is modified now. The
+        timestamp is None when a tag's modified time is gone.
+        """
+        cache = self._cache()
+        if cache is None:
+            return None
+        keys = {self._version_key(tag): tag for tag in tags}
+        modified_keys = [self._modified_key(tag) for tag in tags]
+        try:
+            found = cache.get_many([*keys, *modified_keys])
+            for key, tag in keys.items():
+                if key not in found:
+                    modified = time.time()
+                    cache.add(key, time.time_ns(), None)
+                    cache.set(self._modified_key(tag), modified, None)
+                    found[key] = cache.get(key)
+                    found[self._modified_key(tag)] = modified
+        except Exception as e:
+            self._failed(e)
+            return None
+
+        versions = {tag: found[key] for key, tag in keys.items()}
+        if any(key not in found for key in modified_keys):
+            return versions, None
+        # Fees and "overdue" change at midnight even without writes
+        start_of_day = datetime.combine(timezone.localdate(), dt_time.min, tzinfo=timezone.get_current_timezone())
+        return versions, max([start_of_day.timestamp(), *(found[key] for key in modified_keys)])
+
+    def invalidate(self, *tags):
+        """Bump the given tags now. Prefer invalidate_on_commit() inside transactions."""
+        cache = self._cache()
+        if cache is None:
+            return
+        for tag in set(tags):
+            key = self._version_key(tag)
+            try:
+                if not cache.add(key, time.time_ns(), None):
+                    cache.incr(key)
+            except ValueError:
+                # Expired/evicted between add and incr
+                cache.add(key, time.time_ns(), None)
+            except Exception as e:
+                self._failed(e)
+                return
+            try:
+                cache.set(self._modified_key(tag), time.time(), None)
+            except Exception as e:
+                self._failed(e)
+                return
+        with self._lock:
+            self._invalidations += 1
+
+    def invalidate_on_commit(self, *tags):
+        transaction.on_commit(lambda: self.invalidate(*tags), robust=True)
+
+    # ----------------------------
+    # Serving
+    # ----------------------------
+    def serve(self, name, tags, request, build):
+        """
+        Answer a conditional GET with 304, else return the cached response
+        for this request, or build() it and cache it if it is a 200.
+        Responses carry X-Cache: HIT/MISS/BYPASS; 200s also ETag and
+        Last-Modified, with "Cache-Control: private, no-cache" so browsers
+        revalidate instead of re-downloading.
+        """
+        state = self.tag_state(tags)
+        if state is None:
+            self._count(name, "bypassed")
+            response = build()
+            response["X-Cache"] = "BYPASS"
+            return response
+
+        versions, last_modified = state
+        digest = self._digest(request, versions)
+        validators = {"ETag": f'W/"{digest}"'}
+        if last_modified is not None:
+            # HTTP dates have whole seconds: a write later in the same second
+            # must still move Last-Modified past what a client was sent
+            last_modified = math.ceil(last_modified)
+            if last_modified <= time.time():
+                validators["Last-Modified"] = http_date(last_modified)
+            else:
+                last_modified = None
+
+        not_modified = get_conditional_response(request, etag=validators["ETag"], last_modified=last_modified)
+        if not_modified is not None:
+            self._count(name, "not_modified")
+            for header, value in validators.items():
+                not_modified[header] = value
+            return not_modified
+
+        cache = caches[self.alias]
+        key = f"{self.namespace}:{name}:{digest}"
+        try:
+            entry = cache.get(key)
+        except Exception as e:
+            self._failed(e)
+            entry = None
+
+        if entry is not None:
+            age = int(time.time() - entry["created"])
+            self._count(name, "hits", age)
+            response = Response(entry["data"], status=entry["status"])
+            response["X-Cache"] = "HIT"
+            response["Age"] = str(age)
+        else:
+            self._count(name, "misses")
+            response = build()
+            response["X-Cache"] = "MISS"
+            if response.status_code != 200 or not isinstance(response, Response):
+                return response
+            try:
+                cache.set(
+                    key,
+                    {"data": response.data, "status": response.status_code, "created": time.time()},
+                    settings.RESPONSE_CACHE_TTL,
+                )
+            except Exception as e:
+                self._failed(e)
+
+        for header, value in validators.items():
+            response[header] = value
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def stats(self):
+        """Per-endpoint hit/miss counters for this process."""
+        with self._lock:
+            endpoints = {name: dict(stats) for name, stats in self._counters.items()}
+            invalidations = self._invalidations
+        for stats in endpoints.values():
+            # 304s are answered from the cache too
+            lookups = stats["hits"] + stats["not_modified"] + stats["misses"]
+            stats["hit_ratio"] = round((lookups - stats["misses"]) / lookups, 4) if lookups else 0.0
+        return {
+            "ttl_seconds": settings.RESPONSE_CACHE_TTL,
+            "invalidations": invalidations,
+            "endpoints": endpoints,
+        }
+
+
+response_cache = ResponseCache()
+
+
+def cache_response(name, tags):
+    """
+    Cache an APIView GET method's responses. `tags(request, **kwargs)`
+    returns the tags the response depends on.
+    """
+    def decorator(view_method):
+        @functools.wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            return response_cache.serve(
+                name,
+                tags(request, **kwargs),
+                request,
+                lambda: view_method(self, request, *args, **kwargs),
+            )
+        return wrapper
+    return decorator
+
+
+# ---------------------- Invalidation helpers ----------------------
+
+def invalidate_rentals(user_ids):
+    """After rentals of these users changed: the rentals list and their students' lists."""
+    user_ids = set(user_ids)
+
+    def invalidate():
+        student_ids = Student.objects.filter(user_id__in=user_ids).values_list("id", flat=True)
+        response_cache.invalidate(ALL_RENTALS, *(student_tag(student_id) for student_id in student_ids))
+
+    if user_ids:
+        transaction.on_commit(invalidate, robust=True)
+
+
+def invalidate_students(student_ids=()):
+    # The rentals list shows student names too
+    response_cache.invalidate_on_commit(
+        ALL_STUDENTS, ALL_RENTALS, *(student_tag(student_id) for student_id in student_ids)
+    )
+
+
+def invalidate_books():
+    response_cache.invalidate_on_commit(ALL_BOOKS)
@@ -0,0 +1,24 @@
+"""
+Whether this process serves requests through backend/asgi.py (an ASGI
+server such as uvicorn) or through WSGI.
+
+Long-lived async resources (per-loop connection pools, open event streams)
+only make sense on an ASGI server's event loop. Under WSGI, Django runs
+each async view on a new event loop that is closed when the view returns.
+"""
+from django.core.handlers.asgi import ASGIRequest
+
+_asgi = False
+
+
+def mark_asgi():
+    """Called by backend/asgi.py once the ASGI application is created."""
+    global _asgi
+    _asgi = True
+
+
+def served_under_asgi(request=None):
+    """True under an ASGI server; for a given request, whether it came through one."""
+    if request is not None:
+        return isinstance(request, ASGIRequest)
+    return _asgi
@@ -0,0 +1,157 @@
+"""
+Ranked book search over Book.title and Book.author.
+
+- PostgreSQL: tsvector GIN index (title weighted above author) plus pg_trgm
+  GIN indexes for substring (ILIKE) and fuzzy (%) matches. Queries shorter
+  than a trigram only use the prefix tsquery: pg_trgm can't narrow them
+  down, so the trigram conditions would scan the whole index.
+- SQLite: FTS5 external-content table kept in sync by triggers. No
+  substring matching: a query FTS doesn't match has no results.
+- Anything else (or a SQLite without the FTS table): icontains.
+
+The indexes themselves are created in migration 0007_book_search_index.
+"""
+import re
+
+from django.conf import settings
+from django.db import OperationalError, connection, connections
+from django.db.models import Q
+
+from book.models import Book
+
+
+# Must stay identical to the indexed expression in migration 0007, otherwise
+# PostgreSQL will not use the GIN index.
+PG_SEARCH_VECTOR = (
+    "(setweight(to_tsvector('simple'::regconfig, coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(author, '')), 'B'))"
+)
+
+SQLITE_FTS_TABLE = "book_book_fts"
+
+# pg_trgm extracts no trigram from shorter strings
+MIN_TRIGRAM_QUERY_LENGTH = 3
+
+# Kept in sync with migration 0007. Django rebuilds the table for most
+# ALTERs on SQLite, which drops its triggers; ensure_sqlite_search_triggers()
+# puts them back after every migrate.
+SQLITE_FTS_TRIGGERS = {
+    "book_book_fts_ai": f"""
+        CREATE TRIGGER IF NOT EXISTS book_book_fts_ai AFTER INSERT ON book_book BEGIN
+            INSERT INTO {SQLITE_FTS_TABLE}(rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
+    """,
+    "book_book_fts_ad": f"""
+        CREATE TRIGGER IF NOT EXISTS book_book_fts_ad AFTER DELETE ON book_book BEGIN
+            INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, title, author)
+            VALUES ('delete', old.id, old.title, old.author);
+        END
+    """,
+    "book_book_fts_au": f"""
+        CREATE TRIGGER IF NOT EXISTS book_book_fts_au AFTER UPDATE OF title, author ON book_book BEGIN
+            INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, title, author)
+            VALUES ('delete', old.id, old.title, old.author);
+            INSERT INTO {SQLITE_FTS_TABLE}(rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
+    """,
+}
+
+
+def ensure_sqlite_search_triggers(using="default"):
+    """
+    Recreate the FTS sync triggers that a table rebuild dropped, and rebuild
+    the FTS index they stopped maintaining. No-op elsewhere than SQLite, or
+    without the FTS table (FTS5 not compiled in).
+    """
+    db = connections[using]
+    if db.vendor != "sqlite":
+        return
+    with db.cursor() as cursor:
+        cursor.execute("SELECT type, name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+        existing = {name for _, name in cursor.fetchall()}
+        if SQLITE_FTS_TABLE not in existing or "book_book" not in existing:
+            return
+        missing = [name for name in SQLITE_FTS_TRIGGERS if name not in existing]
+        if not missing:
+            return
+        for name in missing:
+            cursor.execute(SQLITE_FTS_TRIGGERS[name])
+        cursor.execute(f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')")
+        print(f"Restored book search triggers {', '.join(missing)} and rebuilt {SQLITE_FTS_TABLE}")
+
+
+def _tokens(query):
+    return re.findall(r"[^\W_]+", query.lower())
+
+
+def _like_pattern(query):
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _search_postgresql(query, tokens, limit):
+    # Every token is a prefix match, so partially typed words still hit
+    tsquery = " & ".join(f"{token}:*" for token in tokens)
+    if len(query) >= MIN_TRIGRAM_QUERY_LENGTH:
+        trigram_match = """
+           OR title ILIKE %(like)s
+           OR author ILIKE %(like)s
+           OR title %% %(query)s"""
+        similarity = "GREATEST(similarity(title, %(query)s), similarity(coalesce(author, ''), %(query)s))"
+    else:
+        trigram_match = ""
+        similarity = "0"
+    sql = f"""
+        SELECT book_book.*,
+               ts_rank({PG_SEARCH_VECTOR}, q) * 2 + {similarity} AS search_rank
+        FROM book_book, to_tsquery('simple', %(tsquery)s) q
+        WHERE {PG_SEARCH_VECTOR} @@ q{trigram_match}
+        ORDER BY search_rank DESC, id
+        LIMIT %(limit)s
+    """
+    params = {"query": query, "tsquery": tsquery, "like": _like_pattern(query), "limit": limit}
+    return list(Book.objects.raw(sql, params))
+
+
+def _search_sqlite(query, tokens, limit):
+    match = " ".join(f'"{token}"*' for token in tokens)
+    sql = f"""
+        SELECT book_book.*
+        FROM {SQLITE_FTS_TABLE}
+        JOIN book_book ON book_book.id = {SQLITE_FTS_TABLE}.rowid
+        WHERE {SQLITE_FTS_TABLE} MATCH %s
+        ORDER BY bm25({SQLITE_FTS_TABLE}, 10.0, 5.0), book_book.id
+        LIMIT %s
+    """
+    return list(Book.objects.raw(sql, [match, limit]))
+
+
+def _search_icontains(query, limit):
+    return list(
+        Book.objects.filter(Q(title__icontains=query) | Q(author__icontains=query))
+        .order_by("title", "id")[:limit]
+    )
+
+
+def search_books(query, limit=None):
+    """
+    Return up to `limit` Books matching `query` on title or author, best first.
+    """
+    query = (query or "").strip()
+    limit = limit or settings.BOOK_SEARCH_RESULTS_LIMIT
+    tokens = _tokens(query)
+    if not tokens:
+        # Only punctuation: nothing any index could narrow down
+        return []
+
+    if connection.vendor == "postgresql":
+        return _search_postgresql(query, tokens, limit)
+
+    if connection.vendor == "sqlite":
+        try:
+            return _search_sqlite(query, tokens, limit)
+        except OperationalError:
+            # FTS5 not compiled in, or migrations not applied yet
+            return _search_icontains(query, limit)
+
+    return _search_icontains(query, limit)
@@ -0,0 +1,202 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+
+from book.authentication import invalidate_principal
+from book.autocomplete import INDEXED_FIELDS, book_index, publish_catalog_change
+from book.events import publish_on_commit, rental_event
+from book.models import Book, Rental, RentalTombstone, Student, User
+from book.response_cache import invalidate_books, invalidate_rentals, invalidate_students
+from book.search import ensure_sqlite_search_triggers
+from book.summary import loaded_state, record_rental_change, rental_state
+
+
+def fields_changed(instance, fields, update_fields):
+    """
+    Whether an update (not an insert) of instance changed one of fields,
+    compared with the values it was loaded with (LoadedValuesMixin).
+    remember_saved_values(), at the end of this module, moves those on
+    once every receiver has looked.
+    """
+    if update_fields is not None:
+        fields = [field for field in fields if field in update_fields]
+    # Deferred fields weren't loaded, so they can't have been changed
+    fields = [field for field in fields if field in instance.__dict__]
+    if not fields:
+        return False
+    loaded = getattr(instance, "_loaded_values", None)
+    if loaded is None:
+        # Not loaded from the database (built by hand): can't tell, assume it did
+        return True
+    return any(field not in loaded or loaded[field] != getattr(instance, field) for field in fields)
+
+
+# ---------------------- Autocomplete index ----------------------
+
+@receiver(post_save, sender=Book)
+def index_saved_book(sender, instance, created, update_fields=None, **kwargs):
+    if not created and not fields_changed(instance, INDEXED_FIELDS, update_fields):
+        return
+
+    def update():
+        book_index.add_or_update_book(instance)
+        publish_catalog_change([instance.id])
+
+    transaction.on_commit(update)
+
+
+@receiver(post_delete, sender=Book)
+def unindex_deleted_book(sender, instance, **kwargs):
+    book_id = instance.id
+
+    def update():
+        book_index.remove_book(book_id)
+        publish_catalog_change([book_id])
+
+    transaction.on_commit(update)
+
+
+@receiver(post_save, sender=Rental)
+def count_book_rental(sender, instance, created, **kwargs):
+    if created:
+        book_id = instance.book_id
+        transaction.on_commit(lambda: book_index.bump_popularity(book_id))
+
+
+# ---------------------- Book search ----------------------
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    if sender.name == "book":
+        ensure_sqlite_search_triggers(using)
+
+
+# ---------------------- Rental summaries ----------------------
+# Rental.save() wraps the write in a transaction, so the summary update
+# commits or rolls back together with the rental.
+
+@receiver(pre_save, sender=Rental)
+def remember_rental_state(sender, instance, **kwargs):
+    instance._summary_before = None if instance._state.adding else loaded_state(instance)
+
+
+@receiver(post_save, sender=Rental)
+def update_rental_summary(sender, instance, **kwargs):
+    after = rental_state(instance)
+    record_rental_change(getattr(instance, "_summary_before", None), after)
+    instance._loaded_values = after
+
+
+@receiver(post_delete, sender=Rental)
+def remove_from_rental_summary(sender, instance, **kwargs):
+    record_rental_change(loaded_state(instance) or rental_state(instance), None)
+
+
+# ---------------------- Response cache ----------------------
+# Bump the tags of cached responses that show the changed row (after commit)
+
+@receiver(post_save, sender=Rental)
+@receiver(post_delete, sender=Rental)
+def invalidate_rental_responses(sender, instance, **kwargs):
+    invalidate_rentals([instance.user_id])
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def invalidate_student_responses(sender, instance, **kwargs):
+    invalidate_students([instance.id])
+
+
+@receiver(post_save, sender=Book)
+def invalidate_book_responses(sender, instance, created, update_fields=None, **kwargs):
+    # Books are only shown in rental rows: a new book has none yet, and
+    # saves of fields the rows don't show (enrichment_status...) change nothing
+    if not created and fields_changed(instance, BOOK_SYNC_FIELDS, update_fields):
+        invalidate_books()
+
+
+@receiver(post_delete, sender=Book)
+def invalidate_deleted_book_responses(sender, instance, **kwargs):
+    invalidate_books()
+
+
+# ---------------------- JWT principal cache ----------------------
+# Deactivation, revocation and profile edits must reach CachedJWTAuthentication
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_principal(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidate_principal(user_id), robust=True)
+
+
+# ---------------------- Delta sync ----------------------
+# /api/rentals/changes/ follows Rental.updated_at, and rental rows show
+# their book and student, so changes to those touch the rentals too.
+# Only the fields the rental rows show count (book/views/book_rental_views.py);
+# saves of anything else (enrichment_status, last_login...) touch nothing.
+
+BOOK_SYNC_FIELDS = ("title", "author", "pages", "cover_url", "cover_hash")
+STUDENT_SYNC_FIELDS = ("student_name", "email")
+# Shown for students without a profile
+USER_SYNC_FIELDS = ("username", "email")
+
+
+@receiver(post_save, sender=Book)
+def touch_book_rentals(sender, instance, created, update_fields=None, **kwargs):
+    if not created and fields_changed(instance, BOOK_SYNC_FIELDS, update_fields):
+        Rental.objects.filter(book_id=instance.id).touch()
+
+
+@receiver(post_save, sender=Student)
+def touch_student_rentals(sender, instance, created, update_fields=None, **kwargs):
+    if not created and fields_changed(instance, STUDENT_SYNC_FIELDS, update_fields):
+        Rental.objects.filter(user_id=instance.user_id).touch()
+
+
+@receiver(post_save, sender=User)
+def touch_user_rentals(sender, instance, created, update_fields=None, **kwargs):
+    if not created and fields_changed(instance, USER_SYNC_FIELDS, update_fields):
+        Rental.objects.filter(user_id=instance.id).touch()
+
+
+@receiver(post_delete, sender=Rental)
+def record_rental_tombstone(sender, instance, **kwargs):
+    RentalTombstone.objects.create(rental_id=instance.id)
+
+
+# ---------------------- Rental events (SSE) ----------------------
+
+@receiver(post_save, sender=Rental)
+def publish_rental_change(sender, instance, created, **kwargs):
+    before = getattr(instance, "_summary_before", None)
+    if created or before is None:
+        event_type = "rental.created"
+    elif before["status"] != "returned" and instance.status == "returned":
+        event_type = "rental.returned"
+    elif before["end_date"] != instance.end_date:
+        event_type = "rental.extended"
+    else:
+        event_type = "rental.updated"
+    publish_on_commit([rental_event(event_type, instance)])
+
+
+@receiver(post_delete, sender=Rental)
+def publish_rental_deletion(sender, instance, **kwargs):
+    publish_on_commit([rental_event("rental.deleted", instance)])
+
+
+# ---------------------- Loaded values ----------------------
+# Registered last, so every receiver above compared against the values
+# from before this save
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Student)
+@receiver(post_save, sender=User)
+def remember_saved_values(sender, instance, **kwargs):
+    saved = {
+        field.attname: instance.__dict__[field.attname]
+        for field in sender._meta.concrete_fields
+        if field.attname in instance.__dict__
+    }
+    instance._loaded_values = {**getattr(instance, "_loaded_values", {}), **saved}
@@ -0,0 +1,238 @@
+"""
+Request coalescing ("single-flight") for expensive lookups.
+
+Concurrent calls for the same key share one execution:
+- within a process, followers wait on the leader's result (threads or asyncio tasks)
+- across workers, the leader holds a short Redis lock (cache.add) and other
+  workers poll the shared result cache until the leader has filled it;
+  the leader checks that cache again once it holds the lock, in case the
+  previous leader filled it in between
+
+If Redis is unavailable the cross-worker step is skipped and only the
+in-process coalescing applies.
+"""
+import asyncio
+import threading
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+
+
+# Delete the lock only if it still holds our token, in one step: a leader
+# that outlived lock_timeout must not delete the next leader's lock
+RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls per key. Keys must be cache-key safe.
+    """
+
+    def __init__(self, namespace, lock_timeout=15, wait_timeout=12, poll_interval=0.05,
+                 shared_alias="default"):
+        self.namespace = namespace
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.shared_alias = shared_alias
+
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = {}
+        self._counters = {"leaders": 0, "coalesced": 0, "remote_waits": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters)
+
+    # ----------------------------
+    # Cross-worker lock
+    # ----------------------------
+    def _lock_key(self, key):
+        return f"singleflight:{self.namespace}:{key}"
+
+    def _acquire(self, key):
+        """
+        Try to take the distributed lock.
+        Returns a token when acquired, None when another worker holds it,
+        and "" when Redis is down (caller should just run locally).
+        """
+        token = uuid.uuid4().hex
+        try:
+            if caches[self.shared_alias].add(self._lock_key(key), token, self.lock_timeout):
+                return token
+            return None
+        except Exception as e:
+            print(f"Single-flight lock unavailable ({self.namespace}):", e)
+            return ""
+
+    def _release(self, key, token):
+        if not token:
+            return
+        lock_key = self._lock_key(key)
+        try:
+            shared = caches[self.shared_alias]
+            if isinstance(shared, RedisCache):
+                # Compare against the value as RedisCache stored it
+                client = shared._cache.get_client(lock_key, write=True)
+                client.eval(
+                    RELEASE_SCRIPT, 1, shared.make_and_validate_key(lock_key), shared._cache._serializer.dumps(token)
+                )
+            elif shared.get(lock_key) == token:
+                # Other backends (tests, local development) are per process
+                shared.delete(lock_key)
+        except Exception:
+            pass
+
+    def _lock_held(self, key):
+        try:
+            return caches[self.shared_alias].get(self._lock_key(key)) is not None
+        except Exception:
+            return False
+
+    def _run_distributed(self, key, fn, peek):
+        token = self._acquire(key)
+        if token is None:
+            # Another worker is fetching: wait for its result to land in the cache
+            self._count("remote_waits")
+            deadline = time.monotonic() + self.wait_timeout
+            delay = self.poll_interval
+            while time.monotonic() < deadline:
+                time.sleep(delay)
+                hit, value = peek()
+                if hit:
+                    return value
+                if not self._lock_held(key):
+                    break
+                delay = min(delay * 2, 0.5)
+            # Leader failed or took too long: fetch ourselves
+            token = self._acquire(key)
+
+        try:
+            # The previous leader may have filled the cache just before we took the lock
+            hit, value = peek()
+            if hit:
+                return value
+            return fn()
+        finally:
+            self._release(key, token)
+
+    # ----------------------------
+    # Sync API
+    # ----------------------------
+    def do(self, key, fn, peek):
+        """
+        Run `fn()` once for all concurrent callers of `key`.
+        `peek()` must return ``(hit, value)`` from the shared result cache
+        that `fn` populates.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            self._count("coalesced")
+            if not call.event.wait(self.wait_timeout):
+                return fn()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        self._count("leaders")
+        try:
+            call.result = self._run_distributed(key, fn, peek)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    # ----------------------------
+    # Async API
+    # ----------------------------
+    async def ado(self, key, coro_fn, apeek):
+        """
+        Async counterpart of `do`: `coro_fn()` returns an awaitable and
+        `apeek()` is an async ``(hit, value)`` cache lookup.
+        """
+        loop = asyncio.get_running_loop()
+        calls = self._async_calls.setdefault(loop, {})
+        future = calls.get(key)
+        if future is not None:
+            self._count("coalesced")
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader's request was cancelled, not ours: fetch ourselves
+                return await coro_fn()
+
+        future = calls[key] = loop.create_future()
+        self._count("leaders")
+        try:
+            result = await self._arun_distributed(key, coro_fn, apeek)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an un-awaited failure doesn't log a warning
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            calls.pop(key, None)
+            if not calls:
+                self._async_calls.pop(loop, None)
+
+    async def _arun_distributed(self, key, coro_fn, apeek):
+        acquire = sync_to_async(self._acquire, thread_sensitive=False)
+        token = await acquire(key)
+        if token is None:
+            self._count("remote_waits")
+            lock_held = sync_to_async(self._lock_held, thread_sensitive=False)
+            deadline = time.monotonic() + self.wait_timeout
+            delay = self.poll_interval
+            while time.monotonic() < deadline:
+                await asyncio.sleep(delay)
+                hit, value = await apeek()
+                if hit:
+                    return value
+                if not await lock_held(key):
+                    break
+                delay = min(delay * 2, 0.5)
+            token = await acquire(key)
+
+        try:
+            hit, value = await apeek()
+            if hit:
+                return value
+            return await coro_fn()
+        finally:
+            await sync_to_async(self._release, thread_sensitive=False)(key, token)
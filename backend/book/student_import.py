@@ -0,0 +1,264 @@
+"""
+Bulk student import from CSV.
+
+AddNewStudentView hashes one password per request; with PBKDF2 that is
+100-300 ms of CPU each, so an intake of thousands of students is mostly
+spent in make_password(). Rows are validated, split into chunks, and each
+chunk's passwords are hashed before users and students are inserted with
+bulk_create, one transaction per chunk.
+
+- import_students (management command): StudentImporter hashes each
+  chunk across a process pool (hashing is CPU bound, so threads wouldn't
+  help under the GIL).
+- /api/students/bulk-import/: the request only validates the file and
+  records a StudentImport with its chunks; a Celery task per chunk does
+  the hashing and inserts (see book/tasks.py), so chunks run in parallel
+  across the worker pool. Celery workers are daemonic and can't start a
+  process pool themselves. The rows (with their plaintext passwords) stay
+  in the database, not the broker, until their chunk is inserted.
+
+Rows that are invalid or whose email is taken (in the database or earlier
+in the file) are reported and skipped; the rest are still imported.
+"""
+import csv
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from book.models import Student, StudentImport, StudentImportChunk, User
+from book.response_cache import invalidate_students
+
+
+DEFAULT_STUDENT_PASSWORD = "Password@123"
+
+# Below this many passwords, starting the pool costs more than it saves
+MIN_PARALLEL_HASHES = 32
+
+
+def _row_error(line, email, message):
+    return {"line": line, "email": email, "error": message}
+
+
+def read_student_rows(lines):
+    """
+    Yield (line number, student_name, email, password or None) from CSV
+    text lines with a header row: student_name (or name), email and an
+    optional password column.
+    """
+    reader = csv.DictReader(lines)
+    for row in reader:
+        row = {(key or "").strip().lower(): (value or "").strip() for key, value in row.items() if key}
+        yield (
+            reader.line_num,
+            row.get("student_name") or row.get("name") or "",
+            row.get("email", ""),
+            row.get("password") or None,
+        )
+
+
+def validate_rows(rows, seen_emails, result):
+    """
+    The rows (from read_student_rows()) with a name and a valid email not
+    seen earlier in the file; the others are added to result's errors.
+    """
+    valid = []
+    for line, student_name, email, password in rows:
+        error = None
+        if not student_name or not email:
+            error = "Student name and email are required."
+        else:
+            try:
+                validate_email(email)
+            except ValidationError:
+                error = "Invalid email address."
+        if error is None and email in seen_emails:
+            error = "Duplicate email earlier in the file."
+        if error:
+            result["errors"].append(_row_error(line, email, error))
+            result["skipped"] += 1
+            continue
+        seen_emails.add(email)
+        valid.append((line, student_name, email, password))
+    return valid
+
+
+def _empty_result():
+    return {"created": 0, "skipped": 0, "errors": []}
+
+
+def _users(rows, hashes):
+    return [
+        User(username=student_name, email=email, password=password_hash)
+        for (_, student_name, email, _), password_hash in zip(rows, hashes)
+    ]
+
+
+class StudentImporter:
+    """
+    Imports students chunk by chunk. Use as a context manager so the hashing
+    pool is shut down:
+
+        with StudentImporter() as importer:
+            result = importer.run(read_student_rows(lines))
+    """
+
+    def __init__(self, chunk_size=None, workers=None, default_password=DEFAULT_STUDENT_PASSWORD):
+        self.chunk_size = chunk_size or settings.STUDENT_IMPORT_CHUNK_SIZE
+        self.workers = workers or settings.STUDENT_IMPORT_WORKERS or os.cpu_count() or 1
+        self.default_password = default_password
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def hash_passwords(self, passwords):
+        if self.workers < 2 or len(passwords) < MIN_PARALLEL_HASHES:
+            return [make_password(password) for password in passwords]
+        if self._pool is None:
+            # spawn, not fork: the web server may be threaded, and forking a
+            # threaded process can copy held locks into the children
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=django.setup,
+            )
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return list(self._pool.map(make_password, passwords, chunksize=chunksize))
+
+    def run(self, rows, progress=None):
+        """
+        Import rows from read_student_rows(). Returns {"created", "skipped",
+        "errors": [{"line", "email", "error"}]}. `progress(result)` is called
+        after every chunk.
+        """
+        result = _empty_result()
+        seen_emails = set()
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                self.import_chunk(chunk, seen_emails, result)
+                chunk = []
+                if progress:
+                    progress(result)
+        if chunk:
+            self.import_chunk(chunk, seen_emails, result)
+            if progress:
+                progress(result)
+        return result
+
+    def import_chunk(self, chunk, seen_emails, result):
+        self.insert_rows(validate_rows(chunk, seen_emails, result), result)
+
+    def insert_rows(self, rows, result):
+        """Create students for rows already through validate_rows(), skipping emails taken in the database."""
+        taken = set(User.objects.filter(email__in=[email for _, _, email, _ in rows]).values_list("email", flat=True))
+        new = []
+        for row in rows:
+            if row[2] in taken:
+                result["errors"].append(_row_error(row[0], row[2], "A user with this email already exists."))
+            else:
+                new.append(row)
+
+        result["skipped"] += len(rows) - len(new)
+        if not new:
+            return
+
+        hashes = self.hash_passwords([password or self.default_password for _, _, _, password in new])
+        try:
+            with transaction.atomic():
+                users = User.objects.bulk_create(_users(new, hashes))
+                Student.objects.bulk_create([
+                    Student(user=user, student_name=user.username, email=user.email) for user in users
+                ])
+                invalidate_students()
+            result["created"] += len(users)
+        except IntegrityError:
+            # An email registered since the check above (e.g. a concurrent
+            # sign-up): insert one by one so only that student is skipped
+            self._insert_each(new, hashes, result)
+
+    def _insert_each(self, rows, hashes, result):
+        created = 0
+        for row, user in zip(rows, _users(rows, hashes)):
+            try:
+                with transaction.atomic():
+                    user.save()
+                    Student.objects.create(user=user, student_name=user.username, email=user.email)
+                created += 1
+            except IntegrityError as e:
+                result["errors"].append(_row_error(row[0], row[2], f"Not imported: {e}"))
+                result["skipped"] += 1
+        if created:
+            invalidate_students()
+        result["created"] += created
+
+
+# ---------------------- API imports (Celery) ----------------------
+
+def prepare_import(rows, chunk_size=None):
+    """
+    Validate rows for an API import and record a StudentImport with its
+    StudentImportChunks. Returns (student_import, chunk ids); queue one
+    import_student_chunk task per chunk id once they are committed.
+    """
+    chunk_size = chunk_size or settings.STUDENT_IMPORT_CHUNK_SIZE
+    rows = list(rows)
+    result = _empty_result()
+    valid = validate_rows(rows, set(), result)
+    chunks = [valid[start:start + chunk_size] for start in range(0, len(valid), chunk_size)]
+    student_import = StudentImport.objects.create(
+        total_rows=len(rows),
+        chunks_total=len(chunks),
+        skipped=result["skipped"],
+        errors=result["errors"],
+        finished_at=None if chunks else timezone.now(),
+    )
+    chunks = StudentImportChunk.objects.bulk_create([
+        StudentImportChunk(student_import=student_import, rows=chunk) for chunk in chunks
+    ])
+    return student_import, [chunk.id for chunk in chunks]
+
+
+def run_import_chunk(chunk_id):
+    """
+    Insert one StudentImportChunk, add its outcome to its StudentImport and
+    delete it. A chunk already gone (a redelivered task) is ignored.
+    """
+    chunk = StudentImportChunk.objects.filter(pk=chunk_id).first()
+    if chunk is None:
+        return
+    rows = [tuple(row) for row in chunk.rows]
+    result = _empty_result()
+    try:
+        StudentImporter(workers=1).insert_rows(rows, result)
+    except Exception as e:
+        print("Student import chunk failed:", e)
+        result["errors"].append(_row_error(rows[0][0], None, f"Rows from this line on were not all imported: {e}"))
+        result["skipped"] = len(rows) - result["created"]
+
+    with transaction.atomic():
+        # Counted only by the run that deletes the chunk
+        if not StudentImportChunk.objects.filter(pk=chunk_id).delete()[0]:
+            return
+        student_import = StudentImport.objects.select_for_update().get(pk=chunk.student_import_id)
+        student_import.created += result["created"]
+        student_import.skipped += result["skipped"]
+        student_import.errors = student_import.errors + result["errors"]
+        student_import.chunks_done += 1
+        if student_import.chunks_done >= student_import.chunks_total:
+            student_import.finished_at = timezone.now()
+        student_import.save()
@@ -0,0 +1,279 @@
+"""
+Incrementally maintained rental totals (RentalSummary).
+
+Every rental write becomes a delta for two rows, the global summary and the
+rental's user, applied with F() updates in the same transaction as the
+write (signals in book/signals.py). Reading a dashboard's totals is then a
+single-row lookup however many rentals there are.
+
+Bulk updates that bypass Rental.save() keep the summaries coherent with
+snapshot()/apply_snapshot_diff() around the update. "overdue" also changes
+as days pass without any write, so refresh_overdue() recounts it daily and
+rebuild() recomputes everything from scratch. Between recounts a rental can
+fall due without being counted; returning it then must not take the
+counter below zero, so overdue decrements are clamped at 0.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from book.expressions import overdue_q
+from book.models import Rental, RentalSummary
+
+
+GLOBAL_SCOPE = "global"
+SUMMARY_FIELDS = ("rentals", "active", "returned", "overdue", "total_fees")
+# Rental fields the summary depends on
+STATE_FIELDS = ("user_id", "status", "total_fee", "start_date", "end_date")
+
+
+def user_scope(user_id):
+    return f"user:{user_id}"
+
+
+def _scopes(user_id):
+    return [GLOBAL_SCOPE, user_scope(user_id)]
+
+
+def _zero():
+    return {"rentals": 0, "active": 0, "returned": 0, "overdue": 0, "total_fees": Decimal("0.00")}
+
+
+def is_overdue(status, start_date, end_date, today=None):
+    """Python twin of book.expressions.overdue_q()."""
+    today = today or timezone.now().date()
+    if status == "returned":
+        return False
+    if end_date:
+        return end_date < today
+    return start_date < today - timedelta(days=30)
+
+
+# ---------------------- Per-rental deltas ----------------------
+
+def rental_state(rental):
+    """The summary-relevant fields of a Rental instance as it is in memory."""
+    return {field: getattr(rental, field) for field in STATE_FIELDS}
+
+
+def loaded_state(rental):
+    """
+    The rental's fields as currently stored, taken from what from_db()
+    loaded (or the last save) when complete, otherwise read from the database.
+    """
+    values = getattr(rental, "_loaded_values", None)
+    if values is not None and all(field in values for field in STATE_FIELDS):
+        return {field: values[field] for field in STATE_FIELDS}
+    return Rental.objects.filter(pk=rental.pk).values(*STATE_FIELDS).first()
+
+
+def _counts(state, today):
+    returned = state["status"] == "returned"
+    return {
+        "rentals": 1,
+        "active": 0 if returned else 1,
+        "returned": 1 if returned else 0,
+        "overdue": 1 if is_overdue(state["status"], state["start_date"], state["end_date"], today) else 0,
+        "total_fees": Decimal(state["total_fee"] or 0),
+    }
+
+
+def rental_delta(before, after, today=None):
+    """{scope: {field: change}} for a rental going from `before` to `after` (either may be None)."""
+    today = today or timezone.now().date()
+    deltas = defaultdict(_zero)
+    for state, sign in ((before, -1), (after, 1)):
+        if state is None:
+            continue
+        counts = _counts(state, today)
+        for scope in _scopes(state["user_id"]):
+            for field, value in counts.items():
+                deltas[scope][field] += sign * value
+    return deltas
+
+
+def _user_id_from_scope(scope):
+    return int(scope.split(":", 1)[1]) if scope.startswith("user:") else None
+
+
+def apply_deltas(deltas):
+    """
+    Add deltas to the summary rows. Must run inside the transaction that
+    made the change. Rows are updated in scope order to avoid deadlocks.
+    """
+    deltas = {
+        scope: {field: value for field, value in delta.items() if value}
+        for scope, delta in deltas.items()
+    }
+    deltas = {scope: delta for scope, delta in deltas.items() if delta}
+    if len(deltas) > 2:
+        _apply_many(deltas)
+        return
+
+    now = timezone.now()
+    for scope in sorted(deltas):
+        delta = deltas[scope]
+        changes = {field: _added(field, value) for field, value in delta.items()}
+        updated = RentalSummary.objects.filter(scope=scope).update(updated_at=now, **changes)
+        if not updated and delta.get("rentals", 0) > 0:
+            # First rental in this scope. Rows are only created for additions,
+            # so deleting a user (and its rentals) doesn't recreate its row.
+            RentalSummary.objects.bulk_create(
+                [RentalSummary(scope=scope, user_id=_user_id_from_scope(scope))],
+                ignore_conflicts=True,
+            )
+            RentalSummary.objects.filter(scope=scope).update(updated_at=now, **changes)
+
+
+def _added(field, value):
+    """F() expression adding `value` to a summary field (overdue never below 0)."""
+    if field == "overdue" and value < 0:
+        return Greatest(F(field) + value, 0)
+    return F(field) + value
+
+
+def _apply_many(deltas):
+    """apply_deltas() for bulk changes: a fixed number of queries however many users are involved."""
+    RentalSummary.objects.bulk_create(
+        [
+            RentalSummary(scope=scope, user_id=_user_id_from_scope(scope))
+            for scope, delta in deltas.items()
+            if delta.get("rentals", 0) > 0
+        ],
+        ignore_conflicts=True,
+    )
+    rows = list(RentalSummary.objects.select_for_update().filter(scope__in=list(deltas)).order_by("scope"))
+    now = timezone.now()
+    for row in rows:
+        for field, value in deltas[row.scope].items():
+            setattr(row, field, getattr(row, field) + value)
+        row.overdue = max(row.overdue, 0)
+        row.updated_at = now
+    RentalSummary.objects.bulk_update(rows, [*SUMMARY_FIELDS, "updated_at"], batch_size=500)
+
+
+def record_rental_change(before, after):
+    apply_deltas(rental_delta(before, after))
+
+
+# ---------------------- Bulk operations ----------------------
+
+def snapshot(queryset, today=None):
+    """
+    Summary totals of a rental queryset per scope, in one grouped query.
+    For bulk updates: snapshot the affected (locked) rows before and after
+    the update and pass both to apply_snapshot_diff().
+    """
+    today = today or timezone.now().date()
+    rows = (
+        queryset.order_by()
+        .values("user_id")
+        .annotate(
+            rentals=Count("id"),
+            active=Count("id", filter=~Q(status="returned")),
+            returned=Count("id", filter=Q(status="returned")),
+            overdue=Count("id", filter=overdue_q(today)),
+            total_fees=Sum("total_fee"),
+        )
+    )
+    totals = defaultdict(_zero)
+    for row in rows:
+        row["total_fees"] = row["total_fees"] or Decimal("0.00")
+        for scope in _scopes(row["user_id"]):
+            for field in SUMMARY_FIELDS:
+                totals[scope][field] += row[field]
+    return totals
+
+
+def apply_snapshot_diff(before, after):
+    deltas = defaultdict(_zero)
+    for scope in set(before) | set(after):
+        for field in SUMMARY_FIELDS:
+            deltas[scope][field] = after.get(scope, _zero())[field] - before.get(scope, _zero())[field]
+    apply_deltas(deltas)
+
+
+# ---------------------- Reconciliation ----------------------
+
+@transaction.atomic
+def rebuild():
+    """
+    Recompute every summary row from the rentals table.
+    Returns {scope: (stored, recomputed)} for rows that had drifted.
+
+    Existing rows are locked first, so writers either committed before the
+    recount (and are included) or wait and apply their delta on top of it.
+    """
+    stored = {
+        row.scope: row
+        for row in RentalSummary.objects.select_for_update().order_by("scope")
+    }
+    totals = snapshot(Rental.objects.all())
+
+    drift = {}
+    now = timezone.now()
+    missing = []
+    for scope in set(stored) | set(totals):
+        values = totals.get(scope, _zero())
+        row = stored.get(scope)
+        if row is None:
+            missing.append(RentalSummary(scope=scope, user_id=_user_id_from_scope(scope), **values))
+            drift[scope] = (None, values)
+            continue
+        current = {field: getattr(row, field) for field in SUMMARY_FIELDS}
+        if current != values:
+            drift[scope] = (current, values)
+            RentalSummary.objects.filter(pk=row.pk).update(updated_at=now, **values)
+
+    RentalSummary.objects.bulk_create(missing, ignore_conflicts=True)
+    if GLOBAL_SCOPE not in stored and GLOBAL_SCOPE not in totals:
+        RentalSummary.objects.get_or_create(scope=GLOBAL_SCOPE)
+    return drift
+
+
+@transaction.atomic
+def refresh_overdue(today=None):
+    """Recount only the date-dependent overdue numbers (non-returned rentals)."""
+    today = today or timezone.now().date()
+    stored = dict(
+        RentalSummary.objects.select_for_update().order_by("scope").values_list("scope", "overdue")
+    )
+    rows = (
+        Rental.objects.filter(overdue_q(today))
+        .order_by()
+        .values("user_id")
+        .annotate(overdue=Count("id"))
+    )
+    overdue = defaultdict(int)
+    for row in rows:
+        for scope in _scopes(row["user_id"]):
+            overdue[scope] += row["overdue"]
+
+    now = timezone.now()
+    changed = 0
+    for scope, current in stored.items():
+        if current != overdue.get(scope, 0):
+            RentalSummary.objects.filter(scope=scope).update(overdue=overdue.get(scope, 0), updated_at=now)
+            changed += 1
+    return changed
+
+
+# ---------------------- Reading ----------------------
+
+def summary_totals(queryset=None):
+    """
+    Totals shaped like book.filters.rental_totals() from one summary row.
+    `queryset` selects the row (default: the global summary).
+    """
+    if queryset is None:
+        queryset = RentalSummary.objects.filter(scope=GLOBAL_SCOPE)
+    row = queryset.first()
+    totals = {field: getattr(row, field) for field in SUMMARY_FIELDS} if row else _zero()
+    totals["count"] = totals.pop("rentals")
+    totals["updated_at"] = row.updated_at if row else None
+    return totals
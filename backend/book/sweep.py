@@ -0,0 +1,85 @@
+"""
+Set-based recomputation of rental status and fee.
+
+Rental.update_status() only runs on save(), so rentals nobody touches keep
+a stale status/total_fee. sweep_open_rentals() walks the open (not
+returned) rentals in id order, in chunks, and fixes the stale ones with one
+UPDATE per chunk using the expressions in book/expressions.py.
+
+Each chunk is a short transaction of its own. Rows a user request has
+locked are skipped (their save recomputes them anyway), so the sweep never
+waits on, or holds up, normal traffic.
+"""
+import time
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from book.events import publish
+from book.expressions import book_pages_subquery, rental_fee_expression, rental_status_expression
+from book.models import Rental
+from book.response_cache import invalidate_rentals
+from book.summary import apply_snapshot_diff, snapshot
+
+
+def _stale_filter(today, fee):
+    return ~Q(status=rental_status_expression(today)) | ~Q(total_fee=fee)
+
+
+def sweep_open_rentals(chunk_size=5000, dry_run=False, pause=0.0, today=None, progress=None):
+    """
+    Recompute status/total_fee of every open rental.
+    Returns {"checked", "changed", "skipped_locked", "seconds"}.
+    `progress(stats)` is called after every chunk; `pause` sleeps between
+    chunks to throttle the job further.
+    """
+    today = today or timezone.now().date()
+    started = time.monotonic()
+    stats = {"checked": 0, "changed": 0, "skipped_locked": 0, "seconds": 0.0}
+
+    open_rentals = Rental.objects.exclude(status="returned").order_by("id")
+    fee = rental_fee_expression(today, pages=book_pages_subquery())
+    skip_locked = connection.features.has_select_for_update_skip_locked
+
+    last_id = 0
+    while True:
+        ids = list(open_rentals.filter(id__gt=last_id).values_list("id", flat=True)[:chunk_size])
+        if not ids:
+            break
+        last_id = ids[-1]
+
+        with transaction.atomic():
+            locked = Rental.objects.filter(id__in=ids)
+            if skip_locked:
+                locked = locked.select_for_update(skip_locked=True)
+            locked_ids = list(locked.values_list("id", flat=True))
+
+            stale_rows = list(
+                Rental.objects.filter(id__in=locked_ids)
+                .exclude(status="returned")
+                .filter(_stale_filter(today, fee))
+                .values_list("id", "user_id")
+            )
+            stale_ids = [rental_id for rental_id, _ in stale_rows]
+            if stale_ids and not dry_run:
+                stale = Rental.objects.filter(id__in=stale_ids)
+                before = snapshot(stale, today)
+                stale.update(status=rental_status_expression(today), total_fee=fee, updated_at=timezone.now())
+                apply_snapshot_diff(before, snapshot(stale, today))
+                invalidate_rentals({user_id for _, user_id in stale_rows})
+
+        stats["checked"] += len(ids)
+        stats["skipped_locked"] += len(ids) - len(locked_ids)
+        stats["changed"] += len(stale_ids)
+        stats["seconds"] = time.monotonic() - started
+        if progress:
+            progress(stats)
+        if pause:
+            time.sleep(pause)
+
+    stats["seconds"] = time.monotonic() - started
+    if stats["changed"] and not dry_run:
+        # One event for the whole run rather than one per row
+        publish([{"type": "rentals.refreshed", "changed": stats["changed"], "at": timezone.now().isoformat()}])
+    return stats
@@ -0,0 +1,193 @@
+from datetime import timedelta
+
+import requests
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, UnidentifiedImageError
+
+from book.autocomplete import publish_catalog_change
+from book.covers import MAX_COVER_BYTES, store_cover
+from book.models import Book, Rental, RentalTombstone
+from book.openlibrary import OpenLibraryUnavailable, covers_client
+from book.response_cache import invalidate_books
+from book.student_import import run_import_chunk
+from book.summary import refresh_overdue
+from book.sweep import sweep_open_rentals
+from book.utils import fetch_book_from_openlibrary
+
+
+def recalculate_book_rentals(book, rental_ids=None):
+    """
+    Recompute status/fee for every rental of a book (or only `rental_ids`
+    of them), e.g. once its page count is known. Goes through Rental.save()
+    so all save-time bookkeeping runs.
+    """
+    rentals = Rental.objects.select_for_update().filter(book=book).select_related("book")
+    if rental_ids is not None:
+        rentals = rentals.filter(id__in=rental_ids)
+    for rental in rentals:
+        if rental.status == "returned":
+            # update_status() leaves returned rentals alone; fee still depends on pages
+            rental.total_fee = rental._calculate_fee(rental.end_date)
+        rental.save(update_fields=["status", "total_fee"])
+
+
+@shared_task(bind=True, max_retries=5, ignore_result=True)
+def enrich_book(self, book_id):
+    """
+    Fill in a placeholder Book (author, pages, cover, ...) from OpenLibrary,
+    then recompute fees of its rentals now that `pages` is known. Rentals of
+    a title OpenLibrary doesn't know are voided (deleted).
+    The OpenLibrary call runs outside any transaction.
+    """
+    book = Book.objects.filter(id=book_id, enrichment_status="pending").first()
+    if not book:
+        return
+
+    try:
+        book_info = fetch_book_from_openlibrary(book.title)
+    except OpenLibraryUnavailable as e:
+        if self.request.retries >= self.max_retries:
+            Book.objects.filter(id=book_id).update(enrichment_status="failed", updated_at=timezone.now())
+            return
+        countdown = max(e.retry_after or 0, 30 * (2 ** self.request.retries))
+        raise self.retry(exc=e, countdown=countdown)
+
+    with transaction.atomic():
+        book = Book.objects.select_for_update().filter(id=book_id, enrichment_status="pending").first()
+        if not book:
+            return
+
+        if not book_info:
+            # The rental was only accepted because OpenLibrary couldn't be
+            # asked at the time (CreateRentalView answers 404 for unknown
+            # titles otherwise). The title doesn't exist: void its rentals,
+            # which reports them to clients as deleted (events, delta sync).
+            book.enrichment_status = "not_found"
+            book.save(update_fields=["enrichment_status"])
+            rentals = list(Rental.objects.select_for_update().filter(book=book))
+            for rental in rentals:
+                rental.delete()
+            print(f"Book {book_id} ({book.title!r}) not found in OpenLibrary; voided {len(rentals)} rental(s)")
+            return
+
+        existing = None
+        moved_ids = None
+        if book_info["olid"]:
+            existing = Book.objects.filter(olid=book_info["olid"]).exclude(id=book.id).first()
+
+        if existing:
+            # The work is already in the catalog under another title: move the
+            # placeholder's rentals over and drop the placeholder. Only those
+            # need new fees; the existing book's rentals are already right.
+            moved_ids = list(Rental.objects.filter(book=book).values_list("id", flat=True))
+            Rental.objects.filter(id__in=moved_ids).update(book=existing, updated_at=timezone.now())
+            book.delete()
+            book = existing
+        else:
+            book.title = book_info["title"][:255]
+            book.author = book_info["author"]
+            book.pages = book_info["pages"]
+            book.cover_url = book_info["cover_url"]
+            book.olid = book_info["olid"]
+            book.first_publish_year = book_info["first_publish_year"]
+            book.enrichment_status = "enriched"
+            book.save()
+
+        recalculate_book_rentals(book, moved_ids)
+
+    if book.cover_url and not book.cover_hash:
+        cache_book_cover.delay(book.id)
+
+
+@shared_task(ignore_result=True)
+def enrich_pending_books():
+    """
+    Re-queue placeholder books still pending (e.g. the broker was down when
+    the rental was created). enrich_book skips books that are no longer pending.
+    """
+    pending = Book.objects.filter(enrichment_status="pending").values_list("id", flat=True)
+    for book_id in pending.iterator():
+        enrich_book.delay(book_id)
+
+
+@shared_task(bind=True, max_retries=3, ignore_result=True)
+def cache_book_cover(self, book_id):
+    """
+    Download a book's cover once and store local thumbnails for it
+    (book/covers.py). Books sharing an image share one stored copy.
+    """
+    book = Book.objects.filter(id=book_id, cover_hash__isnull=True).exclude(cover_url__isnull=True).first()
+    if not book or not book.cover_url:
+        return
+
+    try:
+        response = covers_client.get(book.cover_url, stream=True)
+        image_bytes = response.raw.read(MAX_COVER_BYTES + 1, decode_content=True)
+        response.close()
+    except OpenLibraryUnavailable as e:
+        raise self.retry(exc=e, countdown=max(e.retry_after or 0, 60 * (2 ** self.request.retries)))
+    except requests.HTTPError as e:
+        print(f"Cover not available for book {book_id}:", e)
+        return
+
+    if len(image_bytes) > MAX_COVER_BYTES:
+        print(f"Cover too large for book {book_id}, skipping")
+        return
+
+    try:
+        cover_hash = store_cover(image_bytes)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        # Lists keep showing the OpenLibrary cover_url
+        print(f"Invalid cover image for book {book_id}:", e)
+        return
+
+    Book.objects.filter(id=book_id).update(cover_hash=cover_hash, updated_at=timezone.now())
+    Rental.objects.filter(book_id=book_id).touch()
+    # Rental lists and autocomplete show the cover thumbnail URL
+    invalidate_books()
+    publish_catalog_change([book_id])
+
+
+@shared_task(ignore_result=True)
+def cache_missing_covers(batch_size=500):
+    """Queue cover caching for books that have a remote cover but no local copy."""
+    missing = (
+        Book.objects.filter(cover_hash__isnull=True, cover_url__isnull=False)
+        .exclude(cover_url="")
+        .values_list("id", flat=True)[:batch_size]
+    )
+    for book_id in missing:
+        cache_book_cover.delay(book_id)
+
+
+@shared_task(ignore_result=True)
+def refresh_rental_summary_overdue():
+    """Recount overdue rentals in RentalSummary; they change with the date, not only on writes."""
+    refresh_overdue()
+
+
+@shared_task(ignore_result=True)
+def sweep_rentals(chunk_size=5000):
+    """Nightly: bring status/total_fee of untouched open rentals up to date."""
+    stats = sweep_open_rentals(chunk_size=chunk_size)
+    print("Rental sweep:", stats)
+
+
+@shared_task(ignore_result=True)
+def purge_rental_tombstones():
+    """Drop tombstones past CHANGES_TOMBSTONE_DAYS; sync tokens that old are rejected anyway."""
+    cutoff = timezone.now() - timedelta(days=settings.CHANGES_TOMBSTONE_DAYS)
+    RentalTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+
+
+@shared_task(ignore_result=True)
+def import_student_chunk(chunk_id):
+    """
+    Hash and insert one chunk of a CSV student import. Only the
+    StudentImportChunk's id is queued: its rows carry the passwords given
+    in the file.
+    """
+    run_import_chunk(chunk_id)
@@ -1,3 +1,2187 @@
-from django.test import TestCase
+import asyncio
+import base64
+import contextlib
+import csv
+import io
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+import httpx
+import redis
+import requests
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
+from django.db import OperationalError, connection
+from django.db.models import F, Sum
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from PIL import Image
+
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+
+from book import autocomplete, bulk, events, search, singleflight, summary
+from book.autocomplete import Catalog, PrefixIndex, publish_catalog_change
+from book.cache import TieredCache
+from book.changes import encode_token
+from book import authentication
+from book.authentication import CachedJWTAuthentication, VersionedRefreshToken, invalidate_principal
+from book.expressions import (
+    book_pages_subquery,
+    rental_fee_expression,
+    rental_status_expression,
+)
+from book.forecast import EPOCH, fee_cents_at, forecast, load_open_rentals
+from book.bulk import create_rentals, extend_rentals, return_rentals
+from book.models import Book, Rental, RentalSummary, RentalTombstone, Student, StudentImport, StudentImportChunk, User
+from book.response_cache import ResponseCache, response_cache
+from book.covers import store_cover
+from book.events import RentalEventHub
+from book.search import ensure_sqlite_search_triggers
+from book.singleflight import SingleFlight
+from book.sweep import sweep_open_rentals
+from book.tasks import cache_book_cover, enrich_book
+from book.views import event_views, export_views
+from book.student_import import StudentImporter, prepare_import, run_import_chunk
+
+from book.management.commands.import_openlibrary_dump import (
+    AuthorNames,
+    map_author,
+    map_record,
+    resolve_authors,
+)
+from book.openlibrary import (
+    AsyncOpenLibraryClient,
+    CircuitBreaker,
+    OpenLibraryClient,
+    OpenLibraryUnavailable,
+    RetryBudget,
+)
+
+
+# A working shared cache in process memory, for tests that need one
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests-default"},
+    "local": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests-local"},
+    "local-principal": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests-principal"},
+}
+
+
+# ---------------------- OpenLibrary client ----------------------
+
+class FakeResponse(requests.Response):
+    def __init__(self, status_code):
+        super().__init__()
+        self.status_code = status_code
+        self.url = "http://openlibrary.test/search.json"
+        self.reason = "test"
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    """Returns the given responses (or raises the given exceptions) in order."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def get(self, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+        for _ in range(2):
+            breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow_request())
+
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow_request())
+        self.assertGreater(breaker.retry_after(), 0)
+
+    def test_success_resets_the_failure_count(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_allows_a_single_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.allow_request())
+        self.assertFalse(breaker.allow_request())
+
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow_request())
+
+    def test_failed_trial_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=5, reset_timeout=60)
+        for _ in range(5):
+            breaker.record_failure()
+        breaker.reset_timeout = 0
+        self.assertTrue(breaker.allow_request())
+        breaker.reset_timeout = 60
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow_request())
+
+
+class RetryBudgetTests(SimpleTestCase):
+
+    def test_reserve_caps_retries(self):
+        budget = RetryBudget(ratio=0.5, reserve=2)
+        self.assertTrue(budget.withdraw())
+        self.assertTrue(budget.withdraw())
+        self.assertFalse(budget.withdraw())
+
+    def test_deposits_refill_by_ratio(self):
+        budget = RetryBudget(ratio=0.5, reserve=2)
+        budget.withdraw()
+        budget.withdraw()
+        budget.deposit()
+        self.assertFalse(budget.withdraw())
+        budget.deposit()
+        self.assertTrue(budget.withdraw())
+
+    def test_deposits_never_exceed_reserve(self):
+        budget = RetryBudget(ratio=1, reserve=2)
+        for _ in range(10):
+            budget.deposit()
+        self.assertEqual(budget.tokens, 2)
+
+
+@mock.patch("book.openlibrary.backoff_delay", return_value=0)
+class OpenLibraryClientTests(SimpleTestCase):
+
+    def make_client(self, *outcomes, max_retries=2, failure_threshold=5, budget=None):
+        client = OpenLibraryClient(
+            base_url="http://openlibrary.test",
+            max_retries=max_retries,
+            breaker=CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=60),
+            retry_budget=budget or RetryBudget(),
+        )
+        client._session = FakeSession(*outcomes)
+        return client
+
+    def test_retries_retryable_status_and_closes_dropped_responses(self, _):
+        dropped, ok = FakeResponse(503), FakeResponse(200)
+        client = self.make_client(dropped, ok)
+        self.assertIs(client.get("/search.json"), ok)
+        self.assertTrue(dropped.closed)
+        self.assertFalse(ok.closed)
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_non_retryable_5xx_counts_as_failure(self, _):
+        response = FakeResponse(501)
+        client = self.make_client(response, failure_threshold=1)
+        with self.assertRaises(OpenLibraryUnavailable):
+            client.get("/search.json")
+        self.assertEqual(client._session.calls, 1)
+        self.assertTrue(response.closed)
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+
+    def test_client_error_is_raised_without_tripping_the_breaker(self, _):
+        client = self.make_client(FakeResponse(404), failure_threshold=1)
+        with self.assertRaises(requests.HTTPError):
+            client.get("/search.json")
+        self.assertEqual(client._session.calls, 1)
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_retries_stop_when_the_budget_is_spent(self, _):
+        client = self.make_client(
+            requests.ConnectionError("down"), requests.ConnectionError("down"),
+            max_retries=5, budget=RetryBudget(ratio=0, reserve=1),
+        )
+        with self.assertRaises(OpenLibraryUnavailable):
+            client.get("/search.json")
+        self.assertEqual(client._session.calls, 2)
+
+    def test_exhausted_retries_trip_the_breaker(self, _):
+        client = self.make_client(*[FakeResponse(503) for _ in range(3)], failure_threshold=1)
+        with self.assertRaises(OpenLibraryUnavailable):
+            client.get("/search.json")
+        self.assertEqual(client._session.calls, 3)
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(OpenLibraryUnavailable):
+            client.get("/search.json")
+        self.assertEqual(client._session.calls, 3)
+
+
+class AsyncOpenLibraryClientTests(SimpleTestCase):
+
+    def make_client(self, handler):
+        sync_client = OpenLibraryClient(
+            base_url="http://openlibrary.test",
+            max_retries=0,
+            breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0),
+        )
+        async_client = AsyncOpenLibraryClient(sync_client)
+        self.opened = []
+
+        def new_client():
+            client = httpx.AsyncClient(base_url=sync_client.base_url, transport=httpx.MockTransport(handler))
+            self.opened.append(client)
+            return client
+
+        async_client._new_client = new_client
+        return async_client
+
+    def test_cancelled_trial_is_released(self):
+        async def hang(request):
+            await asyncio.sleep(60)
+
+        client = self.make_client(hang)
+        client.breaker.record_failure()
+
+        async def cancel_trial():
+            task = asyncio.ensure_future(client.get("/search.json"))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancel_trial())
+        self.assertEqual(client.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(client.breaker.allow_request())
+
+    def test_client_is_closed_per_call_outside_asgi(self):
+        client = self.make_client(lambda request: httpx.Response(200, json={"docs": []}))
+        self.assertEqual(asyncio.run(client.search("Dune")), {"docs": []})
+        self.assertEqual(len(self.opened), 1)
+        self.assertTrue(self.opened[0].is_closed)
+        self.assertEqual(len(client._clients), 0)
+
+
+# ---------------------- Rental summaries ----------------------
+
+def make_student(name):
+    user = User.objects.create(username=name, email=f"{name}@example.com")
+    return Student.objects.create(user=user, student_name=name, email=user.email)
+
+
+def make_rental(student, book, started_days_ago=0, end_in_days=None):
+    """A rental through Rental.save(), as the views create them."""
+    rental = Rental.objects.create(user=student.user, book=book)
+    today = timezone.now().date()
+    if started_days_ago:
+        rental.start_date = today - timedelta(days=started_days_ago)
+    if end_in_days is not None:
+        rental.end_date = today + timedelta(days=end_in_days)
+    if started_days_ago or end_in_days is not None:
+        rental.save()
+    return rental
+
+
+class RentalSummaryTests(TestCase):
+
+    def setUp(self):
+        self.book = Book.objects.create(title="Dune", pages=412)
+        self.placeholder = Book.objects.create(title="Unknown", pages=0, enrichment_status="pending")
+        self.students = [make_student(name) for name in ("ana", "ben", "cai")]
+
+    def assertSummaryMatchesRebuild(self):
+        self.assertEqual(summary.rebuild(), {})
+
+    def test_mixed_writes_keep_the_summary_exact(self):
+        ana, ben, cai = self.students
+        overdue = make_rental(ana, self.book, started_days_ago=45)
+        open_rental = make_rental(ana, self.placeholder)
+        late = make_rental(ben, self.book, started_days_ago=90, end_in_days=-10)
+        extended = make_rental(ben, self.book, started_days_ago=20, end_in_days=40)
+        doomed = make_rental(cai, self.book, started_days_ago=60)
+        self.assertSummaryMatchesRebuild()
+
+        overdue.extend_rental(2)
+        open_rental.mark_returned()
+        late.mark_returned()
+        extended.book = self.placeholder
+        extended.save()
+        doomed.delete()
+        self.assertSummaryMatchesRebuild()
+
+        results = create_rentals(
+            [{"student_id": student.id, "title": title} for student in self.students for title in ("Dune", "Unknown")]
+        )
+        self.assertTrue(all(result["status"] == "created" for result in results))
+        created_ids = [result["rental_id"] for result in results]
+        # Backdate some with a raw update (bypassing the summary), then resync
+        Rental.objects.filter(id__in=created_ids[:3]).update(
+            start_date=timezone.now().date() - timedelta(days=50)
+        )
+        summary.rebuild()
+
+        extend_rentals(created_ids[:4], months=1)
+        self.assertSummaryMatchesRebuild()
+        return_rentals(created_ids[2:])
+        self.assertSummaryMatchesRebuild()
+
+    def test_overdue_never_goes_below_zero(self):
+        ana, ben, cai = self.students
+        rentals = [make_rental(student, self.book, started_days_ago=45) for student in self.students]
+        # As if the rentals fell due after the last refresh_overdue()
+        RentalSummary.objects.update(overdue=0)
+
+        rentals[0].mark_returned()
+        return_rentals([rental.id for rental in rentals[1:]])
+
+        self.assertEqual(set(RentalSummary.objects.values_list("overdue", flat=True)), {0})
+
+    def test_refresh_overdue_counts_rentals_fallen_due(self):
+        ana, ben, _ = self.students
+        for student in (ana, ana, ben):
+            make_rental(student, self.book, started_days_ago=45)
+        make_rental(ben, self.book, started_days_ago=10)
+        RentalSummary.objects.update(overdue=0)
+
+        # Global, ana's and ben's rows
+        self.assertEqual(summary.refresh_overdue(), 3)
+        self.assertSummaryMatchesRebuild()
+        self.assertEqual(summary.refresh_overdue(), 0)
+
+    def test_summary_view_reads_one_row(self):
+        ana, ben, cai = self.students
+        make_rental(ana, self.book, started_days_ago=45)
+        make_rental(ana, self.placeholder).mark_returned()
+        make_rental(ben, self.book, started_days_ago=10)
+
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/rentals/summary/")
+        self.assertEqual(response.status_code, 200)
+        totals = response.json()
+        self.assertEqual(
+            (totals["total_rentals"], totals["active"], totals["returned"], totals["overdue"]),
+            (3, 2, 1, 1),
+        )
+
+        with self.assertNumQueries(1):
+            totals = self.client.get("/api/rentals/summary/", {"student": ana.id}).json()
+        self.assertEqual((totals["student"], totals["total_rentals"], totals["overdue"]), (ana.id, 2, 1))
+        fees = Rental.objects.filter(user=ana.user).aggregate(total=Sum("total_fee"))["total"]
+        self.assertEqual(totals["total_fees_collected"], f"${fees:.2f}")
+
+        # A student without rentals has no row yet
+        totals = self.client.get("/api/rentals/summary/", {"student": cai.id}).json()
+        self.assertEqual((totals["total_rentals"], totals["updated_at"]), (0, None))
+        self.assertEqual(self.client.get("/api/rentals/summary/", {"student": "cai"}).status_code, 400)
+
+
+# ---------------------- Rental sweep ----------------------
+
+class SweepOpenRentalsTests(TestCase):
+
+    def setUp(self):
+        student = make_student("al")
+        self.book = Book.objects.create(title="Dune", pages=412)
+        self.rentals = [
+            make_rental(student, self.book),
+            make_rental(student, self.book, started_days_ago=25),
+            make_rental(student, self.book, started_days_ago=40),
+            make_rental(student, self.book, started_days_ago=20, end_in_days=15),
+            make_rental(student, self.book, started_days_ago=90, end_in_days=-10),
+        ]
+        self.later = timezone.now() + timedelta(days=20)
+
+    def expected(self):
+        """What Rental.update_status() would store if each rental were saved 20 days from now."""
+        expected = {}
+        with mock.patch("django.utils.timezone.now", return_value=self.later):
+            for rental in Rental.objects.select_related("book"):
+                rental.update_status()
+                expected[rental.id] = (rental.status, rental.total_fee)
+        return expected
+
+    def stored(self):
+        return {rental.id: (rental.status, rental.total_fee) for rental in Rental.objects.all()}
+
+    def test_sweep_matches_update_status(self):
+        expected = self.expected()
+        before = self.stored()
+        stats = sweep_open_rentals(chunk_size=2, today=self.later.date())
+        self.assertEqual(self.stored(), expected)
+        self.assertEqual(stats["checked"], 4)
+        self.assertEqual(stats["changed"], sum(before[rental_id] != expected[rental_id] for rental_id in expected))
+        self.assertGreater(stats["changed"], 0)
+
+        # Nothing left to change
+        self.assertEqual(sweep_open_rentals(today=self.later.date())["changed"], 0)
+
+    def test_dry_run_only_counts(self):
+        before = self.stored()
+        stats = sweep_open_rentals(dry_run=True, today=self.later.date())
+        self.assertGreater(stats["changed"], 0)
+        self.assertEqual(self.stored(), before)
+
+    def test_command_reports_progress(self):
+        out = io.StringIO()
+        call_command("sweep_rentals", "--chunk-size", "2", "--dry-run", stdout=out)
+        self.assertIn("checked 2,", out.getvalue())
+        self.assertIn("Would update 0 of 4 open rentals", out.getvalue())
+
+
+# ---------------------- Fee expressions ----------------------
+
+def insert_rentals(user, specs):
+    """
+    Insert rentals exactly as given by (book, start_date, end_date, status),
+    without save()'s recomputation; returned ones get their final fee.
+    """
+    rentals = []
+    for book, start_date, end_date, rental_status in specs:
+        rental = Rental(user=user, book=book, start_date=start_date, end_date=end_date, status=rental_status)
+        rental.due_date = end_date or start_date + timedelta(days=30)
+        rental.total_fee = rental._calculate_fee(end_date) if rental_status == "returned" else Decimal("0.00")
+        rentals.append(rental)
+    start_dates = [rental.start_date for rental in rentals]
+    Rental.objects.bulk_create(rentals)
+    # bulk_create applies auto_now_add (to the instances too); put the intended start dates back
+    for rental, start_date in zip(rentals, start_dates):
+        rental.start_date = start_date
+        Rental.objects.filter(pk=rental.pk).update(start_date=start_date)
+    return rentals
+
+
+class RentalFeeExpressionTests(TestCase):
+    """The SQL fee/status rules (book/expressions.py) against the Python ones on Rental."""
+
+    # Days from start_date to end_date (or to today when None), around the
+    # 30-day free month and the month boundaries after it
+    SPANS = [0, 1, 29, 30, 31, 59, 60, 61, 89, 90, 91, 365]
+
+    def setUp(self):
+        self.today = timezone.now().date()
+        self.user = User.objects.create(username="fees", email="fees@example.com")
+        self.books = [Book.objects.create(title=f"{pages} pages", pages=pages) for pages in (0, 1, 333, 412)]
+
+        cases = []
+        for book in self.books:
+            for span in self.SPANS:
+                # open, no end date: fee runs to today (overdue past 30 days)
+                cases.append((book, span, None, "active"))
+                # open with an end date in the future or past
+                cases.append((book, span, span + 15, "extended"))
+                cases.append((book, span + 20, span, "extended"))
+                # returned: stored fee up to end_date
+                cases.append((book, span + 10, span, "returned"))
+
+        specs = []
+        for book, started_days_ago, end_days_after_start, rental_status in cases:
+            start_date = self.today - timedelta(days=started_days_ago)
+            end_date = None if end_days_after_start is None else start_date + timedelta(days=end_days_after_start)
+            specs.append((book, start_date, end_date, rental_status))
+        self.rentals = insert_rentals(self.user, specs)
+
+    def annotated(self):
+        return {
+            rental.id: rental
+            for rental in Rental.objects.with_fees(self.today).annotate(
+                fee=rental_fee_expression(self.today),
+                fee_for_update=rental_fee_expression(self.today, pages=book_pages_subquery()),
+                open_status=rental_status_expression(self.today),
+            )
+        }
+
+    def test_fee_matches_calculate_fee(self):
+        rows = self.annotated()
+        for rental in self.rentals:
+            expected = rental._calculate_fee()
+            row = rows[rental.id]
+            with self.subTest(start=rental.start_date, end=rental.end_date, pages=rental.book.pages):
+                self.assertEqual(row.fee, expected)
+                self.assertEqual(row.fee_for_update, expected)
+                self.assertEqual(row.current_fee, expected)
+
+    def test_monthly_fee_and_free_month(self):
+        rows = self.annotated()
+        for rental in self.rentals:
+            row = rows[rental.id]
+            self.assertEqual(row.monthly_fee, round(Decimal(rental.book.pages) / Decimal("100"), 2))
+            self.assertEqual(row.free_month_ends, rental.start_date + timedelta(days=30))
+
+    def test_status_matches_update_status(self):
+        rows = self.annotated()
+        for rental in self.rentals:
+            if rental.status == "returned":
+                continue
+            rental.status = "active"
+            rental.update_status()
+            with self.subTest(start=rental.start_date, end=rental.end_date):
+                self.assertEqual(rows[rental.id].open_status, rental.status)
+
+    def test_overdue_matches_python_rule(self):
+        rows = self.annotated()
+        for rental in self.rentals:
+            expected = summary.is_overdue(rental.status, rental.start_date, rental.end_date, self.today)
+            with self.subTest(start=rental.start_date, end=rental.end_date, status=rental.status):
+                self.assertEqual(rows[rental.id].is_overdue, expected)
+
+
+# ---------------------- Revenue forecast ----------------------
+
+class ForecastTests(TestCase):
+    """The vectorized forecast (book/forecast.py) against per-rental _calculate_fee()."""
+
+    def setUp(self):
+        self.today = date(2026, 1, 20)
+        user = User.objects.create(username="forecast", email="forecast@example.com")
+        books = [Book.objects.create(title=f"{pages} pages", pages=pages) for pages in (0, 1, 333, 412)]
+        specs = []
+        for book in books:
+            for started_days_ago in (0, 10, 29, 30, 31, 45, 60, 61, 200):
+                start_date = self.today - timedelta(days=started_days_ago)
+                specs.append((book, start_date, None, "active"))
+                specs.append((book, start_date, start_date + timedelta(days=95), "extended"))
+                specs.append((book, start_date, start_date + timedelta(days=20), "extended"))
+            specs.append((book, self.today - timedelta(days=90), self.today - timedelta(days=5), "returned"))
+        self.open_rentals = [rental for rental in insert_rentals(user, specs) if rental.status != "returned"]
+
+    def loop_fee_cents(self, day):
+        """What the forecast computes, one _calculate_fee() call per rental."""
+        fees = []
+        for rental in self.open_rentals:
+            end_date = max(rental.end_date or day, day)
+            fee = rental._calculate_fee(end_date)
+            # Whole cents: months * pages / 100 never needs rounding
+            self.assertEqual(fee, (fee * 100).to_integral_value() / 100)
+            fees.append(int(fee * 100))
+        return fees
+
+    def test_loaded_arrays(self):
+        start_day, end_day, pages = load_open_rentals(chunk_size=7)
+        self.assertEqual(start_day.size, len(self.open_rentals))
+        self.assertEqual(
+            sorted(zip(start_day.tolist(), end_day.tolist(), pages.tolist())),
+            sorted(
+                (
+                    (rental.start_date - EPOCH).days,
+                    (rental.end_date - EPOCH).days if rental.end_date else -1,
+                    rental.book.pages,
+                )
+                for rental in self.open_rentals
+            ),
+        )
+
+    def test_fee_cents_match_calculate_fee(self):
+        start_day, end_day, pages = load_open_rentals()
+        order = sorted(
+            range(len(self.open_rentals)),
+            key=lambda i: (
+                (self.open_rentals[i].start_date - EPOCH).days,
+                (self.open_rentals[i].end_date - EPOCH).days if self.open_rentals[i].end_date else -1,
+                self.open_rentals[i].book.pages,
+            ),
+        )
+        loaded_order = sorted(range(start_day.size), key=lambda i: (start_day[i], end_day[i], pages[i]))
+        for offset in (0, 1, 15, 30, 31, 100, 400):
+            day = self.today + timedelta(days=offset)
+            expected = self.loop_fee_cents(day)
+            cents = fee_cents_at((day - EPOCH).days, start_day, end_day, pages)
+            self.assertEqual([int(cents[i]) for i in loaded_order], [expected[i] for i in order])
+
+    def test_forecast_matches_per_rental_loop(self):
+        result = forecast(months=4, as_of=self.today)
+        self.assertEqual(result["open_rentals"], len(self.open_rentals))
+
+        previous = self.loop_fee_cents(self.today)
+        self.assertEqual(result["current_fees_cents"], sum(previous))
+
+        cumulative = 0
+        month_ends = [date(2026, 1, 31), date(2026, 2, 28), date(2026, 3, 31), date(2026, 4, 30)]
+        self.assertEqual([month["period_end"] for month in result["months"]], month_ends)
+        for month, month_end in zip(result["months"], month_ends):
+            current = self.loop_fee_cents(month_end)
+            billed = sum(current) - sum(previous)
+            cumulative += billed
+            self.assertEqual(month["billed_cents"], billed)
+            self.assertEqual(month["cumulative_cents"], cumulative)
+            self.assertEqual(month["accruing_rentals"], sum(1 for a, b in zip(current, previous) if a != b))
+            previous = current
+
+
+# ---------------------- Delta sync ----------------------
+
+class RentalTouchTests(TestCase):
+    """Book/student/user saves touch their rentals only when a field the rental rows show changed."""
+
+    def setUp(self):
+        self.student = make_student("dora")
+        self.book = Book.objects.create(title="Dune", pages=400)
+        self.rental = make_rental(self.student, self.book)
+        self.stamp = timezone.now() - timedelta(days=1)
+        Rental.objects.filter(id=self.rental.id).update(updated_at=self.stamp)
+
+    def assertTouched(self, touched):
+        updated_at = Rental.objects.get(id=self.rental.id).updated_at
+        self.assertEqual(updated_at != self.stamp, touched)
+
+    def test_hidden_fields_do_not_touch(self):
+        book = Book.objects.get(id=self.book.id)
+        book.enrichment_status = "failed"
+        book.save()
+        user = User.objects.get(id=self.student.user_id)
+        user.last_login = timezone.now()
+        user.save(update_fields=["last_login"])
+        student = Student.objects.get(id=self.student.id)
+        student.save()
+        self.assertTouched(False)
+
+    def test_book_title_touches(self):
+        book = Book.objects.get(id=self.book.id)
+        book.title = "Dune Messiah"
+        book.save()
+        self.assertTouched(True)
+
+    def test_student_name_touches(self):
+        student = Student.objects.get(id=self.student.id)
+        student.student_name = "Dora M."
+        student.save(update_fields=["student_name"])
+        self.assertTouched(True)
+
+    def test_same_instance_saved_twice(self):
+        book = Book.objects.get(id=self.book.id)
+        book.pages = 500
+        book.save()
+        Rental.objects.filter(id=self.rental.id).update(updated_at=self.stamp)
+        book.save()
+        self.assertTouched(False)
+
+
+# ---------------------- Rental events ----------------------
+
+class RentalEventPublishingTests(TestCase):
+    """Every rental write publishes one event per rental, after commit."""
+
+    def setUp(self):
+        self.student = make_student("ed")
+        self.book = Book.objects.create(title="Dune", pages=400)
+
+    def published(self, write):
+        with mock.patch("book.events.publish") as publish, self.captureOnCommitCallbacks(execute=True):
+            write()
+            publish.assert_not_called()
+        return [event for call in publish.call_args_list for event in call.args[0]]
+
+    def test_single_rental_writes(self):
+        rental = Rental.objects.create(user=self.student.user, book=self.book)
+        rental_id = rental.id
+        for write, event_type in [
+            (lambda: Rental.objects.create(user=self.student.user, book=self.book), "rental.created"),
+            (rental.extend_rental, "rental.extended"),
+            (rental.mark_returned, "rental.returned"),
+            (rental.delete, "rental.deleted"),
+        ]:
+            with self.subTest(event_type=event_type):
+                [event] = self.published(write)
+                self.assertEqual(event["type"], event_type)
+                self.assertEqual((event["user_id"], event["book_id"]), (self.student.user_id, self.book.id))
+        self.assertEqual(event["rental_id"], rental_id)
+
+    def test_event_payload(self):
+        rental = make_rental(self.student, self.book, started_days_ago=10)
+        [event] = self.published(rental.extend_rental)
+        rental.refresh_from_db()
+        self.assertEqual(event, {
+            "type": "rental.extended",
+            "rental_id": rental.id,
+            "user_id": self.student.user_id,
+            "book_id": self.book.id,
+            "status": rental.status,
+            "end_date": rental.end_date.isoformat(),
+            "total_fee": str(rental.total_fee),
+            "at": event["at"],
+        })
+        json.dumps(event)
+
+    def test_bulk_writes(self):
+        other = Book.objects.create(title="Emma", pages=100)
+        items = [{"student_id": self.student.id, "title": title} for title in ("Dune", "Emma")]
+        created = self.published(lambda: create_rentals(items))
+        self.assertEqual([event["type"] for event in created], ["rental.created"] * 2)
+        self.assertEqual({event["book_id"] for event in created}, {self.book.id, other.id})
+
+        ids = [event["rental_id"] for event in created]
+        extended = self.published(lambda: extend_rentals(ids))
+        self.assertEqual(sorted((event["type"], event["rental_id"]) for event in extended),
+                         [("rental.extended", rental_id) for rental_id in sorted(ids)])
+        returned = self.published(lambda: return_rentals(ids))
+        self.assertEqual({event["type"] for event in returned}, {"rental.returned"})
+        self.assertEqual({event["status"] for event in returned}, {"returned"})
+        # Nothing left open to return
+        self.assertEqual(self.published(lambda: return_rentals(ids)), [])
+
+
+class PublishTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.multiple(events, _client=None, _down_until=0.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_one_round_trip(self):
+        client = mock.Mock()
+        with mock.patch("redis.Redis.from_url", return_value=client):
+            events.publish([{"type": "rental.created"}, {"type": "rental.deleted"}])
+        pipe = client.pipeline.return_value
+        self.assertEqual(
+            pipe.publish.call_args_list,
+            [mock.call(settings.RENTAL_EVENTS_CHANNEL, json.dumps({"type": t})) for t in ("rental.created", "rental.deleted")],
+        )
+        pipe.execute.assert_called_once()
+
+    def test_dropped_while_redis_is_down(self):
+        client = mock.Mock()
+        client.pipeline.return_value.execute.side_effect = redis.ConnectionError("down")
+        with mock.patch("redis.Redis.from_url", return_value=client):
+            events.publish([{"type": "rental.created"}])
+            # Backs off instead of waiting on Redis for every write
+            events.publish([{"type": "rental.created"}])
+        self.assertEqual(client.pipeline.call_count, 1)
+
+
+class RentalEventHubTests(SimpleTestCase):
+
+    def test_slow_client_gets_one_resync(self):
+        hub = RentalEventHub()
+        queue = asyncio.Queue(maxsize=2)
+        for rental_id in range(5):
+            hub._deliver({queue}, {"type": "rental.created", "rental_id": rental_id})
+        # The backlog is dropped, not delivered late
+        self.assertEqual([queue.get_nowait() for _ in range(queue.qsize())], [{"type": "resync"}])
+
+    def stream(self, user_id, queued, count):
+        """The first `count` chunks of the SSE stream for `user_id`, with `queued` events waiting."""
+        @contextlib.asynccontextmanager
+        async def subscribe():
+            queue = asyncio.Queue()
+            for event in queued:
+                queue.put_nowait(event)
+            yield queue
+
+        async def read():
+            stream = event_views._event_stream(user_id)
+            chunks = []
+            async for chunk in stream:
+                chunks.append(chunk)
+                if len(chunks) == count:
+                    break
+            await stream.aclose()
+            return chunks
+
+        with mock.patch.object(event_views.rental_event_hub, "subscribe", subscribe):
+            return async_to_sync(read)()
+
+    def test_stream_filters_by_student(self):
+        queued = [
+            {"type": "rental.created", "user_id": 2},
+            {"type": "rental.created", "user_id": 1},
+            {"type": "rentals.refreshed", "changed": 3},
+            {"type": "resync"},
+        ]
+        chunks = self.stream(1, queued, 4)
+        self.assertEqual(chunks[0], f"retry: {event_views.RECONNECT_MS}\n\n")
+        self.assertEqual(chunks[1:], [event_views._sse(event) for event in queued[1:]])
+        self.assertEqual(chunks[1], f'event: rental.created\ndata: {json.dumps(queued[1])}\n\n')
+        self.assertEqual(self.stream(None, queued, 5)[1:], [event_views._sse(event) for event in queued])
+
+    @override_settings(SSE_HEARTBEAT_SECONDS=0.01)
+    def test_idle_stream_sends_keepalives(self):
+        self.assertEqual(self.stream(None, [], 3)[1:], [": keepalive\n\n"] * 2)
+
+
+class RentalEventsViewTests(TestCase):
+
+    def test_unavailable_without_asgi(self):
+        # The test Client goes through the WSGI handler
+        response = self.client.get("/api/rentals/events/")
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.streaming)
+
+    async def test_rejects_unknown_students(self):
+        # The AsyncClient goes through the ASGI handler
+        response = await self.async_client.get("/api/rentals/events/", {"student": "ed"})
+        self.assertEqual(response.status_code, 400)
+        response = await self.async_client.get("/api/rentals/events/", {"student": "999"})
+        self.assertEqual(response.status_code, 404)
+
+
+# ---------------------- JWT authentication ----------------------
+
+class TokenVersionTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="ada@example.com", username="ada", password="first-pass")
+        # Cache invalidation runs on commit, which TestCase never reaches
+        invalidate_principal(self.user.id)
+
+    def authenticate(self, token):
+        request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        return CachedJWTAuthentication().authenticate(request)
+
+    def access_token(self, user):
+        return VersionedRefreshToken.for_user(user).access_token
+
+    def test_token_authenticates(self):
+        user, _ = self.authenticate(self.access_token(self.user))
+        self.assertEqual(user.id, self.user.id)
+
+    def test_missing_token_is_anonymous(self):
+        self.assertIsNone(self.authenticate("null"))
+
+    def test_new_password_revokes_tokens(self):
+        token = self.access_token(self.user)
+        self.user.set_password("second-pass")
+        self.user.save()
+        invalidate_principal(self.user.id)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+        user, _ = self.authenticate(self.access_token(self.user))
+        self.assertEqual(user.id, self.user.id)
+
+    def test_revoked_token_is_rejected_with_401(self):
+        token = self.access_token(self.user)
+        self.user.revoke_tokens()
+        invalidate_principal(self.user.id)
+        response = self.client.get("/api/student/list/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(PASSWORD_HASHERS=[
+        "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+        "django.contrib.auth.hashers.MD5PasswordHasher",
+    ])
+    def test_hash_upgrade_keeps_tokens(self):
+        # An outdated hash is rehashed on login with save(update_fields=["password"]);
+        # the password is the same, so tokens on other devices stay valid
+        token = self.access_token(self.user)
+        User.objects.filter(id=self.user.id).update(password=make_password("first-pass", hasher="md5"))
+        user = authenticate(email="ada@example.com", password="first-pass")
+        self.assertTrue(user.password.startswith("pbkdf2_"))
+        self.assertEqual(user.token_version, self.user.token_version)
+        self.assertEqual(User.objects.get(id=user.id).token_version, self.user.token_version)
+        invalidate_principal(user.id)
+        authenticated, _ = self.authenticate(token)
+        self.assertEqual(authenticated.id, user.id)
+
+    def test_set_password_with_update_fields_saves_token_version(self):
+        self.user.set_password("second-pass")
+        self.user.save(update_fields=["password"])
+        self.assertEqual(User.objects.get(id=self.user.id).token_version, 1)
+
+    def test_revocation_racing_a_cache_miss_is_not_cached_over(self):
+        token = self.access_token(self.user)
+        cache_set = authentication.principal_cache.set
+
+        def set_after_revocation(user_id, fields, ttl):
+            # The revocation commits (and invalidates) after the miss read the row
+            User.objects.filter(id=user_id).update(token_version=F("token_version") + 1)
+            invalidate_principal(user_id)
+            cache_set(user_id, fields, ttl)
+
+        with mock.patch.object(authentication.principal_cache, "set", side_effect=set_after_revocation):
+            with self.assertRaises(AuthenticationFailed):
+                self.authenticate(token)
+        self.assertEqual(authentication.principal_cache.get(self.user.id), (False, None))
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+
+# ---------------------- Student import ----------------------
+
+class StudentImportTests(TestCase):
+
+    def rows(self, *emails):
+        return [(line, email.split("@")[0], email, None) for line, email in enumerate(emails, start=2)]
+
+    def test_conflicting_row_is_skipped_alone(self):
+        User.objects.create(username="bo", email="bo@example.com")
+        result = {"created": 0, "skipped": 0, "errors": []}
+        # As if "bo" registered between the existence check and the insert
+        with mock.patch("book.student_import.User.objects.filter") as taken:
+            taken.return_value.values_list.return_value = []
+            StudentImporter(workers=1).insert_rows(
+                self.rows("al@example.com", "bo@example.com", "cy@example.com"), result
+            )
+
+        self.assertEqual((result["created"], result["skipped"]), (2, 1))
+        self.assertEqual([error["email"] for error in result["errors"]], ["bo@example.com"])
+        self.assertEqual(
+            set(Student.objects.values_list("email", flat=True)), {"al@example.com", "cy@example.com"}
+        )
+
+    def test_chunks_add_up_on_the_import(self):
+        User.objects.create(username="taken", email="taken@example.com")
+        rows = self.rows("a@example.com", "b@example.com", "taken@example.com", "not-an-email", "a@example.com")
+        student_import, chunk_ids = prepare_import(rows, chunk_size=2)
+        self.assertEqual((student_import.chunks_total, student_import.skipped), (2, 2))
+
+        for chunk_id in chunk_ids:
+            self.assertIsNone(StudentImport.objects.get(pk=student_import.pk).finished_at)
+            run_import_chunk(chunk_id)
+        # A redelivered task finds its chunk gone and counts nothing twice
+        run_import_chunk(chunk_ids[0])
+
+        student_import.refresh_from_db()
+        self.assertEqual(student_import.status, "done")
+        self.assertEqual((student_import.created, student_import.skipped), (2, 3))
+        self.assertEqual(len(student_import.errors), 3)
+        self.assertFalse(StudentImportChunk.objects.exists())
+
+    def test_passwords_stay_out_of_the_task_queue(self):
+        upload = SimpleUploadedFile(
+            "students.csv", b"student_name,email,password\nAl,al@example.com,s3cret-pass\n", content_type="text/csv"
+        )
+        with mock.patch("book.views.auth_views.import_student_chunk.delay") as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/students/bulk-import/", {"file": upload})
+        self.assertEqual(response.status_code, 202)
+        self.assertNotIn("s3cret-pass", json.dumps(delay.call_args.args))
+
+        run_import_chunk(*delay.call_args.args)
+        self.assertTrue(User.objects.get(email="al@example.com").check_password("s3cret-pass"))
+        self.assertFalse(StudentImportChunk.objects.exists())
+
+
+# ---------------------- Autocomplete ----------------------
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PrefixIndexTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(autocomplete, "_shared_down_until", 0.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.dune = Book.objects.create(title="Dune", author="Frank Herbert", pages=400)
+        self.messiah = Book.objects.create(title="Dune Messiah", author="Frank Herbert", pages=300)
+        self.potter = Book.objects.create(title="Harry Potter", author="J. K. Rowling", pages=300)
+        student = make_student("ana")
+        for _ in range(2):
+            make_rental(student, self.messiah)
+        self.index = PrefixIndex()
+        # Loads run in the test's thread, not in the background
+        start = mock.patch.object(self.index, "_start", side_effect=lambda job, *args: job(*args))
+        start.start()
+        self.addCleanup(start.stop)
+
+    def test_not_loaded_yet(self):
+        with mock.patch.object(self.index, "_start") as start, self.assertNumQueries(0):
+            self.assertIsNone(self.index.suggest("du"))
+        start.assert_called_once_with(self.index.rebuild)
+
+    def test_suggest_ranks_by_popularity_without_queries(self):
+        self.index.rebuild()
+        with self.assertNumQueries(0):
+            results = self.index.suggest("DÚ")
+        self.assertEqual([book["id"] for book in results], [self.messiah.id, self.dune.id])
+        self.assertEqual(results[0]["popularity"], 2)
+        # Word starts inside titles match too
+        self.assertEqual([book["id"] for book in self.index.suggest("pott")], [self.potter.id])
+
+    def test_other_process_changes_are_caught_up(self):
+        self.index.rebuild()
+        # Another process renames one book and deletes another
+        Book.objects.filter(id=self.potter.id).update(title="Harry Potter and the Goblet of Fire")
+        Book.objects.filter(id=self.dune.id).delete()
+        publish_catalog_change([self.potter.id])
+        publish_catalog_change([self.dune.id])
+
+        with mock.patch.object(self.index, "rebuild") as rebuild:
+            self.index._checked_at = 0
+            self.index.suggest("du")
+        rebuild.assert_not_called()
+        self.assertEqual([book["id"] for book in self.index.suggest("du")], [self.messiah.id])
+        self.assertEqual(self.index.suggest("goblet")[0]["id"], self.potter.id)
+
+    def test_expired_change_log_rebuilds(self):
+        self.index.rebuild()
+        publish_catalog_change([self.potter.id])
+        publish_catalog_change()
+        with mock.patch.object(self.index, "rebuild") as rebuild:
+            self.index._checked_at = 0
+            self.index.suggest("du")
+        rebuild.assert_called_once_with()
+
+    def test_local_changes_during_rebuild_are_kept(self):
+        original_load = Catalog.load
+
+        def load(rows):
+            # A save commits in this process while the rebuild is loading
+            self.potter.title = "Goblet of Fire"
+            self.index.add_or_update_book(self.potter)
+            return original_load(rows)
+
+        with mock.patch.object(Catalog, "load", side_effect=load):
+            self.index.rebuild()
+        self.assertEqual(self.index.suggest("goblet")[0]["id"], self.potter.id)
+        self.assertEqual(self.index.suggest("harry"), [])
+
+
+class CatalogTopCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(autocomplete, "LARGE_RANGE", 1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.catalog = Catalog.load([
+            (1, "Dune", None, None, 5),
+            (2, "Dust", None, None, 3),
+            (3, "Duel", None, None, 1),
+            (4, "Emma", None, None, 9),
+        ])
+
+    def assertTop(self, prefix, expected):
+        cached = list(self.catalog.top_cache.get(prefix, []))
+        self.catalog.top_cache.pop(prefix, None)
+        self.assertEqual(self.catalog.top_ids(prefix, len(expected)), expected)
+        self.assertEqual(cached, expected)
+
+    def test_popularity_bump_updates_memoized_prefix(self):
+        self.assertEqual(self.catalog.top_ids("du", 2), [1, 2])
+        self.catalog.bump(3, 10)
+        self.assertIn("du", self.catalog.top_cache)
+        self.assertTop("du", [3, 1])
+
+    def test_new_and_removed_books(self):
+        self.catalog.top_ids("du", 2)
+        self.catalog.put(5, "Dune Messiah", None, None, popularity=4)
+        self.assertTop("du", [1, 5])
+        self.catalog.top_ids("du", 2)
+        self.catalog.remove(1)
+        self.assertEqual(self.catalog.top_cache["du"], [5])
+        self.assertEqual(self.catalog.top_ids("du", 2), [5, 2])
+
+    def test_lower_popularity_recomputes(self):
+        self.catalog.top_ids("du", 2)
+        self.catalog.bump(1, -5)
+        self.assertNotIn("du", self.catalog.top_cache)
+        self.assertEqual(self.catalog.top_ids("du", 2), [2, 3])
+
+
+class BookAutocompleteViewTests(TestCase):
+
+    def test_falls_back_to_the_database_while_loading(self):
+        dune = Book.objects.create(title="Dune", pages=400)
+        Book.objects.create(title="Emma", pages=300)
+        with mock.patch.object(autocomplete.book_index, "suggest", return_value=None):
+            response = self.client.get("/api/books/autocomplete/?q=du")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([book["id"] for book in response.json()["results"]], [dune.id])
+
+
+# ---------------------- OpenLibrary dump import ----------------------
+
+def dump_line(record):
+    """One line of an official (TSV) dump."""
+    return "\t".join([record["type"]["key"], record["key"], "1", "2020-01-01", json.dumps(record)]) + "\n"
+
+
+def work_record(olid, title, author_keys=(), **extra):
+    return {
+        "type": {"key": "/type/work"},
+        "key": f"/works/{olid}",
+        "title": title,
+        "authors": [{"type": {"key": "/type/author_role"}, "author": {"key": key}} for key in author_keys],
+        **extra,
+    }
+
+
+def edition_record(work_olid, pages):
+    return {
+        "type": {"key": "/type/edition"},
+        "key": f"/books/{work_olid}-{pages}M",
+        "title": "Some edition",
+        "works": [{"key": f"/works/{work_olid}"}],
+        "number_of_pages": pages,
+    }
+
+
+class MapRecordTests(SimpleTestCase):
+
+    def test_work_with_author_keys(self):
+        kind, fields = map_record(work_record(
+            "OL1W", "Dune", ["/authors/OL1A", "/authors/OL2A"],
+            covers=[-1, 42], first_publish_date="August 1965",
+        ))
+        self.assertEqual(kind, "work")
+        self.assertEqual(fields, {
+            "olid": "OL1W",
+            "title": "Dune",
+            "cover_url": "https://covers.openlibrary.org/b/id/42-L.jpg",
+            "first_publish_year": 1965,
+            "author_keys": ["/authors/OL1A", "/authors/OL2A"],
+        })
+
+    def test_work_with_embedded_names_and_old_style_keys(self):
+        _, fields = map_record(work_record("OL1W", "Dune", authors=[{"name": "Frank Herbert"}]))
+        self.assertEqual(fields["author"], "Frank Herbert")
+        _, fields = map_record(work_record("OL1W", "Dune", authors=[{"key": "/authors/OL9A"}]))
+        self.assertEqual(fields["author_keys"], ["/authors/OL9A"])
+
+    def test_edition(self):
+        self.assertEqual(
+            map_record(edition_record("OL1W", 412)),
+            ("edition", {"olid": "OL1W", "title": "Some edition", "pages": 412}),
+        )
+        self.assertIsNone(map_record(edition_record("OL1W", 0)))
+
+    def test_search_doc(self):
+        kind, fields = map_record({
+            "key": "/works/OL1W", "title": "Dune", "author_name": ["Frank Herbert"],
+            "number_of_pages_median": 412, "cover_i": 7, "first_publish_year": 1965,
+        })
+        self.assertEqual(kind, "doc")
+        self.assertEqual((fields["olid"], fields["author"], fields["pages"]), ("OL1W", "Frank Herbert", 412))
+
+    def test_unusable_records(self):
+        self.assertIsNone(map_record({"type": {"key": "/type/work"}, "key": "/works/OL1W"}))
+        self.assertIsNone(map_record({"type": {"key": "/type/author"}, "key": "/authors/OL1A", "name": "X"}))
+
+    def test_authors(self):
+        record = {"type": {"key": "/type/author"}, "key": "/authors/OL1A", "name": " Frank Herbert "}
+        self.assertEqual(map_author(record), ("/authors/OL1A", "Frank Herbert"))
+        self.assertIsNone(map_author({**record, "name": ""}))
+
+        author_names = AuthorNames()
+        self.addCleanup(author_names.close)
+        author_names.load([("/authors/OL1A", "Frank Herbert"), ("/authors/OL2A", "Brian Herbert")], batch_size=1)
+        chunk = [("work", {"olid": "OL1W", "author_keys": ["/authors/OL1A", "/authors/OL3A", "/authors/OL2A"]})]
+        resolve_authors(chunk, author_names)
+        self.assertEqual(chunk[0][1], {"olid": "OL1W", "author": "Frank Herbert, Brian Herbert"})
+
+
+class ImportOpenLibraryDumpTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write_dump(self, name, records):
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as f:
+            f.writelines(dump_line(record) for record in records)
+        return path
+
+    def run_import(self, *args):
+        call_command("import_openlibrary_dump", *args, stdout=io.StringIO())
+
+    def test_author_names_come_from_the_authors_dump(self):
+        authors = self.write_dump("authors.txt", [
+            {"type": {"key": "/type/author"}, "key": "/authors/OL1A", "name": "Frank Herbert"},
+        ])
+        works = self.write_dump("works.txt", [work_record("OL1W", "Dune", ["/authors/OL1A"])])
+        self.run_import(works, "--authors", authors)
+        self.assertEqual(Book.objects.get(olid="OL1W").author, "Frank Herbert")
+
+    def test_unresolved_authors_are_left_alone(self):
+        Book.objects.create(title="Dune", olid="OL1W", author="Frank Herbert")
+        works = self.write_dump("works.txt", [work_record("OL1W", "Dune", ["/authors/OL1A"])])
+        self.run_import(works)
+        self.assertEqual(Book.objects.get(olid="OL1W").author, "Frank Herbert")
+
+    def test_largest_page_count_wins_across_chunks(self):
+        editions = self.write_dump("editions.txt", [
+            edition_record("OL1W", 300), edition_record("OL1W", 500), edition_record("OL1W", 200),
+        ])
+        self.run_import(editions, "--batch-size", "1")
+        self.assertEqual(Book.objects.get(olid="OL1W").pages, 500)
+
+    def test_only_changed_books_touch_their_rentals(self):
+        student = make_student("ana")
+        same = Book.objects.create(title="Dune", olid="OL1W", pages=400)
+        renamed = Book.objects.create(title="Emma", olid="OL2W", pages=300)
+        same_rental = make_rental(student, same)
+        renamed_rental = make_rental(student, renamed)
+        stamp = timezone.now() - timedelta(days=1)
+        Rental.objects.update(updated_at=stamp)
+
+        works = self.write_dump("works.txt", [
+            work_record("OL1W", "Dune"), work_record("OL2W", "Emma (Penguin Classics)"),
+        ])
+        self.run_import(works)
+        self.assertEqual(Rental.objects.get(id=same_rental.id).updated_at, stamp)
+        self.assertNotEqual(Rental.objects.get(id=renamed_rental.id).updated_at, stamp)
+        self.assertEqual(Book.objects.get(id=renamed.id).title, "Emma (Penguin Classics)")
+
+
+# ---------------------- Book enrichment ----------------------
+
+class CreateRentalEnrichmentTests(TestCase):
+
+    def setUp(self):
+        self.student = make_student("ana")
+
+    def rent(self, title):
+        return self.client.post(
+            "/api/rentals/create/", {"title": title, "student_id": self.student.id}, content_type="application/json"
+        )
+
+    @mock.patch("book.views.book_rental_views.fetch_book_from_openlibrary", return_value=None)
+    def test_unknown_title_is_404(self, fetch):
+        response = self.rent("No Such Book")
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Book.objects.exists())
+        self.assertFalse(Rental.objects.exists())
+
+    @mock.patch("book.tasks.fetch_book_from_openlibrary", return_value=None)
+    def test_placeholder_not_found_voids_its_rentals(self, task_fetch):
+        with mock.patch(
+            "book.views.book_rental_views.fetch_book_from_openlibrary", side_effect=OpenLibraryUnavailable("down")
+        ):
+            response = self.rent("No Such Book")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["rental"]["book_enrichment_status"], "pending")
+        book = Book.objects.get(title="No Such Book")
+
+        enrich_book(book.id)
+        book.refresh_from_db()
+        self.assertEqual(book.enrichment_status, "not_found")
+        self.assertFalse(Rental.objects.exists())
+        self.assertTrue(RentalTombstone.objects.exists())
+
+        # Known not to exist now: refused without asking OpenLibrary again
+        with mock.patch("book.views.book_rental_views.fetch_book_from_openlibrary") as fetch:
+            self.assertEqual(self.rent("no such book").status_code, 404)
+        fetch.assert_not_called()
+
+    def test_placeholder_merges_into_existing_work(self):
+        existing = Book.objects.create(title="Dune", olid="OL1W", pages=500)
+        existing_rental = make_rental(self.student, existing, started_days_ago=45)
+        placeholder = Book.objects.create(title="Dune (Ace)", enrichment_status="pending")
+        moved = make_rental(self.student, placeholder, started_days_ago=45)
+        self.assertEqual(moved.total_fee, Decimal("0.00"))
+
+        book_info = {
+            "title": "Dune", "author": "Frank Herbert", "pages": 500,
+            "cover_url": None, "olid": "OL1W", "first_publish_year": 1965,
+        }
+        with mock.patch("book.tasks.fetch_book_from_openlibrary", return_value=book_info):
+            enrich_book(placeholder.id)
+
+        self.assertFalse(Book.objects.filter(id=placeholder.id).exists())
+        moved.refresh_from_db()
+        self.assertEqual(moved.book_id, existing.id)
+        self.assertEqual(moved.total_fee, Decimal("5.00"))
+        self.assertEqual(Rental.objects.get(id=existing_rental.id).total_fee, Decimal("5.00"))
+
+
+# ---------------------- Lookup cache ----------------------
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TieredCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        caches["default"].clear()
+        caches["local"].clear()
+        self.cache = TieredCache("test", local_ttl=5)
+
+    def test_set_fills_both_tiers_with_their_ttls(self):
+        with mock.patch.object(caches["local"], "set", wraps=caches["local"].set) as local_set, \
+                mock.patch.object(caches["default"], "set", wraps=caches["default"].set) as shared_set:
+            self.cache.set("k", {"title": "Dune"}, 60)
+        self.assertEqual(local_set.call_args.args[2], 5)
+        self.assertEqual(shared_set.call_args.args[2], 60)
+        self.assertEqual(self.cache.get("k"), (True, {"title": "Dune"}))
+        self.assertEqual(self.cache.stats()["local_hits"], 1)
+
+    def test_local_miss_falls_through_and_promotes(self):
+        self.cache.set("k", "v", 60)
+        caches["local"].clear()
+        self.assertEqual(self.cache.get("k"), (True, "v"))
+        self.assertEqual(self.cache.get("k"), (True, "v"))
+        stats = self.cache.stats()
+        self.assertEqual((stats["shared_hits"], stats["local_hits"]), (1, 1))
+
+    def test_short_ttl_is_kept_locally(self):
+        with mock.patch.object(caches["local"], "set", wraps=caches["local"].set) as local_set:
+            self.cache.set("k", "v", 2)
+        self.assertEqual(local_set.call_args.args[2], 2)
+
+    def test_negative_results_are_hits(self):
+        self.cache.set("k", None, 60)
+        self.assertEqual(self.cache.get("k"), (True, None))
+        self.assertEqual(self.cache.get("missing"), (False, None))
+        self.assertEqual(self.cache.stats()["negative_hits"], 1)
+
+    def test_get_many_mixes_tiers(self):
+        self.cache.set("a", 1, 60)
+        self.cache.set("b", 2, 60)
+        caches["local"].delete(self.cache._key("b"))
+        self.assertEqual(self.cache.get_many(["a", "b", "c"]), {"a": (True, 1), "b": (True, 2), "c": (False, None)})
+
+    def test_shared_failure_backs_off_to_the_local_tier(self):
+        self.cache.set("k", "v", 60)
+        with mock.patch.object(caches["default"], "get", side_effect=ConnectionError("down")) as shared_get:
+            self.assertEqual(self.cache.get("other"), (False, None))
+            self.assertEqual(self.cache.get("other"), (False, None))
+            self.assertEqual(self.cache.get("k"), (True, "v"))
+        # Skipped while backing off rather than retried on every lookup
+        self.assertEqual(shared_get.call_count, 1)
+
+    def test_principals_have_their_own_local_tier(self):
+        # A busy OpenLibrary cache must not evict JWT principals
+        from book.utils import openlibrary_cache
+        self.assertNotEqual(authentication.principal_cache.local_alias, openlibrary_cache.local_alias)
+
+
+
+# ---------------------- Request coalescing ----------------------
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SingleFlightTests(SimpleTestCase):
+
+    def setUp(self):
+        caches["default"].clear()
+        self.flight = SingleFlight("test", wait_timeout=2, poll_interval=0.01)
+        self.miss = lambda: (False, None)
+
+    def run_concurrently(self, callers, started):
+        results = [None] * callers
+
+        def call(i):
+            results[i] = self.flight.do("k", self.fetch, peek=self.miss)
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+        for thread in threads:
+            thread.start()
+        self.assertTrue(started.wait(2))
+        return threads, results
+
+    def test_concurrent_calls_share_one_execution(self):
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            started.set()
+            release.wait(2)
+            return "dune"
+
+        self.fetch = fetch
+        threads, results = self.run_concurrently(3, started)
+        deadline = time.monotonic() + 2
+        while self.flight.stats()["coalesced"] < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(2)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["dune"] * 3)
+
+    def test_follower_runs_itself_when_the_leader_is_too_slow(self):
+        self.flight.wait_timeout = 0.05
+        started, release = threading.Event(), threading.Event()
+
+        def fetch():
+            if not started.is_set():
+                started.set()
+                release.wait(2)
+                return "leader"
+            return "follower"
+
+        self.fetch = fetch
+        threads, results = self.run_concurrently(1, started)
+        self.assertEqual(self.flight.do("k", fetch, peek=self.miss), "follower")
+        release.set()
+        threads[0].join(2)
+        self.assertEqual(results, ["leader"])
+
+    def test_remote_follower_takes_the_leaders_result(self):
+        caches["default"].add(self.flight._lock_key("k"), "other-worker", 15)
+        peeks = iter([(False, None), (True, "dune")])
+        fetch = mock.Mock()
+        self.assertEqual(self.flight.do("k", fetch, peek=lambda: next(peeks)), "dune")
+        fetch.assert_not_called()
+
+    def test_remote_follower_fetches_when_the_leader_gives_up(self):
+        caches["default"].add(self.flight._lock_key("k"), "other-worker", 15)
+
+        def peek():
+            # The other worker failed: its lock goes without a result
+            caches["default"].delete(self.flight._lock_key("k"))
+            return False, None
+
+        self.assertEqual(self.flight.do("k", lambda: "dune", peek=peek), "dune")
+        self.assertIsNone(caches["default"].get(self.flight._lock_key("k")))
+
+    def test_leader_rechecks_the_cache_after_taking_the_lock(self):
+        # The previous leader filled the cache between the caller's check and our lock
+        fetch = mock.Mock()
+        self.assertEqual(self.flight.do("k", fetch, peek=lambda: (True, "dune")), "dune")
+        fetch.assert_not_called()
+
+    def test_release_keeps_a_successors_lock(self):
+        token = self.flight._acquire("k")
+        # Our lock expired and another worker took over
+        caches["default"].set(self.flight._lock_key("k"), "successor", 15)
+        self.flight._release("k", token)
+        self.assertEqual(caches["default"].get(self.flight._lock_key("k")), "successor")
+
+    def test_release_on_redis_is_one_compare_and_delete(self):
+        from django.core.cache.backends.redis import RedisCache
+        redis_cache = RedisCache("redis://127.0.0.1:1/0", {})
+        client = mock.Mock()
+        with mock.patch.object(redis_cache._cache, "get_client", return_value=client), \
+                mock.patch.object(singleflight, "caches", {"default": redis_cache}):
+            self.flight._release("k", "token")
+        script, numkeys, key, token = client.eval.call_args.args
+        self.assertEqual(script, singleflight.RELEASE_SCRIPT)
+        self.assertEqual(key, redis_cache.make_and_validate_key(self.flight._lock_key("k")))
+        self.assertEqual(redis_cache._cache._serializer.loads(token), "token")
+        client.get.assert_not_called()
+        client.delete.assert_not_called()
+
+    def test_async_calls_share_one_execution(self):
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "dune"
+
+        async def miss():
+            return False, None
+
+        async def run():
+            return await asyncio.gather(*(self.flight.ado("k", fetch, apeek=miss) for _ in range(3)))
+
+        self.assertEqual(asyncio.run(run()), ["dune"] * 3)
+        self.assertEqual(len(calls), 1)
+
+
+# ---------------------- Book search ----------------------
+
+class SqliteBookSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dune = Book.objects.create(title="Dune", author="Frank Herbert")
+        cls.messiah = Book.objects.create(title="Dune Messiah", author="Frank Herbert")
+        cls.about = Book.objects.create(title="Herbert's Worlds", author="Dune Scholar")
+
+    def test_prefixes_match_and_titles_rank_above_authors(self):
+        results = search.search_books("dun")
+        self.assertEqual(results[-1], self.about)
+        self.assertEqual(set(results), {self.dune, self.messiah, self.about})
+        self.assertEqual(search.search_books("herbert messiah"), [self.messiah])
+
+    def test_no_fts_hit_is_no_result_not_a_table_scan(self):
+        with mock.patch("book.search._search_icontains") as icontains:
+            self.assertEqual(search.search_books("essia"), [])
+            self.assertEqual(search.search_books("?!"), [])
+        icontains.assert_not_called()
+
+    def test_triggers_dropped_by_a_table_rebuild_are_restored(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER book_book_fts_au")
+        Book.objects.filter(id=self.about.id).update(title="Arrakis Worlds")
+        ensure_sqlite_search_triggers()
+        self.assertEqual(search.search_books("arrakis"), [self.about])
+
+        Book.objects.filter(id=self.about.id).update(title="Caladan Worlds")
+        self.assertEqual(search.search_books("caladan"), [self.about])
+
+    def test_missing_fts_table_falls_back_to_icontains(self):
+        with mock.patch("book.search._search_sqlite", side_effect=OperationalError("no such table")):
+            self.assertEqual(search.search_books("essia"), [self.messiah])
+
+
+class PostgresBookSearchTests(SimpleTestCase):
+
+    def search_sql(self, query):
+        with mock.patch("book.search.connection") as connection, \
+                mock.patch("book.search.Book.objects.raw", return_value=[]) as raw:
+            connection.vendor = "postgresql"
+            search.search_books(query, limit=5)
+        return raw.call_args.args
+
+    def test_short_queries_only_use_the_tsquery(self):
+        sql, params = self.search_sql("du")
+        self.assertNotIn("ILIKE", sql)
+        self.assertNotIn("similarity", sql)
+        self.assertEqual(params["tsquery"], "du:*")
+
+    def test_longer_queries_add_trigram_matches_and_ranking(self):
+        sql, params = self.search_sql("Frank Dun")
+        self.assertIn("title ILIKE %(like)s", sql)
+        self.assertIn("similarity(title, %(query)s)", sql)
+        self.assertIn("ORDER BY search_rank DESC, id", sql)
+        self.assertEqual(params["tsquery"], "frank:* & dun:*")
+        self.assertEqual(params["like"], "%Frank Dun%")
+
+
+class BookSearchViewTests(TestCase):
+    DUNE_INFO = {
+        "title": "Dune", "author": "Frank Herbert", "pages": 412, "cover_url": None,
+        "olid": "OL893415W", "first_publish_year": 1965,
+    }
+
+    def search(self, title):
+        return self.client.get("/api/books/search/", {"title": title})
+
+    def test_title_is_required(self):
+        self.assertEqual(self.search("  ").status_code, 400)
+
+    def test_local_matches_skip_openlibrary(self):
+        Book.objects.create(title="Dune", author="Frank Herbert", pages=412)
+        with mock.patch("book.views.book_rental_views.afetch_book_from_openlibrary") as fetch:
+            response = self.search("dune")
+        fetch.assert_not_called()
+        self.assertEqual([result["title"] for result in response.json()["results"]], ["Dune"])
+
+    def test_openlibrary_fills_in_unknown_titles(self):
+        with mock.patch("book.views.book_rental_views.afetch_book_from_openlibrary",
+                        mock.AsyncMock(return_value=self.DUNE_INFO)):
+            response = self.search("dune")
+        self.assertEqual(response.json()["results"][0]["olid"], "OL893415W")
+
+        with mock.patch("book.views.book_rental_views.afetch_book_from_openlibrary", mock.AsyncMock(return_value=None)):
+            self.assertEqual(self.search("no such book").json(), {"results": []})
+
+    def test_unavailable_openlibrary_degrades(self):
+        with mock.patch("book.views.book_rental_views.afetch_book_from_openlibrary",
+                        mock.AsyncMock(side_effect=OpenLibraryUnavailable("down"))):
+            response = self.search("dune")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"], [])
+        self.assertTrue(response.json()["degraded"])
+
+    async def test_served_by_the_async_handler(self):
+        with mock.patch("book.views.book_rental_views.afetch_book_from_openlibrary",
+                        mock.AsyncMock(return_value=self.DUNE_INFO)):
+            response = await self.async_client.get("/api/books/search/", {"title": "dune"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["title"], "Dune")
+
+
+# ---------------------- Response cache ----------------------
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ConditionalResponseTests(SimpleTestCase):
+
+    def setUp(self):
+        caches["default"].clear()
+        self.cache = ResponseCache("test")
+        self.builds = 0
+
+    def get(self, **headers):
+        def build():
+            self.builds += 1
+            return Response({"builds": self.builds})
+
+        return self.cache.serve("books", ["t"], APIRequestFactory().get("/api/books/", **headers), build)
+
+    def backdate(self, seconds):
+        modified = time.time() - seconds
+        caches["default"].set(self.cache._modified_key("t"), modified, None)
+        return modified
+
+    def test_etag_answers_304_until_invalidated(self):
+        etag = self.get()["ETag"]
+        not_modified = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified["ETag"], etag)
+
+        self.cache.invalidate("t")
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(self.builds, 2)
+
+    def test_last_modified_rounds_up_and_answers_304(self):
+        self.get()
+        modified = self.backdate(10.4)
+        response = self.get()
+        self.assertEqual(response["Last-Modified"], http_date(math.ceil(modified)))
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]).status_code, 304)
+
+    def test_write_in_the_current_second_is_not_hidden(self):
+        self.get()
+        self.backdate(10.4)
+        last_modified = self.get()["Last-Modified"]
+        self.cache.invalidate("t")
+        # Modified within this second: no date a client could hold moves past it yet
+        response = self.get(HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Last-Modified", response)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+
+    def test_evicted_modified_time_skips_if_modified_since(self):
+        self.get()
+        caches["default"].delete(self.cache._modified_key("t"))
+        response = self.get(HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Last-Modified", response)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CachedRentalListTests(TestCase):
+
+    def setUp(self):
+        caches["default"].clear()
+        response_cache._down_until = 0.0
+        self.addCleanup(setattr, response_cache, "_down_until", 0.0)
+        self.student = make_student("al")
+        self.book = Book.objects.create(title="Dune", author="Frank Herbert", pages=400)
+        self.rental = make_rental(self.student, self.book)
+
+    def get(self, url="/api/rentals/list/"):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response["X-Cache"]
+
+    def assert_write_invalidates(self, write, url="/api/rentals/list/"):
+        self.assertIn(self.get(url), ("MISS", "HIT"))
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+        self.assertEqual(self.get(url), "MISS")
+        self.assertEqual(self.get(url), "HIT")
+
+    def test_repeated_requests_are_hits(self):
+        self.assertEqual(self.get(), "MISS")
+        self.assertEqual(self.get(), "HIT")
+        self.assertEqual(self.get(f"/api/rentals/student/{self.student.id}/"), "MISS")
+        self.assertEqual(self.get(f"/api/rentals/student/{self.student.id}/"), "HIT")
+
+    def test_rental_writes_invalidate(self):
+        self.assert_write_invalidates(lambda: make_rental(self.student, self.book))
+        self.assert_write_invalidates(self.rental.mark_returned, url=f"/api/rentals/student/{self.student.id}/")
+        self.assert_write_invalidates(self.rental.delete)
+
+    def test_student_writes_invalidate(self):
+        def rename():
+            self.student.student_name = "Alice"
+            self.student.save()
+
+        self.assert_write_invalidates(rename)
+
+    def test_book_writes_invalidate_only_when_rentals_show_the_change(self):
+        def retitle():
+            self.book.title = "Dune (Deluxe)"
+            self.book.save()
+
+        self.assert_write_invalidates(retitle)
+
+        book = Book.objects.get(id=self.book.id)
+        book.enrichment_status = "enriched"
+        with self.captureOnCommitCallbacks(execute=True):
+            book.save()
+            Book.objects.create(title="Emma")
+        self.assertEqual(self.get(), "HIT")
+
+    def test_bypassed_while_the_cache_is_down(self):
+        with mock.patch.object(caches["default"], "get_many", side_effect=ConnectionError("down")):
+            self.assertEqual(self.get(), "BYPASS")
+        # Backs off instead of retrying on every request
+        self.assertEqual(self.get(), "BYPASS")
+
+
+# ---------------------- Cover cache ----------------------
+
+class CacheBookCoverTests(TestCase):
+
+    def setUp(self):
+        store = tempfile.TemporaryDirectory()
+        self.addCleanup(store.cleanup)
+        self.enterContext(override_settings(COVER_STORE_DIR=store.name))
+        self.book = Book.objects.create(title="Dune", cover_url="https://covers.openlibrary.org/b/id/1-L.jpg")
+
+    def cache_cover(self, image_bytes):
+        response = mock.Mock()
+        response.raw.read.return_value = image_bytes
+        with mock.patch("book.tasks.covers_client.get", return_value=response):
+            cache_book_cover(self.book.id)
+        self.book.refresh_from_db()
+
+    def image(self, size):
+        buffer = io.BytesIO()
+        Image.new("RGB", size, "white").save(buffer, "PNG")
+        return buffer.getvalue()
+
+    def test_cover_is_stored(self):
+        self.cache_cover(self.image((40, 60)))
+        self.assertEqual(len(self.book.cover_hash), 64)
+
+    def test_decompression_bomb_keeps_the_original_url(self):
+        # Pillow refuses images over twice MAX_IMAGE_PIXELS outright
+        with mock.patch.object(Image, "MAX_IMAGE_PIXELS", 100):
+            self.cache_cover(self.image((40, 60)))
+        self.assertIsNone(self.book.cover_hash)
+        self.assertEqual(self.book.cover_url, "https://covers.openlibrary.org/b/id/1-L.jpg")
+
+
+class CoverImageViewTests(SimpleTestCase):
+
+    def setUp(self):
+        store = tempfile.TemporaryDirectory()
+        self.addCleanup(store.cleanup)
+        self.enterContext(override_settings(COVER_STORE_DIR=store.name))
+        buffer = io.BytesIO()
+        Image.new("RGB", (40, 60), "white").save(buffer, "PNG")
+        self.cover_hash = store_cover(buffer.getvalue())
+
+    def test_thumbnails_are_served_immutable_and_revalidated(self):
+        url = f"/api/covers/{self.cover_hash}/small.webp"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/webp")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(Image.open(io.BytesIO(b"".join(response.streaming_content))).format, "WEBP")
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+    def test_unknown_covers_are_404(self):
+        for url in (
+            f"/api/covers/{'0' * 64}/small.webp",
+            f"/api/covers/{self.cover_hash}/huge.webp",
+            f"/api/covers/{self.cover_hash}/small.gif",
+            "/api/covers/not-a-hash/small.webp",
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+
+# ---------------------- Bulk rentals ----------------------
+
+def rental_fields(rental):
+    rental.refresh_from_db()
+    return rental.book_id, rental.start_date, rental.end_date, rental.due_date, rental.status, rental.total_fee
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BulkCreateRentalsTests(TestCase):
+
+    def setUp(self):
+        caches["default"].clear()
+        caches["local"].clear()
+        self.student = make_student("al")
+
+    def test_titles_resolve_like_the_per_row_lookup(self):
+        # SQLite's UPPER() and LIKE only fold ASCII; str.upper() folds the accents too
+        for title in ("Émile", "dune", "éclair"):
+            Book.objects.create(title=title)
+        titles = ["émile", "éMILE", "Émile", "ÉMILE", "DUNE", "Dune", "Éclair"]
+        per_row = {title: Book.objects.filter(title__iexact=title).first() for title in titles}
+
+        resolved = bulk.resolve_books(titles)
+        existing = set(Book.objects.filter(enrichment_status="enriched").values_list("id", flat=True))
+        for title in titles:
+            with self.subTest(title=title):
+                if per_row[title]:
+                    self.assertEqual(resolved[title], per_row[title])
+                else:
+                    self.assertEqual(resolved[title].enrichment_status, "pending")
+                    self.assertNotIn(resolved[title].id, existing)
+        # Titles the database folds together share one placeholder
+        self.assertEqual(resolved["émile"], resolved["éMILE"])
+
+    def test_created_rentals_match_rental_save(self):
+        books = [Book.objects.create(title="Dune", pages=412), Book.objects.create(title="Emma", pages=0)]
+        results = bulk.create_rentals([{"student_id": self.student.id, "title": book.title} for book in books])
+        for book, result in zip(books, results):
+            with self.subTest(book=book.title):
+                bulk_rental = Rental.objects.get(id=result["rental_id"])
+                self.assertEqual(rental_fields(bulk_rental), rental_fields(make_rental(self.student, book)))
+                self.assertEqual(result["status_detail"], bulk_rental.status)
+                self.assertEqual(result["free_month_ends"], bulk_rental.due_date.strftime("%Y-%m-%d"))
+
+
+class BulkUpdateRentalsTests(TestCase):
+    # (started days ago, end date in days) of rental pairs in every state
+    STATES = [(0, None), (45, None), (70, 10), (90, -10), (20, 40)]
+
+    def setUp(self):
+        self.student = make_student("al")
+        self.book = Book.objects.create(title="Dune", pages=412)
+        self.pairs = [
+            (make_rental(self.student, self.book, days, end), make_rental(self.student, self.book, days, end))
+            for days, end in self.STATES
+        ]
+
+    def assert_pairs_match(self):
+        for per_row, set_based in self.pairs:
+            with self.subTest(rental=per_row.id):
+                self.assertEqual(rental_fields(set_based), rental_fields(per_row))
+
+    def test_extend_matches_extend_rental(self):
+        for months in (1, 2):
+            refused = set()
+            for per_row, set_based in self.pairs:
+                try:
+                    per_row.extend_rental(months)
+                except ValueError:
+                    refused.add(set_based.id)
+            extended, errors = bulk.extend_rentals([rental.id for _, rental in self.pairs], months=months)
+            self.assertEqual(set(errors), refused)
+            self.assertEqual(len(extended), len(self.pairs) - len(refused))
+            self.assert_pairs_match()
+
+    def test_return_matches_mark_returned(self):
+        already = {set_based.id for _, set_based in self.pairs if set_based.status == "returned"}
+        for per_row, _ in self.pairs:
+            per_row.mark_returned()
+        returned, errors = bulk.return_rentals([rental.id for _, rental in self.pairs] + [0])
+        self.assertEqual(errors, {**{rental_id: "Rental already returned" for rental_id in already}, 0: "Rental not found"})
+        self.assertEqual(len(returned), len(self.pairs) - len(already))
+        self.assert_pairs_match()
+
+
+# ---------------------- Rentals list ----------------------
+
+def tampered_cursors(cursor):
+    def encoded(values):
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+    return [
+        "not a cursor!",
+        cursor[:-3],
+        encoded(["2025-01-01"]),
+        encoded(["not-a-date", "1"]),
+        encoded({"start_date": "2025-01-01", "id": "1"}),
+    ]
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RentalListFixture(TestCase):
+    """Rentals in every state, with ties on start and due dates."""
+
+    @classmethod
+    def setUpTestData(cls):
+        al, bo, cy = cls.students = [make_student(name) for name in ("al", "bo", "cy")]
+        dune, emma, ulysses = cls.books = [
+            Book.objects.create(title="Dune", pages=412),
+            Book.objects.create(title="Emma", pages=0),
+            Book.objects.create(title="Ulysses", pages=730),
+        ]
+        for student, book, started_days_ago, end_in_days in [
+            (al, dune, 0, None),
+            (al, emma, 45, None),
+            (al, ulysses, 45, None),
+            (bo, dune, 70, 10),
+            (bo, ulysses, 90, -10),
+            (cy, emma, 60, None),
+            (cy, dune, 35, None),
+            (cy, ulysses, 45, None),
+        ]:
+            make_rental(student, book, started_days_ago, end_in_days)
+
+    def setUp(self):
+        caches["default"].clear()
+
+    def walk(self, url, page_size, **params):
+        """Ids of every page of `url`, following next_cursor; asserts each page costs the same queries."""
+        ids, cursor, query_counts = [], None, set()
+        while True:
+            query = {**params, "page_size": page_size, **({"cursor": cursor} if cursor else {})}
+            caches["default"].clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, query)
+            self.assertEqual(response.status_code, 200, response.content)
+            query_counts.add(len(queries))
+            ids.extend(rental["id"] for rental in response.json()["rentals"])
+            cursor = response.json()["next_cursor"]
+            self.assertLessEqual(len(ids), Rental.objects.count(), "pages repeat rentals")
+            if cursor is None:
+                self.assertEqual(len(query_counts), 1, "pages should not cost more queries as they go")
+                return ids
+
+
+class RentalListPaginationTests(RentalListFixture):
+
+    def test_pages_cover_every_rental_once_in_order(self):
+        for sort in ("-start_date", "start_date", "total_fee", "-current_fee", "id", "-id"):
+            with self.subTest(sort=sort):
+                tie_break = "-id" if sort.startswith("-") else "id"
+                expected = list(Rental.objects.with_fees().order_by(sort, tie_break).values_list("id", flat=True))
+                self.assertEqual(self.walk("/api/rentals/list/", 3, sort=sort), expected)
+
+    def test_page_size_doesnt_change_queries_per_page(self):
+        counts = []
+        for page_size in (1, 8):
+            caches["default"].clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get("/api/rentals/list/", {"page_size": page_size})
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_tampered_cursors_are_rejected(self):
+        cursor = self.client.get("/api/rentals/list/", {"page_size": 2}).json()["next_cursor"]
+        for tampered in tampered_cursors(cursor):
+            with self.subTest(cursor=tampered):
+                response = self.client.get("/api/rentals/list/", {"page_size": 2, "cursor": tampered})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {"error": "Invalid cursor"})
+
+
+# ---------------------- Rentals export ----------------------
+
+@override_settings(RENTAL_EXPORT_CHUNK_SIZE=3)
+class RentalExportTests(RentalListFixture):
+
+    def export(self, **params):
+        response = self.client.get("/api/rentals/export/", params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_ndjson_has_one_object_per_rental_in_id_order(self):
+        lines = self.export().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row["id"] for row in rows], list(Rental.objects.order_by("id").values_list("id", flat=True)))
+        rental = Rental.objects.select_related("book", "user__student_profile").get(id=rows[3]["id"])
+        self.assertEqual(rows[3], {
+            "id": rental.id,
+            "start_date": rental.start_date.isoformat(),
+            "end_date": rental.end_date.isoformat(),
+            "status": rental.status,
+            "total_fee": str(rental.total_fee),
+            "book_title": rental.book.title,
+            "book_author": rental.book.author,
+            "book_pages": rental.book.pages,
+            "student_id": rental.user.student_profile.id,
+            "student_uuid": str(rental.user.student_profile.stu_id),
+            "student_name": rental.user.student_profile.student_name,
+            "user_email": rental.user.email,
+        })
+
+    def test_csv_applies_the_list_filters(self):
+        rows = list(csv.reader(io.StringIO(self.export(format="csv", status="returned,extended"))))
+        self.assertEqual(rows[0], [name for name, _ in export_views.EXPORT_FIELDS])
+        self.assertEqual(
+            [int(row[0]) for row in rows[1:]],
+            list(Rental.objects.filter(status__in=["returned", "extended"]).order_by("id").values_list("id", flat=True)),
+        )
+        # Missing values are empty cells, not "None"
+        open_row = next(row for row in rows[1:] if row[3] != "returned" and not row[2])
+        self.assertEqual(open_row[2], "")
+
+    def test_asgi_stream_matches_the_sync_one(self):
+        queryset = Rental.objects.all()
+
+        async def collect():
+            return [line async for line in export_views._alines(queryset, "csv")]
+
+        self.assertEqual(async_to_sync(collect)(), list(export_views._lines(queryset, "csv")))
+
+    def test_bad_format_and_filters_are_rejected(self):
+        self.assertEqual(self.client.get("/api/rentals/export/", {"format": "xml"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/rentals/export/", {"start_from": "yesterday"}).status_code, 400)
+
+
+# ---------------------- Rentals filters ----------------------
+
+class RentalFilterTests(RentalListFixture):
+
+    def expected(self, keep):
+        today = timezone.now().date()
+        rentals = [
+            rental for rental in Rental.objects.select_related("book", "user__student_profile")
+            if keep(rental, rental.status != "returned" and rental.due_date < today)
+        ]
+        return rentals, {
+            "count": len(rentals),
+            "active": sum(rental.status != "returned" for rental in rentals),
+            "returned": sum(rental.status == "returned" for rental in rentals),
+            "overdue": sum(rental.status != "returned" and rental.due_date < today for rental in rentals),
+            "total_fees": f"${sum((rental.total_fee for rental in rentals), Decimal('0.00')):.2f}",
+        }
+
+    def test_filter_combinations_match_rows_and_totals(self):
+        al, bo, cy = self.students
+        dune, emma, ulysses = self.books
+        today = timezone.now().date()
+        cases = [
+            ({"student": cy.id, "overdue": "true"},
+             lambda r, overdue: r.user_id == cy.user_id and overdue),
+            ({"status": "active,extended", "book": dune.id},
+             lambda r, overdue: r.status in ("active", "extended") and r.book_id == dune.id),
+            ({"search": "uly", "overdue": "false"},
+             lambda r, overdue: "uly" in r.book.title.lower() and not overdue),
+            ({"search": "Bo"},
+             lambda r, overdue: r.user.student_profile.student_name == "bo"),
+            ({"start_from": today - timedelta(days=50), "start_to": today - timedelta(days=30), "status": "extended"},
+             lambda r, overdue: today - timedelta(days=50) <= r.start_date <= today - timedelta(days=30)
+             and r.status == "extended"),
+            ({"student": al.id},
+             lambda r, overdue: r.user_id == al.user_id),
+        ]
+        for params, keep in cases:
+            with self.subTest(params=params):
+                rentals, totals = self.expected(keep)
+                self.assertTrue(rentals)
+                response = self.client.get("/api/rentals/list/", {**params, "page_size": 50}).json()
+                self.assertEqual({rental["id"] for rental in response["rentals"]}, {rental.id for rental in rentals})
+                self.assertEqual(response["totals"], totals)
+
+    def test_invalid_filters_are_rejected(self):
+        for params in ({"status": "lost"}, {"book": "dune"}, {"start_to": "2025-13-01"}, {"sort": "title"}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get("/api/rentals/list/", params).status_code, 400)
+
+
+# ---------------------- Overdue rentals ----------------------
+
+class OverdueRentalsTests(RentalListFixture):
+
+    def test_pages_walk_open_overdue_rentals_by_due_date(self):
+        today = timezone.now().date()
+        expected = list(
+            Rental.objects.exclude(status="returned").filter(due_date__lt=today)
+            .order_by("due_date", "id").values_list("id", flat=True)
+        )
+        self.assertEqual(len(expected), 5)
+        self.assertEqual(self.walk("/api/rentals/overdue/", 1), expected)
+        self.assertEqual(self.walk("/api/rentals/overdue/", 3), expected)
+
+        cy = self.students[2]
+        self.assertEqual(
+            self.walk("/api/rentals/overdue/", 1, student=cy.id),
+            [rental_id for rental_id in expected if Rental.objects.get(id=rental_id).user_id == cy.user_id],
+        )
+
+    def test_rows_carry_days_overdue(self):
+        today = timezone.now().date()
+        for row in self.client.get("/api/rentals/overdue/", {"page_size": 10}).json()["rentals"]:
+            rental = Rental.objects.get(id=row["id"])
+            self.assertNotEqual(rental.status, "returned")
+            self.assertEqual(row["days_overdue"], (today - rental.due_date).days)
+            self.assertGreater(row["days_overdue"], 0)
+
+    def test_tampered_cursors_are_rejected(self):
+        cursor = self.client.get("/api/rentals/overdue/", {"page_size": 1}).json()["next_cursor"]
+        for tampered in tampered_cursors(cursor):
+            with self.subTest(cursor=tampered):
+                response = self.client.get("/api/rentals/overdue/", {"page_size": 1, "cursor": tampered})
+                self.assertEqual(response.status_code, 400)
+
+    def test_derived_fields_follow_the_stored_start_date(self):
+        # auto_now_add stores today on insert, whatever start_date was set to
+        student, book = self.students[0], self.books[0]
+        rental = Rental.objects.create(user=student.user, book=book, start_date=date(2020, 1, 1))
+        rental.refresh_from_db()
+        today = timezone.now().date()
+        self.assertEqual((rental.start_date, rental.due_date), (today, today + timedelta(days=30)))
+        self.assertEqual((rental.status, rental.total_fee), ("active", Decimal("0.00")))
+
+
+# ---------------------- Rental changes ----------------------
+
+class RentalChangesViewTests(RentalListFixture):
+
+    def setUp(self):
+        super().setUp()
+        # Written before the safety window, so tokens move past them
+        Rental.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+
+    def sync(self, since=None, **params):
+        response = self.client.get("/api/rentals/changes/", {**params, **({"since": since} if since else {})})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def token(self, as_of=None, tombstones_days_ago=0):
+        now = timezone.now()
+        return encode_token(
+            (now, 0), (now - timedelta(days=tombstones_days_ago), 0), as_of or timezone.now().date()
+        )
+
+    def test_full_sync_pages_through_every_rental(self):
+        ids, since, pages = [], None, 0
+        while True:
+            page = self.sync(since, page_size=3)
+            pages += 1
+            ids.extend(rental["id"] for rental in page["rentals"])
+            self.assertEqual(page["deleted"], [])
+            since = page["next"]
+            if not page["has_more"]:
+                break
+        self.assertEqual(pages, 3)
+        self.assertEqual(sorted(ids), sorted(Rental.objects.values_list("id", flat=True)))
+
+    def test_since_returns_changed_and_deleted_rentals(self):
+        since = self.sync(page_size=50)["next"]
+        self.assertEqual(self.sync(since)["rentals"], [])
+
+        changed, deleted = Rental.objects.order_by("id")[:2]
+        changed.extend_rental()
+        deleted_id = deleted.id
+        deleted.delete()
+
+        page = self.sync(since)
+        self.assertEqual([rental["id"] for rental in page["rentals"]], [changed.id])
+        self.assertEqual(page["deleted"], [deleted_id])
+        self.assertFalse(page["has_more"])
+
+    def test_since_returns_rentals_fallen_due_without_a_write(self):
+        # Due 15 and 5 days ago; cy's Emma fell due 30 days ago, before as_of
+        al, _, cy = self.students
+        dune, emma, ulysses = self.books
+        expected = {
+            Rental.objects.get(user=al.user, book=emma).id,
+            Rental.objects.get(user=al.user, book=ulysses).id,
+            Rental.objects.get(user=cy.user, book=dune).id,
+            Rental.objects.get(user=cy.user, book=ulysses).id,
+        }
+        page = self.sync(self.token(as_of=timezone.now().date() - timedelta(days=20)))
+        self.assertEqual({rental["id"] for rental in page["rentals"]}, expected)
+        self.assertTrue(all(rental["is_overdue"] for rental in page["rentals"]))
+
+    def test_recent_writes_are_sent_until_the_safety_window_passes(self):
+        # A transaction committing late may still write rows stamped inside the window
+        since = self.sync(page_size=50)["next"]
+        rental = Rental.objects.order_by("id").first()
+        Rental.objects.filter(id=rental.id).touch()
+        for _ in range(2):
+            page = self.sync(since)
+            self.assertEqual([row["id"] for row in page["rentals"]], [rental.id])
+            since = page["next"]
+
+        with override_settings(CHANGES_SAFETY_SECONDS=0):
+            since = self.sync(since)["next"]
+            self.assertEqual(self.sync(since)["rentals"], [])
+
+    def test_student_filter(self):
+        cy = self.students[2]
+        page = self.sync(student=cy.id, page_size=50)
+        self.assertEqual(
+            sorted(rental["id"] for rental in page["rentals"]),
+            sorted(Rental.objects.filter(user=cy.user).values_list("id", flat=True)),
+        )
+        response = self.client.get("/api/rentals/changes/", {"student": "cy"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_expired_token_is_gone(self):
+        response = self.client.get("/api/rentals/changes/", {"since": self.token(tombstones_days_ago=31)})
+        self.assertEqual(response.status_code, 410)
+        self.assertTrue(response.json()["resync"])
+
+    def test_tampered_tokens_are_rejected(self):
+        for tampered in tampered_cursors(self.token()):
+            with self.subTest(since=tampered):
+                response = self.client.get("/api/rentals/changes/", {"since": tampered})
+                self.assertEqual(response.status_code, 400)
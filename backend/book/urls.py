@@ -3,8 +3,11 @@ from django.urls import path, include, re_path
 from django.conf.urls.static import static
 from rest_framework.routers import DefaultRouter
 
-from book.views.auth_views import RegisterView, LoginView, AddNewStudentView, GetStudentsView
-from book.views.book_rental_views import BookSearchView, CreateRentalView,  ExtendRentalView, StudentRentalsView, AllRentalsView,ReturnRentalView
+from book.views.auth_views import RegisterView, LoginView, AddNewStudentView, BulkImportStudentsView, StudentImportStatusView, GetStudentsView
+from book.views.book_rental_views import BookSearchView, BookAutocompleteView, CreateRentalView, BulkCreateRentalsView,  ExtendRentalView, StudentRentalsView, AllRentalsView,ReturnRentalView, RentalSummaryView, RevenueForecastView, OverdueRentalsView, BulkExtendRentalsView, BulkReturnRentalsView, CacheStatsView, RentalChangesView
+from book.views.cover_views import cover_image_view
+from book.views.event_views import rental_events_view
+from book.views.export_views import rental_export_view
 
 router = DefaultRouter()
 
@@ -18,19 +21,45 @@ urlpatterns = [
 
     # add new student 
     path('students/add/', AddNewStudentView.as_view(), name='add-new-student-view'),
+    # bulk import from CSV
+    path('students/bulk-import/', BulkImportStudentsView.as_view(), name='bulk-import-students-view'),
+    path('students/bulk-import/<int:import_id>/', StudentImportStatusView.as_view(), name='student-import-status-view'),
     # get students
     path('student/list/', GetStudentsView.as_view(), name='get-students-view'),
 
     # search book 
     path('books/search/', BookSearchView.as_view(), name='book-search-view'),
+    # book autocomplete (in-memory prefix index)
+    path('books/autocomplete/', BookAutocompleteView.as_view(), name='book-autocomplete-view'),
+
+    # cached cover thumbnails
+    path('covers/<str:cover_hash>/<slug:size>.<slug:fmt>', cover_image_view, name='cover-image'),
 
     # Rental endpoints
     path('rentals/create/', CreateRentalView.as_view(), name='rental-create'),
+    path('rentals/bulk-create/', BulkCreateRentalsView.as_view(), name='rental-bulk-create'),
     path('rentals/extend/<int:rental_id>/', ExtendRentalView.as_view(), name='rental-extend'),
     path('rentals/student/<int:student_id>/', StudentRentalsView.as_view(), name='student-rentals'),
     path('rentals/list/', AllRentalsView.as_view(), name='all-rentals'),
+    # delta sync: rentals changed/deleted since a token
+    path('rentals/changes/', RentalChangesView.as_view(), name='rental-changes'),
+    # overdue open rentals, oldest due date first
+    path('rentals/overdue/', OverdueRentalsView.as_view(), name='rental-overdue'),
+    # dashboard totals (maintained summary table)
+    path('rentals/summary/', RentalSummaryView.as_view(), name='rental-summary'),
+    # projected billing of open rentals (NumPy)
+    path('rentals/forecast/', RevenueForecastView.as_view(), name='rental-forecast'),
+    # response / OpenLibrary cache hit ratios
+    path('cache/stats/', CacheStatsView.as_view(), name='cache-stats'),
+    # live rental change events (Server-Sent Events, ASGI)
+    path('rentals/events/', rental_events_view, name='rental-events'),
+    # streaming NDJSON/CSV export
+    path('rentals/export/', rental_export_view, name='rental-export'),
 
     path('rentals/return/<int:rental_id>/', ReturnRentalView.as_view(), name='rental-return'),
+    # many rentals at once: {"rental_ids": [...]} or {"filter": {...}}
+    path('rentals/bulk-extend/', BulkExtendRentalsView.as_view(), name='rental-bulk-extend'),
+    path('rentals/bulk-return/', BulkReturnRentalsView.as_view(), name='rental-bulk-return'),
 
     
 
@@ -1,36 +1,134 @@
+import hashlib
+import re
+
+import httpx
 import requests
+from django.conf import settings
+
+from book.cache import TieredCache
+from book.openlibrary import async_openlibrary_client, openlibrary_client
+from book.singleflight import SingleFlight
+
+
+# Lookups are cached by (a hash of the) normalized title; "no docs" results are cached too,
+# but only for OPENLIBRARY_NEGATIVE_CACHE_TTL seconds.
+openlibrary_cache = TieredCache("openlibrary", local_ttl=settings.OPENLIBRARY_LOCAL_CACHE_TTL)
+
+# Concurrent misses for the same normalized title share one upstream call
+openlibrary_flight = SingleFlight(
+    "openlibrary",
+    lock_timeout=settings.OPENLIBRARY_SINGLEFLIGHT_LOCK_TIMEOUT,
+    wait_timeout=settings.OPENLIBRARY_SINGLEFLIGHT_WAIT_TIMEOUT,
+)
+
+
+def normalize_title(title):
+    """Normalize a title for lookups: lowercase, single spaces."""
+    return re.sub(r"\s+", " ", (title or "").strip().lower())
+
+
+def title_cache_key(title):
+    """Cache-safe key (no spaces, fixed length) for a title lookup."""
+    return hashlib.sha1(normalize_title(title).encode("utf-8")).hexdigest()
+
+
+def book_fields_from_doc(book_data, title=None):
+    """
+    Map an OpenLibrary search doc (search.json "docs" entry) to Book fields.
+    """
+    # Construct cover image URL if available
+    cover_id = book_data.get("cover_i")
+    cover_url = f"https://covers.openlibrary.org/b/id/{cover_id}-L.jpg" if cover_id else None
+
+    return {
+        "title": book_data.get("title", title),
+        "author": ", ".join(book_data.get("author_name", [])) if book_data.get("author_name") else "Unknown",
+        "pages": book_data.get("number_of_pages_median", 0) or 0,
+        "cover_url": cover_url,
+        "olid": book_data.get("key", "").replace("/works/", "") or None,
+        "first_publish_year": book_data.get("first_publish_year", None),
+    }
+
+
+def book_fields_from_search(data, title):
+    """
+    Map the first doc of an OpenLibrary search.json payload to Book fields.
+    Returns None when there are no docs.
+    """
+    if not data.get("docs"):
+        return None
+
+    return book_fields_from_doc(data["docs"][0], title)
+
+
+def _query_openlibrary(title):
+    """
+    Query OpenLibrary's search API and map the first doc to Book fields.
+    Returns None when OpenLibrary has no match; raises OpenLibraryUnavailable
+    when the upstream is failing or the circuit breaker is open.
+    """
+    return book_fields_from_search(openlibrary_client.search(title), title)
+
+
+def _fetch_and_cache(title, key):
+    try:
+        book_info = _query_openlibrary(title)
+    except requests.HTTPError as e:
+        # 4xx for this title: nothing to show, but don't cache it
+        print("Error fetching book:", e)
+        return None
+
+    ttl = settings.OPENLIBRARY_CACHE_TTL if book_info else settings.OPENLIBRARY_NEGATIVE_CACHE_TTL
+    openlibrary_cache.set(key, book_info, ttl)
+    return book_info
+
 
 def fetch_book_from_openlibrary(title):
     """
     Fetch book details from OpenLibrary by title.
+    Results (including "not found") are served from the lookup cache when possible,
+    and concurrent misses for the same title are coalesced into one upstream call.
+    Raises OpenLibraryUnavailable so callers can degrade instead of waiting on
+    an unhealthy upstream.
     """
+    key = title_cache_key(title)
+    hit, book_info = openlibrary_cache.get(key)
+    if hit:
+        return book_info
+
+    return openlibrary_flight.do(
+        key,
+        lambda: _fetch_and_cache(title, key),
+        peek=lambda: openlibrary_cache.get(key),
+    )
+
+
+async def _afetch_and_cache(title, key):
     try:
-        url = f"https://openlibrary.org/search.json?title={title}"
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        print('OpenLibrary response data:', data)
-
-        if not data["docs"]:
-            return None
-
-        book_data = data["docs"][0]
-        print('Book data from OpenLibrary:', book_data)
-
-        # Construct cover image URL if available
-        cover_id = book_data.get("cover_i")
-        print('Cover ID:', cover_id)
-        cover_url = f"https://covers.openlibrary.org/b/id/{cover_id}-L.jpg" if cover_id else None
-
-        return {
-            "title": book_data.get("title", title),
-            "author": ", ".join(book_data.get("author_name", [])) if book_data.get("author_name") else "Unknown",
-            "pages": book_data.get("number_of_pages_median", 0) or 0,
-            "cover_url": cover_url,
-            "olid": book_data.get("key", "").replace("/works/", ""),
-            "first_publish_year": book_data.get("first_publish_year", None),
-        }
-
-    except Exception as e:
+        data = await async_openlibrary_client.search(title)
+    except httpx.HTTPStatusError as e:
         print("Error fetching book:", e)
         return None
+    book_info = book_fields_from_search(data, title)
+
+    ttl = settings.OPENLIBRARY_CACHE_TTL if book_info else settings.OPENLIBRARY_NEGATIVE_CACHE_TTL
+    await openlibrary_cache.aset(key, book_info, ttl)
+    return book_info
+
+
+async def afetch_book_from_openlibrary(title):
+    """
+    Async version of fetch_book_from_openlibrary for ASGI views.
+    Shares the lookup cache, request coalescing and the circuit breaker with
+    the sync path.
+    """
+    key = title_cache_key(title)
+    hit, book_info = await openlibrary_cache.aget(key)
+    if hit:
+        return book_info
+
+    return await openlibrary_flight.ado(
+        key,
+        lambda: _afetch_and_cache(title, key),
+        apeek=lambda: openlibrary_cache.aget(key),
+    )
@@ -9,7 +9,6 @@ from rest_framework import status
 import uuid
 import string
 import random
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.hashers import make_password
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.decorators import permission_classes, api_view
@@ -21,7 +20,14 @@ from rest_framework_simplejwt.authentication import JWTAuthentication
 import traceback
 from django.utils.timezone import now
 from datetime import timedelta
-from book.models import User, Student
+from book.authentication import VersionedRefreshToken
+from book.models import User, Student, StudentImport
+from book.response_cache import ALL_STUDENTS, cache_response
+from book.student_import import DEFAULT_STUDENT_PASSWORD, prepare_import, read_student_rows
+from book.tasks import import_student_chunk
+from django.urls import reverse
+import csv
+import io
 import json
 import traceback
 # User Model
@@ -49,15 +55,18 @@ class RegisterView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            # ✅ Check if user already exists
-            if User.objects.filter(email=email).exists():
+            # ✅ Check if user already exists (email or username, in one query)
+            taken_emails = set(
+                User.objects.filter(Q(email=email) | Q(username=username)).values_list("email", flat=True)
+            )
+            if email in taken_emails:
                 return Response(
                     {"error": "Email is already registered."},
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
             # Optional: Check duplicate username (if desired)
-            if User.objects.filter(username=username).exists():
+            if taken_emails:
                 return Response(
                     {"error": "Username already taken."},
                     status=status.HTTP_400_BAD_REQUEST
@@ -71,7 +80,7 @@ class RegisterView(APIView):
             )
 
             # ✅ Generate JWT tokens
-            refresh = RefreshToken.for_user(user)
+            refresh = VersionedRefreshToken.for_user(user)
 
             # ✅ Response
             return Response({
@@ -132,7 +141,7 @@ class LoginView(APIView):
                     )
 
             # ✅ Generate JWT tokens
-            refresh = RefreshToken.for_user(user)
+            refresh = VersionedRefreshToken.for_user(user)
 
             return Response(
                 {
@@ -195,7 +204,7 @@ class AddNewStudentView(APIView):
             user = User.objects.create(
                 username=student_name,
                 email=email,
-                password=make_password("Password@123")  # default password
+                password=make_password(DEFAULT_STUDENT_PASSWORD)  # default password
             )
 
             # ✅ Create the Student profile linked to User
@@ -206,7 +215,7 @@ class AddNewStudentView(APIView):
             )
 
             # ✅ Optional: Generate JWT token for the student (if needed)
-            refresh = RefreshToken.for_user(user)
+            refresh = VersionedRefreshToken.for_user(user)
 
             # ✅ Success response
             return Response({
@@ -216,7 +225,7 @@ class AddNewStudentView(APIView):
                     "stu_id": str(student.stu_id),
                     "student_name": student.student_name,
                     "email": student.email,
-                    "default_password": "Password@123"
+                    "default_password": DEFAULT_STUDENT_PASSWORD
                 },
                 "tokens": {
                     "access": str(refresh.access_token),
@@ -234,6 +243,95 @@ class AddNewStudentView(APIView):
 
 
 
+class BulkImportStudentsView(APIView):
+    """
+    Create many students from an uploaded CSV ("file" field) with columns
+    student_name (or name), email and optionally password; students without
+    a password get the default one. The request only reads and validates
+    the file: passwords are hashed and rows inserted by Celery tasks, one
+    per chunk (see book/student_import.py). Responds 202 with the import's
+    id; follow it at /api/students/bulk-import/<id>/. Duplicate or invalid
+    rows are reported per line and skipped.
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        try:
+            upload = request.FILES.get("file")
+            if not upload:
+                return Response(
+                    {"error": "Upload a CSV file in the 'file' field."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            lines = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+            with transaction.atomic():
+                student_import, chunk_ids = prepare_import(read_student_rows(lines))
+                transaction.on_commit(
+                    lambda: [import_student_chunk.delay(chunk_id) for chunk_id in chunk_ids]
+                )
+
+            if not chunk_ids:
+                return Response({
+                    "error": "No students to import.",
+                    "skipped": student_import.skipped,
+                    "errors": student_import.errors,
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            return Response({
+                "message": f"🎉 Queued {student_import.total_rows - student_import.skipped} student(s) for import.",
+                "import_id": student_import.id,
+                "status_url": request.build_absolute_uri(
+                    reverse("student-import-status-view", args=[student_import.id])
+                ),
+                "skipped": student_import.skipped,
+                "errors": student_import.errors,
+                "default_password": DEFAULT_STUDENT_PASSWORD,
+            }, status=status.HTTP_202_ACCEPTED)
+
+        except (UnicodeDecodeError, csv.Error) as e:
+            return Response({"error": f"Could not read the CSV file: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception:
+            print("❌ Exception Traceback:\n", traceback.format_exc())
+            return Response(
+                {"error": "Something went wrong while importing students. Please try again later."},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class StudentImportStatusView(APIView):
+    """
+    Progress of a bulk student import.
+    GET /api/students/bulk-import/<import_id>/
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, import_id):
+        try:
+            student_import = StudentImport.objects.filter(id=import_id).first()
+            if not student_import:
+                return Response({"error": "Import not found."}, status=status.HTTP_404_NOT_FOUND)
+
+            return Response({
+                "import_id": student_import.id,
+                "status": student_import.status,
+                "total_rows": student_import.total_rows,
+                "created": student_import.created,
+                "skipped": student_import.skipped,
+                "chunks_done": student_import.chunks_done,
+                "chunks_total": student_import.chunks_total,
+                "errors": student_import.errors,
+                "finished_at": student_import.finished_at,
+            }, status=status.HTTP_200_OK)
+
+        except Exception:
+            print("❌ Exception Traceback:\n", traceback.format_exc())
+            return Response(
+                {"error": "Something went wrong while fetching the import."},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
 class GetStudentsView(APIView):
     """
     List all students or search by name/email using ?search=<query>
@@ -243,6 +341,7 @@ class GetStudentsView(APIView):
     """
     permission_classes = [AllowAny]
 
+    @cache_response("students-list", lambda request: [ALL_STUDENTS])
     def get(self, request):
         try:
             search_query = request.GET.get("search", "").strip()
@@ -2,15 +2,33 @@ from datetime import timedelta, date
 from decimal import Decimal
 import traceback
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.db import transaction
+from django.db.models import Count
+from django.http import JsonResponse
 from django.utils import timezone
+from django.views import View
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny
 
-from book.models import User, Student, Book, Rental 
-from book.utils import fetch_book_from_openlibrary
+from book.models import User, Student, Book, Rental, RentalSummary
+from book.openlibrary import OpenLibraryUnavailable, openlibrary_client
+from book.expressions import overdue_q
+from book.forecast import forecast
+from book.filters import RentalFilter, filter_errors, rental_totals
+from book.pagination import InvalidCursor, KeysetPaginator, get_page_size
+from book.response_cache import ALL_BOOKS, ALL_RENTALS, cache_response, response_cache, student_tag
+from book.search import search_books
+from book.summary import GLOBAL_SCOPE, summary_totals
+from book.autocomplete import book_index
+from book.bulk import create_rentals, extend_rentals, return_rentals
+from book.changes import ExpiredToken, rental_changes
+from book.covers import cover_hash_url, cover_thumbnail_url
+from book.tasks import cache_book_cover, enrich_book
+from book.utils import afetch_book_from_openlibrary, fetch_book_from_openlibrary, openlibrary_cache
 
 
 # ---------------------- Helper Fee Functions ----------------------
@@ -22,42 +40,99 @@ def calculate_monthly_fee(pages):
 
 # ---------------------- Book Search View ----------------------
 
-class BookSearchView(APIView):
-    permission_classes = [AllowAny]
-
-    def get(self, request):
+def book_search_result(book, request=None):
+    """Shape a Book (or an OpenLibrary lookup dict) like the search API returns it."""
+    if isinstance(book, dict):
+        return {
+            "title": book["title"],
+            "author": book["author"],
+            "pages": book["pages"],
+            "coverUrl": book["cover_url"],
+            "coverThumbnailUrl": None,
+            "olid": book["olid"],
+            "firstPublishYear": book["first_publish_year"],
+        }
+    return {
+        "title": book.title,
+        "author": book.author,
+        "pages": book.pages,
+        "coverUrl": book.cover_url,
+        "coverThumbnailUrl": cover_thumbnail_url(request, book),
+        "olid": book.olid,
+        "firstPublishYear": book.first_publish_year,
+    }
+
+
+class BookSearchView(View):
+    """
+    Async book search, served natively under ASGI (uvicorn backend.asgi:application).
+    Neither the local lookup nor the OpenLibrary fallback holds a worker
+    thread while waiting, so one process can serve many concurrent searches.
+    """
+
+    async def get(self, request):
         title = request.GET.get("title", "").strip()
         if not title:
-            return Response({"error": "Title parameter is required."}, status=status.HTTP_400_BAD_REQUEST)
-
-        books = Book.objects.filter(title__icontains=title)
-        if books.exists():
-            results = [
-                {
-                    "title": b.title,
-                    "author": b.author,
-                    "pages": b.pages,
-                    "coverUrl": b.cover_url,
-                    "olid": b.olid,
-                    "firstPublishYear": b.first_publish_year,
-                }
-                for b in books
-            ]
-            return Response({"results": results}, status=status.HTTP_200_OK)
+            return JsonResponse({"error": "Title parameter is required."}, status=status.HTTP_400_BAD_REQUEST)
 
-        book_info = fetch_book_from_openlibrary(title)
+        # Ranked full-text/trigram search (book/search.py); raw SQL has no
+        # async iterator, so it runs through sync_to_async like the async ORM does
+        books = await sync_to_async(search_books)(title)
+        results = [book_search_result(b, request) for b in books]
+        if results:
+            return JsonResponse({"results": results}, status=status.HTTP_200_OK)
+
+        try:
+            book_info = await afetch_book_from_openlibrary(title)
+        except OpenLibraryUnavailable:
+            # Degrade to "no results" instead of waiting on a sick upstream
+            return JsonResponse(
+                {"results": [], "degraded": True, "upstream": openlibrary_client.status()["circuit"]},
+                status=status.HTTP_200_OK,
+            )
         if not book_info:
-            return Response({"results": []}, status=status.HTTP_200_OK)
-
-        result = {
-            "title": book_info["title"],
-            "author": book_info["author"],
-            "pages": book_info["pages"],
-            "coverUrl": book_info["cover_url"],
-            "olid": book_info["olid"],
-            "firstPublishYear": book_info["first_publish_year"],
-        }
-        return Response({"results": [result]}, status=status.HTTP_200_OK)
+            return JsonResponse({"results": []}, status=status.HTTP_200_OK)
+
+        return JsonResponse({"results": [book_search_result(book_info)]}, status=status.HTTP_200_OK)
+
+
+# ---------------------- Book Autocomplete View ----------------------
+
+class BookAutocompleteView(View):
+    """
+    Prefix suggestions for the book picker, served from the in-memory
+    index in book/autocomplete.py (no database query per request).
+    While a process is still loading its index, a title prefix query
+    answers instead.
+    GET /api/books/autocomplete/?q=harry&limit=10
+    """
+
+    def get(self, request):
+        query = request.GET.get("q", "").strip()
+        try:
+            limit = min(max(int(request.GET.get("limit", 10)), 1), 25)
+        except ValueError:
+            limit = 10
+
+        books = book_index.suggest(query, limit)
+        if books is None:
+            books = (
+                Book.objects.filter(title__istartswith=query)
+                .annotate(popularity=Count("rentals"))
+                .order_by("-popularity", "id")
+                .values("id", "title", "author", "cover_hash", "popularity")[:limit]
+            )
+        results = [
+            {
+                "id": book["id"],
+                "title": book["title"],
+                "author": book["author"],
+                "coverThumbnailUrl": cover_hash_url(request, book["cover_hash"]) if book["cover_hash"] else None,
+                "rentals": book["popularity"],
+            }
+            for book in books
+        ]
+        return JsonResponse({"results": results}, status=status.HTTP_200_OK)
 
 
 # ---------------------- Create Rental View ----------------------
@@ -65,7 +140,6 @@ class BookSearchView(APIView):
 class CreateRentalView(APIView):
     permission_classes = [AllowAny]
 
-    @transaction.atomic
     def post(self, request):
         try:
             title = request.data.get("title")
@@ -74,57 +148,126 @@ class CreateRentalView(APIView):
             if not title:
                 return Response({"error": "Book title is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Find or create book
+            # An unknown title is looked up before the transaction opens, so no
+            # network I/O happens while it holds locks. Only when OpenLibrary is
+            # unavailable does the rental go ahead on a placeholder, which the
+            # enrich_book task fills in (or voids, if the title doesn't exist).
             book = Book.objects.filter(title__iexact=title).first()
+            book_info = None
+            if book and book.enrichment_status == "not_found":
+                return Response({"error": "Book not found in OpenLibrary"}, status=status.HTTP_404_NOT_FOUND)
             if not book:
-                book_info = fetch_book_from_openlibrary(title)
-                if not book_info:
-                    return Response({"error": "Book not found in OpenLibrary"}, status=status.HTTP_404_NOT_FOUND)
-
-                book = Book.objects.create(
-                    title=book_info["title"],
-                    author=book_info["author"],
-                    pages=book_info["pages"],
-                    cover_url=book_info["cover_url"],
-                    olid=book_info["olid"],
-                    first_publish_year=book_info["first_publish_year"],
-                )
-
-            # Find user based on student_id or use default
-            if student_id:
                 try:
-                    student = Student.objects.get(id=student_id)
-                    user = student.user
-                except Student.DoesNotExist:
-                    return Response({"error": "Student not found"}, status=status.HTTP_404_NOT_FOUND)
+                    book_info = fetch_book_from_openlibrary(title)
+                except OpenLibraryUnavailable as e:
+                    print("OpenLibrary unavailable, renting a placeholder:", e)
+                else:
+                    if not book_info:
+                        return Response({"error": "Book not found in OpenLibrary"}, status=status.HTTP_404_NOT_FOUND)
+
+            with transaction.atomic():
+                return self._create_rental(title, student_id, book, book_info)
+
+        except Exception as e:
+            print("Rental creation error:", e)
+            traceback.print_exc()
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def _create_rental(self, title, student_id, book, book_info):
+        # Find user based on student_id or use default
+        if student_id:
+            try:
+                student = Student.objects.get(id=student_id)
+                user = student.user
+            except Student.DoesNotExist:
+                return Response({"error": "Student not found"}, status=status.HTTP_404_NOT_FOUND)
+        else:
+            # Fallback to first user if no student specified
+            user = User.objects.first()
+
+        if not book and book_info:
+            book_fields = {
+                "title": book_info["title"],
+                "author": book_info["author"],
+                "pages": book_info["pages"],
+                "cover_url": book_info["cover_url"],
+                "first_publish_year": book_info["first_publish_year"],
+            }
+            # olid is unique: the work may already exist under another title
+            if book_info["olid"]:
+                book, _ = Book.objects.get_or_create(olid=book_info["olid"], defaults=book_fields)
             else:
-                # Fallback to first user if no student specified
-                user = User.objects.first()
+                book = Book.objects.create(**book_fields)
+            if book.cover_url and not book.cover_hash:
+                book_id = book.id
+                transaction.on_commit(lambda: cache_book_cover.delay(book_id), robust=True)
+        elif not book:
+            book = Book.objects.create(title=title.strip(), enrichment_status="pending")
+            book_id = book.id
+            transaction.on_commit(lambda: enrich_book.delay(book_id), robust=True)
+
+        # Create rental - model will automatically set dates and calculate fees
+        rental = Rental.objects.create(
+            user=user,
+            book=book
+        )
+        
+        monthly_fee = calculate_monthly_fee(book.pages)
+
+        return Response({
+            "message": f"Book '{book.title}' rented successfully!",
+            "rental": {
+                "id": rental.id,
+                "book": book.title,
+                "start_date": rental.start_date.strftime("%Y-%m-%d"),
+                "end_date": rental.end_date.strftime("%Y-%m-%d") if rental.end_date else None,
+                "free_month_ends": (rental.start_date + timedelta(days=30)).strftime("%Y-%m-%d"),
+                "status": rental.status,
+                "total_fee": f"${rental.total_fee:.2f}",
+                "monthly_fee": f"${monthly_fee:.2f}",
+                "book_enrichment_status": book.enrichment_status,
+            }
+        }, status=status.HTTP_201_CREATED)
+
+
+# ---------------------- Bulk Create Rentals View ----------------------
+
+def bulk_items(request):
+    """The "rentals" list of a bulk request, or an error Response."""
+    items = request.data.get("rentals") if isinstance(request.data, dict) else None
+    if not isinstance(items, list) or not items:
+        return None, Response({"error": "rentals must be a non-empty list"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > settings.BULK_RENTAL_MAX_ITEMS:
+        return None, Response(
+            {"error": f"At most {settings.BULK_RENTAL_MAX_ITEMS} rentals per request"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    return items, None
+
+
+class BulkCreateRentalsView(APIView):
+    """
+    Create many rentals in one request: {"rentals": [{"student_id", "title"}, ...]}.
+    Each item gets its own result; invalid items don't stop the others.
+    """
+    permission_classes = [AllowAny]
 
-            # Create rental - model will automatically set dates and calculate fees
-            rental = Rental.objects.create(
-                user=user,
-                book=book
-            )
-            
-            monthly_fee = calculate_monthly_fee(book.pages)
+    def post(self, request):
+        try:
+            items, error = bulk_items(request)
+            if error:
+                return error
 
+            results = create_rentals(items)
+            created = sum(1 for result in results if result["status"] == "created")
             return Response({
-                "message": f"Book '{book.title}' rented successfully!",
-                "rental": {
-                    "id": rental.id,
-                    "book": book.title,
-                    "start_date": rental.start_date.strftime("%Y-%m-%d"),
-                    "end_date": rental.end_date.strftime("%Y-%m-%d") if rental.end_date else None,
-                    "free_month_ends": (rental.start_date + timedelta(days=30)).strftime("%Y-%m-%d"),
-                    "status": rental.status,
-                    "total_fee": f"${rental.total_fee:.2f}",
-                    "monthly_fee": f"${monthly_fee:.2f}",
-                }
-            }, status=status.HTTP_201_CREATED)
+                "created": created,
+                "failed": len(results) - created,
+                "results": results,
+            }, status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
 
         except Exception as e:
-            print("Rental creation error:", e)
+            print("Bulk rental creation error:", e)
             traceback.print_exc()
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -134,18 +277,16 @@ class CreateRentalView(APIView):
 class StudentRentalsView(APIView):
     permission_classes = [AllowAny]
 
+    @cache_response("student-rentals", lambda request, student_id: [student_tag(student_id), ALL_BOOKS])
     def get(self, request, student_id):
         try:
             student = Student.objects.get(id=student_id)
-            rentals = Rental.objects.filter(user=student.user).select_related("book")
+            rentals = Rental.objects.filter(user=student.user).select_related("book").with_fees()
 
             rental_data = []
             total_fees = Decimal("0.00")
             
             for rental in rentals:
-                monthly_fee = calculate_monthly_fee(rental.book.pages)
-                free_month_ends = rental.start_date + timedelta(days=30)
-
                 rental_data.append({
                     "id": rental.id,
                     "book": {
@@ -153,12 +294,15 @@ class StudentRentalsView(APIView):
                         "author": rental.book.author, 
                         "pages": rental.book.pages,
                         "cover_url": rental.book.cover_url,
+                        "cover_thumbnail_url": cover_thumbnail_url(request, rental.book),
                     },
                     "start_date": rental.start_date.strftime("%Y-%m-%d"),
                     "end_date": rental.end_date.strftime("%Y-%m-%d") if rental.end_date else None,
-                    "free_month_ends": free_month_ends.strftime("%Y-%m-%d"),
-                    "monthly_fee": f"${monthly_fee:.2f}",
+                    "free_month_ends": rental.free_month_ends.strftime("%Y-%m-%d"),
+                    "monthly_fee": f"${rental.monthly_fee:.2f}",
                     "total_fee": f"${rental.total_fee:.2f}",
+                    "current_fee": f"${rental.current_fee:.2f}",
+                    "is_overdue": rental.is_overdue,
                     "status": rental.status,
                 })
                 total_fees += rental.total_fee
@@ -285,67 +429,416 @@ class ReturnRentalView(APIView):
             return Response({"error": f"Error returning rental: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-# ---------------------- Updated All Rentals View ----------------------
+# ---------------------- Bulk Extend / Return Views ----------------------
 
-class AllRentalsView(APIView):
+def bulk_rental_ids(request):
+    """
+    Open rentals picked by a bulk request, as (ids, error Response):
+    {"rental_ids": [1, 2, ...]} or {"filter": {...}} with the
+    RentalFilter parameters, e.g. {"filter": {"student": 3}}.
+    """
+    data = request.data if isinstance(request.data, dict) else {}
+    limit = settings.BULK_RENTAL_MAX_ITEMS
+
+    if "rental_ids" in data:
+        try:
+            if not isinstance(data["rental_ids"], list):
+                raise TypeError
+            ids = list(dict.fromkeys(int(rental_id) for rental_id in data["rental_ids"]))
+        except (TypeError, ValueError):
+            return None, Response({"error": "rental_ids must be a list of ids"}, status=status.HTTP_400_BAD_REQUEST)
+    elif isinstance(data.get("filter"), dict):
+        rental_filter = RentalFilter(data["filter"], queryset=Rental.objects.exclude(status="returned"))
+        if not rental_filter.is_valid():
+            return None, Response({"error": filter_errors(rental_filter)}, status=status.HTTP_400_BAD_REQUEST)
+        ids = list(rental_filter.qs.order_by("id").values_list("id", flat=True)[:limit + 1])
+    else:
+        return None, Response({"error": "Send rental_ids or filter"}, status=status.HTTP_400_BAD_REQUEST)
+
+    if len(ids) > limit:
+        return None, Response(
+            {"error": f"At most {limit} rentals per request; narrow the filter"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    return ids, None
+
+
+def bulk_update_response(request, updated_ids, errors):
+    """The updated rentals as list rows (one query) plus per-id errors."""
+    rentals = (
+        Rental.objects.filter(id__in=updated_ids)
+        .select_related("book", "user__student_profile")
+        .with_fees()
+        .order_by("id")
+    )
+    return Response({
+        "updated": len(updated_ids),
+        "failed": len(errors),
+        "rentals": [rental_list_item(rental, request) for rental in rentals],
+        "errors": [{"id": rental_id, "error": error} for rental_id, error in errors.items()],
+    }, status=status.HTTP_200_OK if updated_ids or not errors else status.HTTP_400_BAD_REQUEST)
+
+
+class BulkExtendRentalsView(APIView):
+    """
+    Extend many rentals by "extension_months" (default 1) with two UPDATEs.
+    Body: rental_ids or filter, see bulk_rental_ids().
+    """
     permission_classes = [AllowAny]
 
-    def get(self, request):
+    def post(self, request):
         try:
-            print('📘 Fetching all rentals')
+            ids, error = bulk_rental_ids(request)
+            if error:
+                return error
 
-            rentals = Rental.objects.select_related("book", "user").all()
-            rental_data = []
-            total_fees = Decimal("0.00")
+            try:
+                extension_months = int(request.data.get("extension_months", 1))
+            except (TypeError, ValueError):
+                extension_months = 0
+            if extension_months < 1:
+                return Response({"error": "extension_months must be a positive number"}, status=status.HTTP_400_BAD_REQUEST)
 
-            for rental in rentals:
-                # Get student information
-                student = Student.objects.filter(user=rental.user).first()
-                
-                # Calculate free month end date (due date for active rentals)
-                free_month_ends = rental.start_date + timedelta(days=30)
-
-                student_data = {
-                    "id": student.id if student else None,
-                    "name": student.student_name if student else rental.user.username,
-                    "email": student.email if student else rental.user.email,
-                    "student_id": str(student.stu_id) if student and hasattr(student, 'stu_id') else None
-                }
+            updated_ids, errors = extend_rentals(ids, months=extension_months)
+            return bulk_update_response(request, updated_ids, errors)
 
-                monthly_fee = calculate_monthly_fee(rental.book.pages)
+        except Exception as e:
+            traceback.print_exc()
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-                # Determine frontend status display
-                frontend_status = "returned" if rental.status == "returned" else "active"
 
-                rental_data.append({
-                    "id": rental.id,
-                    "student": student_data,
-                    "book": {
-                        "title": rental.book.title,
-                        "author": rental.book.author,
-                        "pages": rental.book.pages,
-                        "cover_url": rental.book.cover_url,
-                    },
-                    "start_date": rental.start_date.strftime("%Y-%m-%d"),
-                    "end_date": rental.end_date.strftime("%Y-%m-%d") if rental.end_date else None,
-                    "free_month_ends": free_month_ends.strftime("%Y-%m-%d"),
-                    "monthly_fee": f"${monthly_fee:.2f}",
-                    "total_fee": f"${rental.total_fee:.2f}",
-                    "status": frontend_status,  
-                    "backend_status": rental.status, 
-                })
+class BulkReturnRentalsView(APIView):
+    """
+    Return many rentals with two UPDATEs, e.g. all of a student's at the
+    end of term. Body: rental_ids or filter, see bulk_rental_ids().
+    """
+    permission_classes = [AllowAny]
 
-                total_fees += rental.total_fee
+    def put(self, request):
+        try:
+            ids, error = bulk_rental_ids(request)
+            if error:
+                return error
+
+            updated_ids, errors = return_rentals(ids)
+            return bulk_update_response(request, updated_ids, errors)
+
+        except Exception as e:
+            traceback.print_exc()
+            return Response({"error": f"Error returning rentals: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# ---------------------- All Rentals View (paginated) ----------------------
+
+def rental_student_data(rental):
+    """Student block of a rental row; needs user__student_profile selected."""
+    try:
+        student = rental.user.student_profile
+    except Student.DoesNotExist:
+        student = None
+
+    return {
+        "id": student.id if student else None,
+        "name": student.student_name if student else rental.user.username,
+        "email": student.email if student else rental.user.email,
+        "student_id": str(student.stu_id) if student else None,
+    }
+
+
+def rental_list_item(rental, request):
+    """
+    One row of the rentals lists. Expects book and user__student_profile
+    selected and the with_fees() annotations.
+    """
+    # Determine frontend status display
+    frontend_status = "returned" if rental.status == "returned" else "active"
+
+    return {
+        "id": rental.id,
+        "student": rental_student_data(rental),
+        "book": {
+            "title": rental.book.title,
+            "author": rental.book.author,
+            "pages": rental.book.pages,
+            "cover_url": rental.book.cover_url,
+            "cover_thumbnail_url": cover_thumbnail_url(request, rental.book),
+        },
+        "start_date": rental.start_date.strftime("%Y-%m-%d"),
+        "end_date": rental.end_date.strftime("%Y-%m-%d") if rental.end_date else None,
+        "due_date": rental.due_date.strftime("%Y-%m-%d") if rental.due_date else None,
+        "free_month_ends": rental.free_month_ends.strftime("%Y-%m-%d"),
+        "monthly_fee": f"${rental.monthly_fee:.2f}",
+        "total_fee": f"${rental.total_fee:.2f}",
+        "current_fee": f"${rental.current_fee:.2f}",
+        "is_overdue": rental.is_overdue,
+        "status": frontend_status,
+        "backend_status": rental.status,
+    }
+
+
+RENTAL_SORT_FIELDS = ("start_date", "total_fee", "current_fee", "id")
+
+
+def rental_summary_queryset(student_id=None):
+    """The RentalSummary row of a student, or the global one."""
+    if student_id is None:
+        return RentalSummary.objects.filter(scope=GLOBAL_SCOPE)
+    return RentalSummary.objects.filter(user__student_profile__id=student_id)
+
+
+def rental_paginator(sort):
+    """Keyset paginator for a ?sort= value; id breaks ties."""
+    if sort.removeprefix("-") == "id":
+        return KeysetPaginator([sort])
+    # current_fee is an annotation (with_fees), not a model field
+    return KeysetPaginator([sort, "-id" if sort.startswith("-") else "id"], converters={"current_fee": Decimal})
+
+
+class AllRentalsView(APIView):
+    """
+    All rentals, one page at a time, with totals for the whole filtered set.
+
+    Filters: see book.filters.RentalFilter (student, book, status, overdue,
+    start_from/start_to, search).
+    ?sort= one of start_date, total_fee, current_fee, id, optionally
+    prefixed with "-" (default -start_date). Fee fields are computed in SQL
+    by Rental.objects.with_fees().
+    ?page_size= (default API_PAGE_SIZE, max API_MAX_PAGE_SIZE) and ?cursor=
+    (the previous page's next_cursor, valid for the same filters and sort).
+
+    Pages use keyset pagination on (sort field, id), so every page costs the
+    same: one query for the rows (book and student joined in) plus one
+    aggregate for the totals. Responses are cached until a rental, student
+    or book changes, and conditional GETs get a 304 (book/response_cache.py).
+    """
+    permission_classes = [AllowAny]
+
+    @cache_response("rentals-list", lambda request: [ALL_RENTALS, ALL_BOOKS])
+    def get(self, request):
+        try:
+            sort = request.GET.get("sort", "-start_date")
+            if sort.removeprefix("-") not in RENTAL_SORT_FIELDS:
+                return Response(
+                    {"error": f"sort must be one of {', '.join(RENTAL_SORT_FIELDS)}, optionally prefixed with -"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            rental_filter = RentalFilter(request.GET, queryset=Rental.objects.all())
+            if not rental_filter.is_valid():
+                return Response({"error": filter_errors(rental_filter)}, status=status.HTTP_400_BAD_REQUEST)
+            filtered = rental_filter.qs
+
+            page_size = get_page_size(request)
+            rentals = filtered.select_related("book", "user__student_profile").with_fees()
+            page, next_cursor = rental_paginator(sort).paginate(rentals, request.GET.get("cursor"), page_size)
+
+            rental_data = [rental_list_item(rental, request) for rental in page]
+
+            active_filters = {name for name, value in rental_filter.form.cleaned_data.items() if value not in (None, "", [])}
+            if active_filters <= {"student"}:
+                # Unfiltered or per-student: read the maintained summary row
+                # instead of aggregating over the rentals
+                totals = summary_totals(rental_summary_queryset(rental_filter.form.cleaned_data.get("student")))
+            else:
+                totals = rental_totals(filtered)
 
             return Response({
-                "total_rentals": len(rental_data),
-                "total_fees_collected": f"${total_fees:.2f}",
+                "total_rentals": totals["count"],
+                "total_fees_collected": f"${totals['total_fees']:.2f}",
+                "totals": {
+                    "count": totals["count"],
+                    "active": totals["active"],
+                    "returned": totals["returned"],
+                    "overdue": totals["overdue"],
+                    "total_fees": f"${totals['total_fees']:.2f}",
+                },
+                "page_size": page_size,
+                "next_cursor": next_cursor,
                 "rentals": rental_data
             }, status=status.HTTP_200_OK)
 
+        except InvalidCursor as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             traceback.print_exc()
             return Response(
                 {"error": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+
+# ---------------------- Cache Stats View ----------------------
+
+class CacheStatsView(APIView):
+    """
+    Hit ratios of the response cache and the OpenLibrary lookup cache.
+    Counters are per process (each worker reports its own).
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        return Response({
+            "responses": response_cache.stats(),
+            "openlibrary": openlibrary_cache.stats(),
+        }, status=status.HTTP_200_OK)
+
+
+# ---------------------- Rental Changes View (delta sync) ----------------------
+
+class RentalChangesView(APIView):
+    """
+    Rentals changed since a sync token, for clients keeping a local copy.
+    GET /api/rentals/changes/?since=<token>&page_size=&student=<Student id>
+
+    Without ?since= every rental is returned (page by page). Each response
+    has "rentals" to upsert, "deleted" rental ids to drop, and "next", the
+    token for the following call. Keep calling while "has_more" is true.
+    An expired token gets 410 Gone: sync again without one. See book/changes.py.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        try:
+            rentals = Rental.objects.all()
+            student_id = request.GET.get("student")
+            if student_id is not None:
+                if not student_id.isdigit():
+                    return Response({"error": "student must be a Student id"}, status=status.HTTP_400_BAD_REQUEST)
+                rentals = rentals.filter(user__student_profile__id=int(student_id))
+
+            changes = rental_changes(rentals, request.GET.get("since"), get_page_size(request))
+            return Response({
+                "rentals": [rental_list_item(rental, request) for rental in changes["rentals"]],
+                "deleted": changes["deleted"],
+                "next": changes["next"],
+                "has_more": changes["has_more"],
+            }, status=status.HTTP_200_OK)
+
+        except ExpiredToken as e:
+            return Response({"error": str(e), "resync": True}, status=status.HTTP_410_GONE)
+        except InvalidCursor as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            traceback.print_exc()
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# ---------------------- Rental Summary View ----------------------
+
+class RentalSummaryView(APIView):
+    """
+    Dashboard headline numbers from the RentalSummary table: one row
+    lookup, independent of how many rentals exist.
+    GET /api/rentals/summary/?student=<Student id>
+    "overdue" is recounted daily and adjusted on every rental write.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        try:
+            student_id = request.GET.get("student")
+            if student_id is not None and not student_id.isdigit():
+                return Response({"error": "student must be a Student id"}, status=status.HTTP_400_BAD_REQUEST)
+
+            totals = summary_totals(rental_summary_queryset(int(student_id) if student_id else None))
+            return Response({
+                "student": int(student_id) if student_id else None,
+                "total_rentals": totals["count"],
+                "active": totals["active"],
+                "returned": totals["returned"],
+                "overdue": totals["overdue"],
+                "total_fees_collected": f"${totals['total_fees']:.2f}",
+                "updated_at": totals["updated_at"],
+            }, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            traceback.print_exc()
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# ---------------------- Revenue Forecast View ----------------------
+
+def _dollars(cents):
+    return f"${Decimal(cents) / 100:.2f}"
+
+
+class RevenueForecastView(APIView):
+    """
+    What open rentals will bill over the coming months if nobody returns
+    anything, computed with NumPy over all open rentals (book/forecast.py).
+    GET /api/rentals/forecast/?months=6   (1-24, starting with this month)
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        try:
+            try:
+                months = int(request.GET.get("months", 6))
+            except ValueError:
+                return Response({"error": "months must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+            if not 1 <= months <= 24:
+                return Response({"error": "months must be between 1 and 24"}, status=status.HTTP_400_BAD_REQUEST)
+
+            result = forecast(months)
+            return Response({
+                "as_of": result["as_of"],
+                "open_rentals": result["open_rentals"],
+                "current_fees": _dollars(result["current_fees_cents"]),
+                "months": [
+                    {
+                        "month": month["month"],
+                        "period_end": month["period_end"],
+                        "billed": _dollars(month["billed_cents"]),
+                        "billed_cents": month["billed_cents"],
+                        "cumulative": _dollars(month["cumulative_cents"]),
+                        "accruing_rentals": month["accruing_rentals"],
+                    }
+                    for month in result["months"]
+                ],
+            }, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            traceback.print_exc()
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# ---------------------- Overdue Rentals View ----------------------
+
+class OverdueRentalsView(APIView):
+    """
+    Open rentals past their due date, longest overdue first.
+    GET /api/rentals/overdue/?page_size=&cursor=  (plus the RentalFilter filters)
+
+    Keyset pagination on (due_date, id) walks the partial index on open
+    rentals (rental_open_due_date_idx), so returned history is never read.
+    """
+    permission_classes = [AllowAny]
+    paginator = KeysetPaginator(["due_date", "id"])
+
+    def get(self, request):
+        try:
+            today = timezone.now().date()
+            rental_filter = RentalFilter(request.GET, queryset=Rental.objects.filter(overdue_q(today)))
+            if not rental_filter.is_valid():
+                return Response({"error": filter_errors(rental_filter)}, status=status.HTTP_400_BAD_REQUEST)
+
+            rentals = rental_filter.qs.select_related("book", "user__student_profile").with_fees(today)
+            page, next_cursor = self.paginator.paginate(rentals, request.GET.get("cursor"), get_page_size(request))
+
+            rental_data = []
+            for rental in page:
+                item = rental_list_item(rental, request)
+                item["days_overdue"] = (today - rental.due_date).days
+                rental_data.append(item)
+
+            return Response({
+                "as_of": today,
+                "next_cursor": next_cursor,
+                "rentals": rental_data,
+            }, status=status.HTTP_200_OK)
+
+        except InvalidCursor as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            traceback.print_exc()
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -0,0 +1,35 @@
+import os
+
+from django.conf import settings
+from django.http import FileResponse, Http404
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET
+
+from book.covers import COVER_FORMATS, COVER_HASH_RE, cover_path
+
+
+# ---------------------- Cover Image View ----------------------
+
+def _cover_etag(request, cover_hash, size, fmt):
+    # Paths are content addressed, so the name alone identifies the bytes
+    return f"{cover_hash}-{size}.{fmt}"
+
+
+@require_GET
+@cache_control(public=True, max_age=60 * 60 * 24 * 365, immutable=True)
+@condition(etag_func=_cover_etag)
+def cover_image_view(request, cover_hash, size, fmt):
+    """
+    Serve a locally cached cover thumbnail.
+    GET /api/covers/<sha256>/<small|medium>.<jpg|webp>
+    Conditional requests (If-None-Match) are answered with 304.
+    """
+    if not COVER_HASH_RE.match(cover_hash) or size not in settings.COVER_SIZES or fmt not in COVER_FORMATS:
+        raise Http404("Unknown cover")
+
+    path = cover_path(cover_hash, size, fmt)
+    if not os.path.exists(path):
+        raise Http404("Cover not cached")
+
+    content_type = "image/webp" if fmt == "webp" else "image/jpeg"
+    return FileResponse(open(path, "rb"), content_type=content_type)
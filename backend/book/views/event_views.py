@@ -0,0 +1,70 @@
+import asyncio
+import json
+
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from book.events import rental_event_hub
+from book.models import Student
+from book.runtime import served_under_asgi
+
+
+# ---------------------- Rental Events View (SSE) ----------------------
+
+# Browsers reconnect this long after the stream drops
+RECONNECT_MS = 5000
+
+
+def _sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def _event_stream(user_id):
+    async with rental_event_hub.subscribe() as queue:
+        yield f"retry: {RECONNECT_MS}\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), settings.SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+                continue
+            # Events without a user (resync, rentals.refreshed) go to everyone
+            if user_id is not None and "user_id" in event and event["user_id"] != user_id:
+                continue
+            yield _sse(event)
+
+
+@require_GET
+async def rental_events_view(request):
+    """
+    Server-Sent Events stream of rental changes (book/events.py).
+    GET /api/rentals/events/?student=<Student id>
+
+    Event types: rental.created, rental.extended, rental.returned,
+    rental.updated, rental.deleted, rentals.refreshed (bulk recompute) and
+    resync (events may have been missed: refetch). Each data line is the
+    event as JSON.
+
+    ASGI only (uvicorn): there the stream holds no worker thread while idle.
+    A WSGI server would have to drain the endless stream before sending it,
+    so there the view answers 503 and clients go without live updates.
+    """
+    if not served_under_asgi(request):
+        return JsonResponse({"error": "Live rental events need the ASGI server."}, status=503)
+
+    user_id = None
+    student_id = request.GET.get("student")
+    if student_id is not None:
+        if not student_id.isdigit():
+            return JsonResponse({"error": "student must be a Student id"}, status=400)
+        user_id = await Student.objects.filter(id=int(student_id)).values_list("user_id", flat=True).afirst()
+        if user_id is None:
+            return JsonResponse({"error": "Student not found"}, status=404)
+
+    response = StreamingHttpResponse(_event_stream(user_id), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Don't let nginx buffer the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
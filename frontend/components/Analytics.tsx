@@ -29,9 +29,36 @@ interface Analytics {
   revenueByMonth: Record<string, number>;
 }
 
+// Projected billing of open rentals (GET /api/rentals/forecast/)
+interface Forecast {
+  as_of: string;
+  open_rentals: number;
+  current_fees: string;
+  months: Array<{
+    month: string;
+    billed: string;
+    billed_cents: number;
+    cumulative: string;
+    accruing_rentals: number;
+  }>;
+}
+
+const API_BASE_URL = 'http://127.0.0.1:8000/api';
+
 export function Analytics() {
   const [analytics, setAnalytics] = useState<Analytics | null>(null);
   const [isLoading, setIsLoading] = useState(true);
+  const [forecast, setForecast] = useState<Forecast | null>(null);
+
+  useEffect(() => {
+    fetch(`${API_BASE_URL}/rentals/forecast/?months=6`)
+      .then((res) => {
+        if (!res.ok) throw new Error(`Error fetching forecast: ${res.status}`);
+        return res.json();
+      })
+      .then(setForecast)
+      .catch((error) => console.error('❌ Failed to fetch forecast:', error));
+  }, []);
 
   // Load mock analytics data
   useEffect(() => {
@@ -267,6 +294,50 @@ export function Analytics() {
         </CardContent>
       </Card>
 
+      {/* Projected Billing */}
+      {forecast && (
+        <Card>
+          <CardHeader>
+            <CardTitle className="flex items-center gap-2">
+              <TrendingUp className="h-5 w-5 text-blue-500" />
+              Projected Billing (next {forecast.months.length} months)
+            </CardTitle>
+            <p className="text-sm text-muted-foreground">
+              {forecast.open_rentals} open rentals, {forecast.current_fees} accrued so far, assuming nothing is returned
+            </p>
+          </CardHeader>
+          <CardContent>
+            {forecast.months.map((month) => {
+              const maxBilled = Math.max(...forecast.months.map((m) => m.billed_cents), 1);
+              const percentage = (month.billed_cents / maxBilled) * 100;
+
+              return (
+                <div key={month.month} className="space-y-2">
+                  <div className="flex justify-between text-sm">
+                    <span className="text-muted-foreground">
+                      {new Date(month.month + '-01').toLocaleDateString('en-US', {
+                        year: 'numeric',
+                        month: 'long',
+                      })}
+                    </span>
+                    <span className="font-medium">
+                      {month.billed}{' '}
+                      <span className="text-xs text-muted-foreground">({month.cumulative} total)</span>
+                    </span>
+                  </div>
+                  <div className="h-2 bg-muted rounded-full overflow-hidden">
+                    <div
+                      className="h-full bg-gradient-to-r from-blue-500 to-indigo-500 transition-all"
+                      style={{ width: `${percentage}%` }}
+                    />
+                  </div>
+                </div>
+              );
+            })}
+          </CardContent>
+        </Card>
+      )}
+
       {/* Insights */}
       <Card className="bg-gradient-to-br from-primary/5 to-primary/10 border-primary/20">
         <CardHeader>
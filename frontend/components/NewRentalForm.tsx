@@ -29,6 +29,7 @@ interface Book {
   author: string;
   pages: number;
   coverUrl: string | null;
+  coverThumbnailUrl?: string | null;
   olid: string;
   firstPublishYear?: number;
 }
@@ -589,7 +590,7 @@ export function NewRentalForm({
                       <div className="flex gap-4">
                         {book.coverUrl ? (
                           <img
-                            src={book.coverUrl}
+                            src={book.coverThumbnailUrl || book.coverUrl}
                             alt={book.title}
                             className="w-20 h-28 object-cover rounded-lg shadow-md border border-slate-200"
                           />
@@ -35,6 +35,8 @@ interface Rental {
   start_date: string;
   free_month_ends: string | null; 
   end_date: string | null;
+  due_date?: string | null;
+  is_overdue?: boolean;
   status: string; 
   monthly_fee: string;
   total_fee: string;
@@ -44,9 +46,19 @@ interface Rental {
     author: string;
     pages: number;
     cover_url: string | null;
+    cover_thumbnail_url?: string | null;
   };
 }
 
+// Totals for the whole filtered set, computed by the API
+interface RentalTotals {
+  count: number;
+  active: number;
+  returned: number;
+  overdue: number;
+  total_fees: string;
+}
+
 // --- 2. UTILITY FUNCTIONS ---
 const parseFee = (feeString: string): number => {
   if (!feeString) return 0;
@@ -81,17 +93,32 @@ export function RentalsManager() {
   const [searchTerm, setSearchTerm] = useState('');
   const [selectedStudentId, setSelectedStudentId] = useState('all');
   const [loading, setLoading] = useState(true);
+  const [totals, setTotals] = useState<RentalTotals | null>(null);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  // Off once the events endpoint turns us away (it answers 503 unless served under ASGI)
+  const [liveUpdates, setLiveUpdates] = useState(true);
 
   const API_BASE_URL = 'http://127.0.0.1:8000/api';
   const token = typeof window !== 'undefined' ? localStorage.getItem('accessToken') : 'dummy-token';
   
   // --- API Fetching Functions ---
-  const fetchRentals = useCallback(async () => {
-    setLoading(true);
+  // Filtering, sorting and totals happen in the API; pages are loaded on demand
+  const fetchRentals = useCallback(async (cursor?: string) => {
+    if (cursor) {
+      setLoadingMore(true);
+    } else {
+      setLoading(true);
+    }
     setError(null);
     try {
-      const res = await fetch(`${API_BASE_URL}/rentals/list/`, {
+      const params = new URLSearchParams({ page_size: '100' });
+      if (selectedStudentId !== 'all') params.set('student', selectedStudentId);
+      if (searchTerm.trim()) params.set('search', searchTerm.trim());
+      if (cursor) params.set('cursor', cursor);
+
+      const res = await fetch(`${API_BASE_URL}/rentals/list/?${params}`, {
         method: "GET",
         headers: {
           "Content-Type": "application/json",
@@ -102,13 +129,15 @@ export function RentalsManager() {
         throw new Error(`Error fetching rentals: ${res.status}`);
       }
       const data = await res.json();
-      console.log("📦 Rentals fetched:", data);
+      console.log("📦 Rentals fetched:", data.rentals?.length, data.totals);
       
       const normalizedData = (data.rentals || []).map((r: any) => ({
           id: r.id,
           start_date: r.start_date,
           free_month_ends: r.free_month_ends || r.end_date, 
           end_date: r.end_date,
+          due_date: r.due_date,
+          is_overdue: r.is_overdue,
           status: r.status.toLowerCase().includes('active') ? 'active' : 'returned', 
           monthly_fee: r.monthly_fee,
           total_fee: r.total_fee,
@@ -116,15 +145,18 @@ export function RentalsManager() {
           book: r.book,
       }));
       
-      setRentals(normalizedData);
+      setRentals((prev) => (cursor ? prev.concat(normalizedData) : normalizedData));
+      setTotals(data.totals);
+      setNextCursor(data.next_cursor);
     } catch (error) {
       console.error("❌ Failed to fetch rentals:", error);
       setError('Failed to load rentals. Check API connection.');
-      setRentals([]);
+      if (!cursor) setRentals([]);
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
-  }, [token]);
+  }, [token, selectedStudentId, searchTerm]);
 
   const fetchStudents = useCallback(async () => {
     try {
@@ -140,10 +172,41 @@ export function RentalsManager() {
   }, [token]);
 
   useEffect(() => {
-    fetchRentals();
     fetchStudents();
-  }, [fetchRentals, fetchStudents]);
-  
+  }, [fetchStudents]);
+
+  // Refetch when the filters change, debounced while typing
+  useEffect(() => {
+    const timer = setTimeout(() => fetchRentals(), 300);
+    return () => clearTimeout(timer);
+  }, [fetchRentals]);
+
+  // Live updates: the server pushes rental change events; refetch (debounced) on any of them
+  useEffect(() => {
+    if (!liveUpdates || typeof EventSource === 'undefined') return;
+    const params = selectedStudentId !== 'all' ? `?student=${selectedStudentId}` : '';
+    const source = new EventSource(`${API_BASE_URL}/rentals/events/${params}`);
+    // A dropped connection reconnects by itself (CONNECTING); an error response
+    // (503 without ASGI) closes the stream for good, so stop asking for it
+    source.onerror = () => {
+      if (source.readyState === EventSource.CLOSED) setLiveUpdates(false);
+    };
+    let timer: ReturnType<typeof setTimeout> | undefined;
+    const refresh = () => {
+      clearTimeout(timer);
+      timer = setTimeout(() => fetchRentals(), 500);
+    };
+    const eventTypes = [
+      'rental.created', 'rental.extended', 'rental.returned', 'rental.updated',
+      'rental.deleted', 'rentals.refreshed', 'resync',
+    ];
+    eventTypes.forEach((type) => source.addEventListener(type, refresh));
+    return () => {
+      clearTimeout(timer);
+      source.close();
+    };
+  }, [fetchRentals, selectedStudentId, liveUpdates]);
+
   // --- API Action Handlers (UPDATED with SweetAlert) ---
   const extendRental = async () => {
     if (!selectedRental) return;
@@ -279,39 +342,19 @@ export function RentalsManager() {
     : '0.00';
     
   // --- Filtering and Memoization ---
-  const filteredRentals = useMemo(() => {
-    return rentals.filter((r) => {
-      const studentMatch = selectedStudentId === 'all' || r.student.id === selectedStudentId;
-      const searchMatch =
-        r.book.title.toLowerCase().includes(searchTerm.toLowerCase()) ||
-        r.student.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-        r.student.student_id.toLowerCase().includes(searchTerm.toLowerCase());
-      return studentMatch && searchMatch;
-    });
-  }, [rentals, searchTerm, selectedStudentId]);
-
-  console.log('filteredRentals:', filteredRentals);
-  console.log('Filtered Rentals Count:', filteredRentals.length);
-
-  const activeRentals = filteredRentals.filter((r) => r.status === 'active');
-  const returnedRentals = filteredRentals.filter((r) => r.status === 'returned');
-  const allRentals = filteredRentals;
+  // rentals already match the filters (applied server-side)
+  const activeRentals = rentals.filter((r) => r.status === 'active');
+  const returnedRentals = rentals.filter((r) => r.status === 'returned');
 
   // --- Student-Specific Stats ---
   const studentStats = useMemo(() => {
-    if (selectedStudentId === 'all' || !selectedStudentId) return null;
-    const studentRentals = rentals.filter(r => r.student.id === selectedStudentId);
-    if (studentRentals.length === 0) return null; 
-    const total = studentRentals.length;
-    const active = studentRentals.filter(r => r.status === 'active').length;
-    const returned = studentRentals.filter(r => r.status === 'returned').length;
-    const overdue = studentRentals.filter(r => r.status === 'active' && r.free_month_ends && isOverdue(r.free_month_ends)).length;
-    const studentName = studentRentals[0]?.student.name || 'Student';
-    return { total, active, returned, overdue, studentName };
-  }, [rentals, selectedStudentId]);
+    if (selectedStudentId === 'all' || !selectedStudentId || !totals || totals.count === 0) return null;
+    const studentName = students.find((s) => String(s.id) === String(selectedStudentId))?.name || rentals[0]?.student.name || 'Student';
+    return { ...totals, total: totals.count, studentName };
+  }, [totals, students, rentals, selectedStudentId]);
 
   // --- Rendering Logic ---
-  if (loading) {
+  if (loading && !totals) {
     return (
       <Card className="p-8 text-center text-lg font-medium text-primary">
         <Clock className="animate-spin inline mr-2 h-6 w-6" /> Loading Rentals Data...
@@ -324,7 +367,7 @@ export function RentalsManager() {
       <Card className="p-8 text-center border-red-500 bg-red-50">
         <p className="font-semibold text-red-700">Error Loading Data or Action Failed</p>
         <p className="text-sm text-red-600">{error}</p>
-        <Button onClick={fetchRentals} className="mt-4">
+        <Button onClick={() => fetchRentals()} className="mt-4">
           Try Reloading Rentals
         </Button>
       </Card>
@@ -376,7 +419,7 @@ export function RentalsManager() {
             </CardTitle>
           </CardHeader>
           <CardContent>
-            <div className="text-3xl font-semibold">{allRentals.length}</div>
+            <div className="text-3xl font-semibold">{totals?.count ?? 0}</div>
             <p className="text-sm text-muted-foreground">in current view</p>
           </CardContent>
         </Card>
@@ -388,7 +431,7 @@ export function RentalsManager() {
             </CardTitle>
           </CardHeader>
           <CardContent>
-            <div className="text-3xl font-semibold">{activeRentals.length}</div>
+            <div className="text-3xl font-semibold">{totals?.active ?? 0}</div>
             <p className="text-sm text-muted-foreground">currently checked out</p>
           </CardContent>
         </Card>
@@ -401,7 +444,7 @@ export function RentalsManager() {
           </CardHeader>
           <CardContent>
             <div className="text-3xl font-semibold">
-              {activeRentals.filter((r) => r.free_month_ends && isOverdue(r.free_month_ends)).length}
+              {totals?.overdue ?? 0}
             </div>
             <p className="text-sm text-muted-foreground">past due date</p>
           </CardContent>
@@ -415,7 +458,7 @@ export function RentalsManager() {
           </CardHeader>
           <CardContent>
             <div className="text-3xl font-semibold">
-              ${rentals.reduce((sum, r) => sum + parseFee(r.total_fee), 0).toFixed(2)}
+              {totals?.total_fees ?? '$0.00'}
             </div> 
             <p className="text-sm text-muted-foreground">overall collected</p>
           </CardContent>
@@ -455,7 +498,7 @@ export function RentalsManager() {
       {/* Active Rentals List */}
       <section className="space-y-4">
         <h2 className="text-2xl font-semibold flex items-center gap-2">
-            <CheckSquare className="h-6 w-6 text-primary" /> Active Rentals <Badge className="ml-2">{activeRentals.length}</Badge>
+            <CheckSquare className="h-6 w-6 text-primary" /> Active Rentals <Badge className="ml-2">{totals?.active ?? activeRentals.length}</Badge>
         </h2>
         {activeRentals.length === 0 ? (
           <Card>
@@ -466,10 +509,10 @@ export function RentalsManager() {
         ) : (
           <div className="grid gap-4">
             {activeRentals.map((rental) => {
-              const dueDate = rental.free_month_ends; 
+              const dueDate = rental.due_date || rental.free_month_ends;
               const hasDueDate = !!dueDate; 
               const daysRemaining = hasDueDate ? getDaysRemaining(dueDate) : null;
-              const overdue = hasDueDate ? isOverdue(dueDate) : false;
+              const overdue = rental.is_overdue ?? (hasDueDate ? isOverdue(dueDate) : false);
               
               return (
                 <Card key={rental.id} className={`shadow-md transition-shadow duration-300 ${overdue ? 'border-l-4 border-l-orange-500 hover:shadow-lg' : 'hover:shadow-lg'}`}>
@@ -479,7 +522,7 @@ export function RentalsManager() {
                       <div className="flex-shrink-0">
                         {rental.book.cover_url ? (
                           <ImageWithFallback
-                            src={rental.book.cover_url}
+                            src={rental.book.cover_thumbnail_url || rental.book.cover_url}
                             alt={rental.book.title}
                             className="w-16 h-24 object-cover rounded shadow-sm"
                           />
@@ -548,7 +591,7 @@ export function RentalsManager() {
       {/* Returned Rentals List */}
       <section className="space-y-4">
         <h2 className="text-2xl font-semibold flex items-center gap-2">
-            <XSquare className="h-6 w-6 text-gray-500" /> Returned Rentals <Badge variant="secondary" className="ml-2">{returnedRentals.length}</Badge>
+            <XSquare className="h-6 w-6 text-gray-500" /> Returned Rentals <Badge variant="secondary" className="ml-2">{totals?.returned ?? returnedRentals.length}</Badge>
         </h2>
         {returnedRentals.length === 0 ? (
           <Card>
@@ -565,7 +608,7 @@ export function RentalsManager() {
                         <div className="flex-shrink-0">
                             {rental.book.cover_url ? (
                             <ImageWithFallback
-                                src={rental.book.cover_url}
+                                src={rental.book.cover_thumbnail_url || rental.book.cover_url}
                                 alt={rental.book.title}
                                 className="w-12 h-16 object-cover rounded grayscale"
                             />
@@ -597,6 +640,14 @@ export function RentalsManager() {
         )}
       </section>
 
+      {nextCursor && (
+        <div className="flex justify-center">
+          <Button variant="outline" onClick={() => fetchRentals(nextCursor)} disabled={loadingMore}>
+            {loadingMore ? 'Loading...' : `Load more (${rentals.length} of ${totals?.count ?? 0} shown)`}
+          </Button>
+        </div>
+      )}
+
       {/* Extend Dialog */}
       <Dialog open={extendDialogOpen} onOpenChange={setExtendDialogOpen}>
         <DialogContent className='bg-white'>
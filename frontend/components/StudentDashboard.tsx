@@ -33,6 +33,7 @@ interface Rental {
         author: string;
         pages: number;
         cover_url: string | null;
+        cover_thumbnail_url?: string | null;
     };
 }
 
@@ -269,7 +270,7 @@ export function StudentDashboard() {
                                                 <div className="flex-shrink-0">
                                                     {rental.book.cover_url ? (
                                                         <ImageWithFallback
-                                                            src={rental.book.cover_url}
+                                                            src={rental.book.cover_thumbnail_url || rental.book.cover_url}
                                                             alt={rental.book.title}
                                                             className="w-16 h-24 object-cover rounded shadow"
                                                         />